@@ -1,15 +1,46 @@
 # flake8: noqa
+"""
+The submodules are imported on first access, so that importing metadetect,
+for example in a new worker process, does not import ngmix, galsim, scipy or
+numba until they are needed
+"""
+import importlib
+
 from ._version import __version__
 
-from .metadetect import (
-    do_metadetect,
-    Metadetect,
-)
-from . import detect
-from . import metadetect
-from . import fitting
-
-from . import util
-from . import defaults
-from . import procflags
-from . import shearpos
+_SUBMODULES = [
+    'detect',
+    'metadetect',
+    'fitting',
+    'util',
+    'defaults',
+    'procflags',
+    'shearpos',
+    'jit',
+]
+
+# attributes re-exported from submodules
+_ATTRIBUTES = {
+    'do_metadetect': 'metadetect',
+    'Metadetect': 'metadetect',
+    'warmup': 'jit',
+}
+
+
+def __getattr__(name):
+    if name in _ATTRIBUTES:
+        module = importlib.import_module('.' + _ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)
+        )
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES) | set(_ATTRIBUTES))
@@ -0,0 +1,570 @@
+"""
+Code to estimate the multiplicative and additive shear bias, m and c, from
+pairs of simulations sheared by +g and -g, with bootstrap or jackknife errors.
+
+Each pair is reduced to the mean shears and responses, e.g. by
+_meas_shear_data in the shear tests, an array with fields g1, g2, R11 and
+R22.  The noise cancels in the differences between the pairs, so m and c are
+ratios of means of
+
+    g1p - g1m, R11p + R11m, g2p + g2m, R22p + R22m
+
+All resamples use the same number of pairs, so only the sums of these
+columns are needed.  The resampled sums are computed as the product of a
+matrix of resample counts with the columns, rather than by copying the data
+for each resample.  The data can be added in chunks so the full arrays never
+need to be in memory at once.
+
+The mean shears and responses for large runs can be accumulated from the
+metadetect results with a ResponseAccumulator, without storing catalogs.
+"""
+import numpy as np
+from ngmix.metacal import DEFAULT_STEP
+
+DEFAULT_GTRUE = 0.02
+DEFAULT_NBOOT = 500
+DEFAULT_NJACK = 100
+DEFAULT_CHUNKSIZE = 10_000
+
+DEFAULT_SHEAR_TYPES = ('noshear', '1p', '1m', '2p', '2m')
+
+# the sums of these columns are needed for m and c
+NCOL = 4
+
+
+def meas_m_c(pres, mres, gtrue=DEFAULT_GTRUE):
+    """
+    measure m and c from paired simulations
+
+    Parameters
+    ----------
+    pres: array
+        The results for the sims sheared by +gtrue, with fields g1, g2, R11
+        and R22
+    mres: array
+        The results for the sims sheared by -gtrue
+    gtrue: float, optional
+        The true shear, default 0.02
+
+    Returns
+    -------
+    m, c
+    """
+    sums = get_m_c_columns(pres, mres).sum(axis=0)
+    return _get_m_c(sums, gtrue)
+
+
+def bootstrap_m_c(
+    pres, mres, rng, nboot=DEFAULT_NBOOT, gtrue=DEFAULT_GTRUE,
+    chunksize=DEFAULT_CHUNKSIZE,
+):
+    """
+    measure m and c from paired simulations, with bootstrap errors
+
+    Parameters
+    ----------
+    pres: array
+        The results for the sims sheared by +gtrue, with fields g1, g2, R11
+        and R22
+    mres: array
+        The results for the sims sheared by -gtrue
+    rng: np.random.RandomState
+        Random number generator for the resamples
+    nboot: int, optional
+        Number of bootstrap resamples, default 500
+    gtrue: float, optional
+        The true shear, default 0.02
+    chunksize: int, optional
+        The data are processed in chunks of this many pairs, which limits the
+        memory used for the resample counts.  Default 10_000.
+
+    Returns
+    -------
+    m, merr, c, cerr
+    """
+    acc = MCAccumulator(
+        n=pres.size, method='bootstrap', nresample=nboot, rng=rng, gtrue=gtrue,
+    )
+    _add_in_chunks(acc, pres, mres, chunksize)
+    return acc.get_m_c()
+
+
+def jackknife_m_c(
+    pres, mres, njack=DEFAULT_NJACK, gtrue=DEFAULT_GTRUE,
+    chunksize=DEFAULT_CHUNKSIZE,
+):
+    """
+    measure m and c from paired simulations, with delete-one jackknife
+    errors from contiguous blocks of pairs
+
+    Parameters
+    ----------
+    pres: array
+        The results for the sims sheared by +gtrue, with fields g1, g2, R11
+        and R22
+    mres: array
+        The results for the sims sheared by -gtrue
+    njack: int, optional
+        Number of jackknife blocks, default 100
+    gtrue: float, optional
+        The true shear, default 0.02
+    chunksize: int, optional
+        The data are processed in chunks of this many pairs.  Default 10_000.
+
+    Returns
+    -------
+    m, merr, c, cerr
+    """
+    acc = MCAccumulator(
+        n=pres.size, method='jackknife', nresample=njack, gtrue=gtrue,
+    )
+    _add_in_chunks(acc, pres, mres, chunksize)
+    return acc.get_m_c()
+
+
+class MCAccumulator(object):
+    """
+    Accumulate the sums needed for m and c from paired simulations, along
+    with resampled sums for bootstrap or jackknife errors
+
+    The data are added in order in chunks of any size, and the resamples are
+    equivalent to resampling all n pairs at once.  For the bootstrap, the
+    number of draws that land in each chunk is binomial given the draws
+    remaining, and the draws within a chunk are then uniform, so the total
+    number of pairs n must be known in advance.
+
+    Parameters
+    ----------
+    n: int
+        The total number of pairs that will be added
+    method: str, optional
+        'bootstrap' or 'jackknife', default 'bootstrap'
+    nresample: int, optional
+        The number of bootstrap resamples or jackknife blocks.  Default 500
+        for the bootstrap and 100 for the jackknife.
+    rng: np.random.RandomState, optional
+        Random number generator, required for the bootstrap
+    gtrue: float, optional
+        The true shear, default 0.02
+
+    Examples
+    --------
+    acc = MCAccumulator(n=n, rng=rng)
+    for pres, mres in chunks:
+        acc.add(pres, mres)
+
+    m, merr, c, cerr = acc.get_m_c()
+    """
+    def __init__(
+        self, n, method='bootstrap', nresample=None, rng=None,
+        gtrue=DEFAULT_GTRUE,
+    ):
+        if method not in ('bootstrap', 'jackknife'):
+            raise ValueError(
+                "method should be 'bootstrap' or 'jackknife', got '%s'" % method
+            )
+
+        if nresample is None:
+            nresample = DEFAULT_NBOOT if method == 'bootstrap' else DEFAULT_NJACK
+
+        if method == 'bootstrap' and rng is None:
+            raise ValueError('send an rng for the bootstrap')
+
+        if method == 'jackknife' and not 1 < nresample <= n:
+            raise ValueError(
+                'the number of jackknife blocks must be > 1 and <= n = %d, '
+                'got %d' % (n, nresample)
+            )
+
+        self.n = n
+        self.method = method
+        self.nresample = nresample
+        self.rng = rng
+        self.gtrue = gtrue
+
+        self.nadded = 0
+        self.sums = np.zeros(NCOL)
+
+        # for the bootstrap, these are the sums for each resample and the
+        # number of draws left for each; for the jackknife the sums for each
+        # block
+        self.resample_sums = np.zeros((nresample, NCOL))
+        self._draws_left = np.full(nresample, n, dtype='i8')
+
+    def add(self, pres, mres):
+        """
+        add a chunk of paired results
+
+        Parameters
+        ----------
+        pres: array
+            The results for the sims sheared by +gtrue, with fields g1, g2,
+            R11 and R22
+        mres: array
+            The results for the sims sheared by -gtrue
+        """
+        cols = get_m_c_columns(pres, mres)
+        nchunk = cols.shape[0]
+
+        if self.nadded + nchunk > self.n:
+            raise ValueError(
+                'adding %d pairs would exceed the expected total of %d' % (
+                    nchunk, self.n,
+                )
+            )
+
+        if self.method == 'bootstrap':
+            counts = self._get_bootstrap_counts(nchunk)
+            self.resample_sums += counts @ cols
+        else:
+            blocks = (
+                np.arange(self.nadded, self.nadded + nchunk) * self.nresample
+            ) // self.n
+            for icol in range(NCOL):
+                self.resample_sums[:, icol] += np.bincount(
+                    blocks, weights=cols[:, icol], minlength=self.nresample,
+                )
+
+        self.sums += cols.sum(axis=0)
+        self.nadded += nchunk
+
+    def get_m_c(self):
+        """
+        get m and c and their errors, after all pairs have been added
+
+        Returns
+        -------
+        m, merr, c, cerr
+        """
+        if self.nadded != self.n:
+            raise ValueError(
+                'expected %d pairs but %d were added' % (self.n, self.nadded)
+            )
+
+        m, c = _get_m_c(self.sums, self.gtrue)
+
+        if self.method == 'bootstrap':
+            mvals, cvals = _get_m_c(self.resample_sums.T, self.gtrue)
+            merr = mvals.std()
+            cerr = cvals.std()
+        else:
+            # the sums with each block left out
+            mvals, cvals = _get_m_c(
+                (self.sums - self.resample_sums).T, self.gtrue,
+            )
+            fac = (self.nresample - 1) / self.nresample
+            merr = np.sqrt(fac * ((mvals - mvals.mean())**2).sum())
+            cerr = np.sqrt(fac * ((cvals - cvals.mean())**2).sum())
+
+        return m, merr, c, cerr
+
+    def _get_bootstrap_counts(self, nchunk):
+        """
+        get the number of times each pair in the chunk is drawn for each
+        resample, shape (nresample, nchunk)
+        """
+        rng = self.rng
+
+        # the number of draws landing in this chunk, given the number of
+        # pairs not yet added
+        nleft = self.n - self.nadded
+        ndraw = rng.binomial(self._draws_left, nchunk / nleft)
+        self._draws_left -= ndraw
+
+        # the draws within the chunk are uniform; count them for all the
+        # resamples at once
+        resample_ids = np.repeat(np.arange(self.nresample), ndraw)
+        ind = resample_ids * nchunk + rng.randint(0, nchunk, size=ndraw.sum())
+
+        counts = np.bincount(ind, minlength=self.nresample * nchunk)
+        return counts.reshape(self.nresample, nchunk)
+
+
+class ResponseAccumulator(object):
+    """
+    Accumulate the mean shear for each shear type from metadetect results,
+    for computing the mean shear and the metacal response
+
+    The count, mean and sum of squared deviations from the mean of the shear
+    are kept for each shear type and selection bin and updated for each
+    result, using the parallel form of the Welford algorithm.  Accumulators
+    can be pickled and merged, so results from many workers can be combined
+    without storing the catalogs.
+
+    Parameters
+    ----------
+    model: str
+        The measurement type, the shear is taken from the {model}_g column
+    step: float, optional
+        The metacal step, default the ngmix default 0.01
+    shear_types: list of str, optional
+        The shear types to accumulate, default
+        ('noshear', '1p', '1m', '2p', '2m')
+    select: function, optional
+        A function that takes the catalog for a shear type and returns a
+        boolean array for the objects to use.  Default is to use all objects.
+        For the accumulator to be picklable this must be defined at the top
+        level of a module.
+    bin_field: str, optional
+        If sent, objects are binned by the value of this column
+    bin_edges: array, optional
+        The edges of the bins for bin_field, objects outside the edges are
+        not used
+
+    Examples
+    --------
+    acc = ResponseAccumulator(model='wmom', select=shear_cuts)
+    for res in results:
+        acc.add(res)
+
+    acc.merge(other_acc)
+    stats = acc.get_stats()
+    """
+    def __init__(
+        self, model, step=DEFAULT_STEP, shear_types=DEFAULT_SHEAR_TYPES,
+        select=None, bin_field=None, bin_edges=None,
+    ):
+        if (bin_field is None) != (bin_edges is None):
+            raise ValueError('send both bin_field and bin_edges, or neither')
+
+        self.model = model
+        self.step = step
+        self.shear_types = tuple(shear_types)
+        self.select = select
+        self.bin_field = bin_field
+
+        if bin_edges is None:
+            self.bin_edges = None
+            nbin = 1
+        else:
+            self.bin_edges = np.array(bin_edges, dtype='f8')
+            nbin = self.bin_edges.size - 1
+            if nbin < 1:
+                raise ValueError('need at least two bin edges')
+
+        self.nbin = nbin
+        ntype = len(self.shear_types)
+
+        self.counts = np.zeros((ntype, nbin), dtype='i8')
+        self.means = np.zeros((ntype, nbin, 2))
+        self.m2s = np.zeros((ntype, nbin, 2))
+
+    def add(self, result):
+        """
+        add a metadetect result
+
+        Parameters
+        ----------
+        result: dict
+            The result dict from metadetect, keyed by shear type.  Shear types
+            that are missing or None are skipped.
+        """
+        for itype, shear_type in enumerate(self.shear_types):
+            data = result.get(shear_type)
+            if data is None or data.size == 0:
+                continue
+
+            self._add_data(itype, data)
+
+    def merge(self, other):
+        """
+        merge in the sums from another accumulator with the same settings
+
+        Parameters
+        ----------
+        other: ResponseAccumulator
+            The other accumulator
+        """
+        if (
+            other.model != self.model
+            or other.step != self.step
+            or other.shear_types != self.shear_types
+            or other.bin_field != self.bin_field
+            or not np.array_equal(other.bin_edges, self.bin_edges)
+        ):
+            raise ValueError('cannot merge accumulators with different settings')
+
+        self._merge(other.counts, other.means, other.m2s)
+
+    def get_stats(self, combine_bins=False):
+        """
+        get the mean shear and response for each bin
+
+        Parameters
+        ----------
+        combine_bins: bool, optional
+            If True, combine all bins into one
+
+        Returns
+        -------
+        stats: array
+            Array with an entry for each bin, with fields n (the number of
+            noshear objects), g1, g2, g1_err, g2_err, R11 and R22.  Quantities
+            for which shear types are missing or there are no objects are NaN.
+        """
+        counts, means, m2s = self.counts, self.means, self.m2s
+        if combine_bins:
+            counts, means, m2s = _combine_bins(counts, means, m2s)
+
+        nbin = counts.shape[1]
+        stats = np.zeros(nbin, dtype=[
+            ('n', 'i8'),
+            ('g1', 'f8'),
+            ('g2', 'f8'),
+            ('g1_err', 'f8'),
+            ('g2_err', 'f8'),
+            ('R11', 'f8'),
+            ('R22', 'f8'),
+        ])
+        for name in stats.dtype.names[1:]:
+            stats[name] = np.nan
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if 'noshear' in self.shear_types:
+                itype = self.shear_types.index('noshear')
+                n = counts[itype]
+                stats['n'] = n
+
+                has = n > 0
+                stats['g1'][has] = means[itype, has, 0]
+                stats['g2'][has] = means[itype, has, 1]
+
+                # error on the mean
+                errs = np.sqrt(m2s[itype] / (n * (n - 1))[:, np.newaxis])
+                has = n > 1
+                stats['g1_err'][has] = errs[has, 0]
+                stats['g2_err'][has] = errs[has, 1]
+
+            for name, comp, ptype, mtype in [
+                ('R11', 0, '1p', '1m'),
+                ('R22', 1, '2p', '2m'),
+            ]:
+                if ptype in self.shear_types and mtype in self.shear_types:
+                    ip = self.shear_types.index(ptype)
+                    im = self.shear_types.index(mtype)
+                    has = (counts[ip] > 0) & (counts[im] > 0)
+                    stats[name][has] = (
+                        means[ip, has, comp] - means[im, has, comp]
+                    ) / (2 * self.step)
+
+        return stats
+
+    def _add_data(self, itype, data):
+        if self.select is not None:
+            data = data[self.select(data)]
+
+        g = data[self.model + '_g']
+
+        if self.bin_edges is None:
+            bins = np.zeros(data.size, dtype='i8')
+        else:
+            bins = np.digitize(data[self.bin_field], self.bin_edges) - 1
+            keep = (bins >= 0) & (bins < self.nbin)
+            bins = bins[keep]
+            g = g[keep]
+
+        counts = np.bincount(bins, minlength=self.nbin)
+        has = counts > 0
+
+        means = np.zeros((self.nbin, 2))
+        m2s = np.zeros((self.nbin, 2))
+        for comp in range(2):
+            sums = np.bincount(bins, weights=g[:, comp], minlength=self.nbin)
+            means[has, comp] = sums[has] / counts[has]
+
+            resid = g[:, comp] - means[bins, comp]
+            m2s[:, comp] = np.bincount(
+                bins, weights=resid**2, minlength=self.nbin,
+            )
+
+        batch_counts = np.zeros_like(self.counts)
+        batch_means = np.zeros_like(self.means)
+        batch_m2s = np.zeros_like(self.m2s)
+        batch_counts[itype] = counts
+        batch_means[itype] = means
+        batch_m2s[itype] = m2s
+
+        self._merge(batch_counts, batch_means, batch_m2s)
+
+    def _merge(self, counts, means, m2s):
+        self.counts, self.means, self.m2s = _merge_moments(
+            self.counts, self.means, self.m2s, counts, means, m2s,
+        )
+
+
+def _merge_moments(na, meana, m2a, nb, meanb, m2b):
+    """
+    merge counts, means and sums of squared deviations from the mean, where
+    the means and sums have an extra trailing dimension relative to the
+    counts
+    """
+    n = na + nb
+
+    nnz = np.where(n > 0, n, 1)[..., np.newaxis]
+    fa = na[..., np.newaxis]
+    fb = nb[..., np.newaxis]
+
+    delta = meanb - meana
+    mean = meana + delta * fb / nnz
+    m2 = m2a + m2b + delta**2 * fa * fb / nnz
+
+    return n, mean, m2
+
+
+def _combine_bins(counts, means, m2s):
+    """
+    combine the bins, the second axis
+    """
+    n = counts[:, 0]
+    mean = means[:, 0]
+    m2 = m2s[:, 0]
+    for ibin in range(1, counts.shape[1]):
+        n, mean, m2 = _merge_moments(
+            n, mean, m2, counts[:, ibin], means[:, ibin], m2s[:, ibin],
+        )
+
+    return n[:, np.newaxis], mean[:, np.newaxis], m2[:, np.newaxis]
+
+
+def get_m_c_columns(pres, mres):
+    """
+    get the columns whose sums are needed for m and c, shape (n, 4)
+
+    Parameters
+    ----------
+    pres: array
+        The results for the sims sheared by +gtrue, with fields g1, g2, R11
+        and R22
+    mres: array
+        The results for the sims sheared by -gtrue
+
+    Returns
+    -------
+    array
+    """
+    if pres.size != mres.size:
+        raise ValueError(
+            'pres and mres have different sizes %d and %d' % (
+                pres.size, mres.size,
+            )
+        )
+
+    cols = np.zeros((pres.size, NCOL))
+    cols[:, 0] = pres['g1'] - mres['g1']
+    cols[:, 1] = pres['R11'] + mres['R11']
+    cols[:, 2] = pres['g2'] + mres['g2']
+    cols[:, 3] = pres['R22'] + mres['R22']
+    return cols
+
+
+def _get_m_c(sums, gtrue):
+    # the number of pairs and the factors of two cancel in the ratios
+    m = sums[0] / sums[1] / gtrue - 1
+    c = sums[2] / sums[3]
+    return m, c
+
+
+def _add_in_chunks(acc, pres, mres, chunksize):
+    for start in range(0, pres.size, chunksize):
+        end = start + chunksize
+        acc.add(pres[start:end], mres[start:end])
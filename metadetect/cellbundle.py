@@ -0,0 +1,269 @@
+"""
+Code to write the observations for a cell to a single file and read them back
+as an ngmix.MultiBandObsList whose pixel arrays are memory mapped.
+
+The file holds a fixed size preamble, a JSON header and then the raw pixel
+arrays.  The header describes the structure of the MultiBandObsList, the
+Jacobians, the meta data and the dtype, shape and offset of each array.
+Arrays are aligned so they can be viewed in place without copying.  Many
+processes reading the same cell share the pages in the OS page cache.
+"""
+import json
+import struct
+
+import numpy as np
+import ngmix
+
+MAGIC = b'MDETCELL'
+VERSION = 1
+ALIGN = 64
+
+# magic, version, header length
+_PREAMBLE = struct.Struct('<8sIQ')
+
+# the optional arrays for an observation, image and weight are always stored
+OBS_ARRAY_NAMES = ('image', 'weight', 'bmask', 'ormask', 'noise', 'mfrac')
+
+
+def write_cell_bundle(path, mbobs):
+    """
+    write the observations for a cell to a cell bundle file
+
+    Parameters
+    ----------
+    path: str
+        The output path
+    mbobs: ngmix.MultiBandObsList
+        The observations.  All meta data must be JSON serializable.
+    """
+    header, arrays, nbytes = get_mbobs_layout(mbobs)
+
+    hbytes = json.dumps(header, default=_json_default).encode('utf-8')
+    data_start = _get_data_start(len(hbytes))
+
+    with open(path, 'wb') as fobj:
+        fobj.write(_PREAMBLE.pack(MAGIC, VERSION, len(hbytes)))
+        fobj.write(hbytes)
+        fobj.truncate(data_start + nbytes)
+
+        fobj.seek(data_start)
+        for _, arr in arrays:
+            fobj.write(np.ascontiguousarray(arr).tobytes())
+            fobj.seek(_align(fobj.tell()))
+
+
+def read_cell_bundle(path, mode='c'):
+    """
+    read a cell bundle file as an ngmix.MultiBandObsList
+
+    The pixel arrays are views into a np.memmap of the file, so only the
+    pages that are used are read from disk.
+
+    Parameters
+    ----------
+    path: str
+        The path to the cell bundle
+    mode: str, optional
+        The np.memmap mode.  The default 'c' is copy-on-write, so that
+        arrays can be modified in memory, for example when masking, without
+        changing the file.  Use 'r' for strictly read-only arrays.
+
+    Returns
+    -------
+    mbobs: ngmix.MultiBandObsList
+    """
+    header, hlen = _read_header(path)
+    data_start = _get_data_start(hlen)
+
+    mm = np.memmap(path, dtype='u1', mode=mode)
+
+    def _get_array(arrdesc):
+        dtype = np.dtype(arrdesc['dtype'])
+        shape = tuple(arrdesc['shape'])
+        start = data_start + arrdesc['offset']
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        return mm[start:start + nbytes].view(dtype).reshape(shape)
+
+    return make_mbobs(header, _get_array)
+
+
+def read_cell_bundle_header(path):
+    """
+    read the header of a cell bundle file
+
+    Parameters
+    ----------
+    path: str
+        The path to the cell bundle
+
+    Returns
+    -------
+    header: dict
+    """
+    return _read_header(path)[0]
+
+
+def get_mbobs_layout(mbobs):
+    """
+    get a description of the structure of a MultiBandObsList and its pixel
+    arrays, used to place the arrays in a single buffer
+
+    Parameters
+    ----------
+    mbobs: ngmix.MultiBandObsList
+        The observations.  All meta data must be JSON serializable.
+
+    Returns
+    -------
+    header: dict
+        The description, JSON serializable.  Each array has an entry with
+        its dtype, shape and byte offset in the buffer.
+    arrays: list
+        (description, array) pairs, in order of increasing offset
+    nbytes: int
+        The total size of the buffer needed to hold the arrays
+    """
+    arrays = []
+    nbytes = 0
+
+    def _add_obs(obs):
+        nonlocal nbytes
+
+        arrdescs = {}
+        for name in OBS_ARRAY_NAMES:
+            arr = _get_obs_array(obs, name)
+            if arr is not None:
+                arrdesc = {
+                    'dtype': arr.dtype.str,
+                    'shape': list(arr.shape),
+                    'offset': nbytes,
+                }
+                arrdescs[name] = arrdesc
+                arrays.append((arrdesc, arr))
+                nbytes = _align(nbytes + arr.nbytes)
+
+        desc = {
+            'jacobian': _get_jacobian_desc(obs.jacobian),
+            'meta': dict(obs.meta),
+            'arrays': arrdescs,
+            'psf': None,
+        }
+        if obs.has_psf():
+            desc['psf'] = _add_obs(obs.psf)
+        return desc
+
+    header = {
+        'meta': dict(mbobs.meta),
+        'bands': [
+            {
+                'meta': dict(obslist.meta),
+                'epochs': [_add_obs(obs) for obs in obslist],
+            }
+            for obslist in mbobs
+        ],
+    }
+
+    return header, arrays, nbytes
+
+
+def make_mbobs(header, get_array):
+    """
+    make a MultiBandObsList from a description made by get_mbobs_layout
+
+    Parameters
+    ----------
+    header: dict
+        The description of the observations
+    get_array: function
+        A function that takes the description of an array, with entries
+        dtype, shape and offset, and returns the array
+
+    Returns
+    -------
+    mbobs: ngmix.MultiBandObsList
+    """
+    def _make_obs(desc):
+        kw = {
+            name: get_array(arrdesc)
+            for name, arrdesc in desc['arrays'].items()
+        }
+        if desc['psf'] is not None:
+            kw['psf'] = _make_obs(desc['psf'])
+
+        return ngmix.Observation(
+            jacobian=ngmix.Jacobian(**desc['jacobian']),
+            meta=desc['meta'],
+            **kw
+        )
+
+    mbobs = ngmix.MultiBandObsList(meta=header['meta'])
+    for band in header['bands']:
+        obslist = ngmix.ObsList(meta=band['meta'])
+        for desc in band['epochs']:
+            obslist.append(_make_obs(desc))
+        mbobs.append(obslist)
+
+    return mbobs
+
+
+def _read_header(path):
+    with open(path, 'rb') as fobj:
+        preamble = fobj.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise ValueError('%s is not a cell bundle' % path)
+
+        magic, version, hlen = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError('%s is not a cell bundle' % path)
+        if version != VERSION:
+            raise ValueError(
+                'cell bundle %s has version %d, expected %d' % (
+                    path, version, VERSION,
+                )
+            )
+
+        header = json.loads(fobj.read(hlen).decode('utf-8'))
+
+    return header, hlen
+
+
+def _get_obs_array(obs, name):
+    if name in ('image', 'weight'):
+        return obs.image if name == 'image' else obs.weight
+
+    has_func = getattr(obs, 'has_' + name)
+    if has_func():
+        return getattr(obs, name)
+    else:
+        return None
+
+
+def _get_jacobian_desc(jac):
+    row, col = jac.get_cen()
+    return {
+        'row': float(row),
+        'col': float(col),
+        'dudrow': float(jac.dudrow),
+        'dudcol': float(jac.dudcol),
+        'dvdrow': float(jac.dvdrow),
+        'dvdcol': float(jac.dvdcol),
+    }
+
+
+def _get_data_start(hlen):
+    return _align(_PREAMBLE.size + hlen)
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    else:
+        raise TypeError(
+            'meta data of type %s cannot be stored in a cell bundle' % type(obj)
+        )
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
@@ -0,0 +1,250 @@
+"""
+Code to run metadetect over many cells with checkpointing, so that an
+interrupted run can be resumed without repeating or duplicating work.
+
+Completed cells and the number of output rows per shear type are recorded in
+a small SQLite manifest.  The manifest is only updated after the output for
+the completed cells has been written to disk, and on restart any output
+written after the last checkpoint is truncated away.  The random number
+generator for each cell is seeded from the cell id, so a resumed run gives the
+same output as an uninterrupted one.
+"""
+import copy
+import hashlib
+import logging
+import sqlite3
+
+import numpy as np
+
+from .io import CatalogWriter, get_config_hash
+from .metadetect import do_metadetect
+
+logger = logging.getLogger(__name__)
+
+
+def get_cell_seed(seed, cell_id):
+    """
+    get a seed for a cell, derived from the overall seed and the cell id
+
+    Parameters
+    ----------
+    seed: int
+        The overall seed for the run
+    cell_id: int or str
+        The id of the cell
+
+    Returns
+    -------
+    cell_seed: int
+        A seed suitable for np.random.RandomState
+    """
+    key = ('%s-%s' % (seed, cell_id)).encode('utf-8')
+    digest = hashlib.sha256(key).digest()
+    return int.from_bytes(digest[:4], 'little')
+
+
+class CellManifest(object):
+    """
+    SQLite manifest of the completed cells for a run
+
+    Parameters
+    ----------
+    path: str
+        Path to the SQLite database, created if it does not exist
+    """
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                'create table if not exists cells '
+                '(cell_id text primary key, seq integer)'
+            )
+            self._conn.execute(
+                'create table if not exists nrows '
+                '(shear_type text primary key, nrows integer)'
+            )
+            self._conn.execute(
+                'create table if not exists meta '
+                '(key text primary key, value text)'
+            )
+
+    def check_meta(self, **kwargs):
+        """
+        check the input values against those stored for the run, storing
+        them if not already present
+
+        A ValueError is raised if any do not match, e.g. when trying to
+        resume a run with a different config
+        """
+        with self._conn:
+            for key, value in kwargs.items():
+                value = str(value)
+                row = self._conn.execute(
+                    'select value from meta where key = ?', (key,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        'insert into meta (key, value) values (?, ?)',
+                        (key, value),
+                    )
+                elif row[0] != value:
+                    raise ValueError(
+                        'manifest %s has %s = %s but got %s' % (
+                            self.path, key, row[0], value,
+                        )
+                    )
+
+    def get_completed(self):
+        """
+        get the set of completed cell ids, as strings
+        """
+        return set(
+            row[0] for row in self._conn.execute('select cell_id from cells')
+        )
+
+    def get_nrows(self):
+        """
+        get the number of output rows per shear type as of the last
+        checkpoint
+        """
+        return dict(
+            self._conn.execute('select shear_type, nrows from nrows').fetchall()
+        )
+
+    def record(self, cell_ids, nrows):
+        """
+        record completed cells and the output row counts in one transaction
+
+        Parameters
+        ----------
+        cell_ids: list
+            The ids of the cells completed since the last checkpoint
+        nrows: dict
+            The number of rows on disk per shear type
+        """
+        with self._conn:
+            row = self._conn.execute('select max(seq) from cells').fetchone()
+            seq = 0 if row[0] is None else row[0] + 1
+            self._conn.executemany(
+                'insert into cells (cell_id, seq) values (?, ?)',
+                [(str(cell_id), seq + i) for i, cell_id in enumerate(cell_ids)],
+            )
+            self._conn.executemany(
+                'insert or replace into nrows (shear_type, nrows) values (?, ?)',
+                list(nrows.items()),
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def run_cells(
+    *,
+    cells,
+    config,
+    seed,
+    output,
+    manifest,
+    checkpoint_every=1,
+    writer_kwargs=None,
+    metadetect_kwargs=None,
+):
+    """
+    Run metadetect on a set of cells, streaming results to disk and
+    recording progress so the run can be resumed.
+
+    Cells that are already recorded as complete in the manifest are skipped.
+    Output rows written after the last checkpoint are removed before
+    processing starts.
+
+    Parameters
+    ----------
+    cells: iterable
+        Iterable of (cell_id, mbobs) pairs.  The mbobs can also be a function
+        that takes no arguments and returns the mbobs, in which case it is
+        only called for cells that need to be processed.
+    config: dict
+        The metadetect configuration
+    seed: int
+        The overall seed.  The seed for each cell is derived from this and the
+        cell id, see get_cell_seed.
+    output: str
+        The output path, see metadetect.io.CatalogWriter
+    manifest: str
+        Path to the SQLite manifest
+    checkpoint_every: int, optional
+        Record progress after this many cells.  Output is flushed to disk at
+        each checkpoint.  Default 1.
+    writer_kwargs: dict, optional
+        Extra keywords for metadetect.io.CatalogWriter
+    metadetect_kwargs: dict, optional
+        Extra keywords for metadetect.do_metadetect, e.g. shear_band_combs
+
+    Returns
+    -------
+    nproc, nskip: int
+        The number of cells processed and skipped
+    """
+    if checkpoint_every < 1:
+        raise ValueError(
+            'checkpoint_every must be >= 1, got %s' % checkpoint_every
+        )
+
+    if writer_kwargs is None:
+        writer_kwargs = {}
+    if metadetect_kwargs is None:
+        metadetect_kwargs = {}
+
+    nproc = 0
+    nskip = 0
+
+    with CellManifest(manifest) as man, CatalogWriter(
+        output, config=config, **writer_kwargs
+    ) as writer:
+        man.check_meta(config_hash=get_config_hash(config), seed=seed)
+
+        # remove anything written after the last checkpoint
+        writer.truncate(man.get_nrows())
+        completed = man.get_completed()
+
+        pending = []
+        for cell_id, mbobs in cells:
+            if str(cell_id) in completed:
+                nskip += 1
+                continue
+
+            if callable(mbobs):
+                mbobs = mbobs()
+
+            rng = np.random.RandomState(seed=get_cell_seed(seed, cell_id))
+
+            # the config can be modified by the metadetect code
+            res = do_metadetect(
+                copy.deepcopy(config), mbobs, rng, **metadetect_kwargs
+            )
+            writer.write(cell_id, res)
+            pending.append(cell_id)
+            nproc += 1
+
+            if len(pending) >= checkpoint_every:
+                _checkpoint(writer, man, pending)
+                pending = []
+
+        if len(pending) > 0:
+            _checkpoint(writer, man, pending)
+
+    logger.info('processed %d cells, skipped %d', nproc, nskip)
+    return nproc, nskip
+
+
+def _checkpoint(writer, manifest, cell_ids):
+    writer.flush()
+    manifest.record(cell_ids, writer.nrows)
+    logger.debug('checkpointed %d cells', len(cell_ids))
@@ -1,4 +1,12 @@
 BMASK_EDGE = 2**30
+
+# dtype of the detection and masked fraction images for each precision; the
+# pixels in ngmix observations are always float64
+PRECISION_DTYPES = {
+    'float64': 'f8',
+    'float32': 'f4',
+}
+DEFAULT_PRECISION = 'float64'
 DEFAULT_IMAGE_VALUES = {
     'image': 0.0,
     'weight': 0.0,
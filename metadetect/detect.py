@@ -171,11 +171,15 @@ class MEDSifier(object):
         Integer representing bits to mask for detection.  The results for all
         bands are ored together if combining multiple bands into a detection
         coadd.  Default 0
+    dtype: str, optional
+        The dtype of the detection image sent to sep, default 'f8'.  The
+        weighted sum over bands is always computed in double precision.
     """
-    def __init__(self, mbobs, sx_config, meds_config, nodet_flags=0):
+    def __init__(self, mbobs, sx_config, meds_config, nodet_flags=0, dtype='f8'):
         self.mbobs = mbobs
         self.nband = len(mbobs)
         self.nodet_flags = nodet_flags
+        self.dtype = dtype
 
         assert len(mbobs[0]) == 1, 'multi-epoch is not supported'
 
@@ -221,8 +225,7 @@ class MEDSifier(object):
 
     def _set_detim(self):
 
-        detim = self.mbobs[0][0].image.copy()
-        detim *= 0
+        shape = self.mbobs[0][0].image.shape
 
         vars = self._get_image_vars()
         weights = 1.0/vars
@@ -231,15 +234,21 @@ class MEDSifier(object):
 
         weights /= wsum
 
-        mask = np.zeros(detim.shape, dtype=bool)
+        mask = np.zeros(shape, dtype=bool)
+
+        # the weighted sum is accumulated in double precision, reusing one
+        # scratch array for the bands, and cast once to the requested dtype
+        detim = np.zeros(shape, dtype='f8')
+        scratch = np.empty(shape, dtype='f8')
 
         for i, obslist in enumerate(self.mbobs):
             obs = obslist[0]
-            detim += obs.image*weights[i]
+            np.multiply(obs.image, weights[i], out=scratch)
+            detim += scratch
             if obs.has_bmask():
                 mask |= (obs.bmask & self.nodet_flags != 0)
 
-        self.detim = detim
+        self.detim = detim.astype(self.dtype, copy=False)
         self.detnoise = detnoise
         self.detmask = mask
 
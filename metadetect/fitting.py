@@ -1,5 +1,6 @@
 import logging
 import copy
+import time
 
 import numpy as np
 
@@ -9,7 +10,7 @@ from ngmix.gexceptions import (
     BootPSFFailure, PSFFluxFailure,
 )
 from ngmix.moments import make_mom_result, fwhm_to_T
-from pkg_resources import parse_version
+from packaging.version import parse as parse_version
 from ngmix.bootstrap import bootstrap
 from ngmix.runners import Runner, PSFRunner
 from ngmix.guessers import SimplePSFGuesser
@@ -273,7 +274,7 @@ def _make_ml_prior(rng, scale, nband):
 
 def fit_mbobs_list_joint(
     *, mbobs_list, fitter_name, bmask_flags, rng, shear_bands=None,
-    symmetrize=True, coadd=False,
+    symmetrize=True, coadd=False, obj_callback=None,
 ):
     """Fit the ojects in a list of ngmix.MultiBandObsList using a joint fitter.
 
@@ -298,6 +299,9 @@ def fit_mbobs_list_joint(
     coadd : bool, optional
         If True, coadd the mbobs over all bands and then fit. Default is False.
         Ignored for adaptive moments which always coadds.
+    obj_callback : callable, optional
+        If given, called as obj_callback(i, mbobs, duration) after fitting each
+        object, with the fit time in seconds.
 
     Returns
     -------
@@ -326,6 +330,9 @@ def fit_mbobs_list_joint(
 
     res = []
     for i, mbobs in enumerate(mbobs_list):
+        if obj_callback is not None:
+            t0 = time.perf_counter()
+
         _res = fit_func(
             mbobs=mbobs,
             bmask_flags=bmask_flags,
@@ -335,6 +342,9 @@ def fit_mbobs_list_joint(
         )
         res.append(_res)
 
+        if obj_callback is not None:
+            obj_callback(i, mbobs, time.perf_counter() - t0)
+
     if len(res) > 0:
         return np.hstack(res)
     else:
@@ -674,7 +684,7 @@ def fit_all_psfs(mbobs, rng):
 
 def fit_mbobs_list_wavg(
     *, mbobs_list, fitter, bmask_flags, shear_bands=None, fwhm_reg=0,
-    symmetrize=True,
+    symmetrize=True, obj_callback=None,
 ):
     """Fit the ojects in a list of ngmix.MultiBandObsList using a weighted average
     over bands.
@@ -702,6 +712,9 @@ def fit_mbobs_list_wavg(
         Gaussian with FWHM `fwhm_reg`.
     symmetrize : bool, optional
         If True, apply 4-fold symmetry to the mask+weight map. Default is True.
+    obj_callback : callable, optional
+        If given, called as obj_callback(i, mbobs, duration) after fitting each
+        object, with the fit time in seconds.
 
     Returns
     -------
@@ -710,6 +723,8 @@ def fit_mbobs_list_wavg(
     """
     res = []
     for i, mbobs in enumerate(mbobs_list):
+        if obj_callback is not None:
+            t0 = time.perf_counter()
 
         _res = fit_mbobs_wavg(
             mbobs=mbobs,
@@ -721,6 +736,9 @@ def fit_mbobs_list_wavg(
         )
         res.append(_res)
 
+        if obj_callback is not None:
+            obj_callback(i, mbobs, time.perf_counter() - t0)
+
     if len(res) > 0:
         return np.hstack(res)
     else:
@@ -1398,16 +1416,19 @@ def symmetrize_obs_weights(obs):
         A copy of the input observation with a symmetrized weight map.
     """
     sym_obs = obs.copy()
-    if np.any(obs.weight <= 0):
-        new_wgt = obs.weight.copy()
-        for k in [1, 2, 3]:
-            msk = np.rot90(obs.weight, k=k) <= 0
-            new_wgt[msk] = 0
+    bad = obs.weight <= 0
+    if np.any(bad):
+        # pixels whose rotations have zero weight are set to zero, using the
+        # boolean mask rather than a copy of the weight map; the weights of
+        # the bad pixels themselves are left as they are
+        rot_bad = np.rot90(bad, k=1).copy()
+        for k in [2, 3]:
+            rot_bad |= np.rot90(bad, k=k)
 
         with sym_obs.writeable():
-            if not np.any(new_wgt > 0):
+            if np.all(bad | rot_bad):
                 sym_obs.ignore_zero_weight = False
-            sym_obs.weight[:, :] = new_wgt
+            sym_obs.weight[rot_bad] = 0
 
     return sym_obs
 
@@ -2,7 +2,6 @@
 interpolation utils - orig. from beckermr/pizza-cutter
 """
 import numpy as np
-from scipy.interpolate import CloughTocher2DInterpolator
 import logging
 
 from numba import njit
@@ -10,7 +9,7 @@ from numba import njit
 logger = logging.getLogger(__name__)
 
 
-@njit
+@njit(cache=True)
 def _get_nearby_good_pixels(bad_msk, nbad, buff, iso_buff):
     """
     get the set of good pixels surrounding bad pixels.
@@ -203,6 +202,9 @@ def interpolate_image_at_mask(
                     size=shape, scale=1.0/np.sqrt(weight)
                 )
 
+        # scipy is slow to import and this is rarely needed
+        from scipy.interpolate import CloughTocher2DInterpolator
+
         good_pix = np.array(good_yx).T
         bad_pix = np.array(bad_yx).T
         good_im = interp_image[good_yx[0], good_yx[1]]
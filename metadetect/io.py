@@ -0,0 +1,481 @@
+"""
+Code to stream metadetect results for many cells to disk
+
+The results for each cell are buffered in memory and written out in chunks,
+with one table per shear type.  FITS output uses fitsio and writes one
+extension per shear type.  Parquet output uses pyarrow and writes a
+directory per shear type holding one part file per chunk.
+"""
+import os
+import json
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CELL_ID_COLUMN = 'cell_id'
+CONFIG_HASH_KEY = 'CONFHASH'
+DEFAULT_BUFFER_ROWS = 100000
+
+# suffix for parquet part files while they are being written
+TMP_SUFFIX = '.tmp'
+
+FITS_EXTENSIONS = ('.fits', '.fit', '.fits.gz', '.fits.fz')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def get_config_hash(config):
+    """
+    get a stable hash of a configuration dict
+
+    Parameters
+    ----------
+    config: dict
+        The configuration.  Entries that are not JSON serializable are
+        converted to strings.
+
+    Returns
+    -------
+    hash: str
+        The sha1 hex digest of the config.
+    """
+    if config is None:
+        config = {}
+
+    dumped = json.dumps(config, sort_keys=True, default=_json_default)
+    return hashlib.sha1(dumped.encode('utf-8')).hexdigest()
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    else:
+        return str(obj)
+
+
+def get_default_format(path):
+    """
+    get the output format for the input path
+
+    The extension of the path is used if recognized, otherwise the format
+    is 'fits' if fitsio is installed and 'parquet' if pyarrow is installed
+
+    Parameters
+    ----------
+    path: str
+        The output path
+
+    Returns
+    -------
+    fmt: str
+        'fits' or 'parquet'
+    """
+    lpath = path.lower()
+    if lpath.endswith(FITS_EXTENSIONS):
+        return 'fits'
+    elif lpath.endswith(PARQUET_EXTENSIONS):
+        return 'parquet'
+
+    try:
+        import fitsio  # noqa
+        return 'fits'
+    except ImportError:
+        pass
+
+    try:
+        import pyarrow  # noqa
+        return 'parquet'
+    except ImportError:
+        pass
+
+    raise ImportError('you need either fitsio or pyarrow to write catalogs')
+
+
+def add_cell_id(data, cell_id, dtype='i8'):
+    """
+    get a copy of the data with the cell id as the first column
+
+    Parameters
+    ----------
+    data: array
+        A structured array of results
+    cell_id: int or str
+        The id of the cell
+    dtype: str, optional
+        The dtype for the cell id column, default 'i8'
+
+    Returns
+    -------
+    array with the cell id column
+    """
+    if CELL_ID_COLUMN in data.dtype.names:
+        raise ValueError(
+            'data already has a %s column' % CELL_ID_COLUMN
+        )
+
+    descr = [(CELL_ID_COLUMN, dtype)]
+    for name in data.dtype.names:
+        descr.append((name, data.dtype.fields[name][0]))
+
+    output = np.zeros(data.size, dtype=descr)
+    output[CELL_ID_COLUMN] = cell_id
+    for name in data.dtype.names:
+        output[name] = data[name]
+
+    return output
+
+
+class CatalogWriter(object):
+    """
+    Write metadetect results for many cells to disk as they finish.
+
+    Results are buffered and written in chunks, so memory use is bounded by
+    the buffer size rather than the total number of cells.  Use as a context
+    manager or call close() to write any remaining buffered rows.
+
+    Parameters
+    ----------
+    path: str
+        The output path.  For FITS this is a file with one extension per shear
+        type.  For parquet this is a directory holding one subdirectory per
+        shear type.
+    config: dict, optional
+        The metadetect config.  A hash of it is stored in the header (FITS) or
+        schema metadata (parquet) under CONFHASH.
+    fmt: str, optional
+        'fits' or 'parquet'.  Default is determined from the path and the
+        installed packages, see get_default_format.
+    buffer_rows: int, optional
+        The total number of rows to buffer across shear types before writing.
+        Default is 100000.
+    cell_id_dtype: str, optional
+        The dtype for the cell id column, default 'i8'
+    clobber: bool, optional
+        If True, remove existing output.  Default False, in which case an
+        existing output is appended to.  A ValueError is raised if the
+        existing output was written with a different config.
+
+    Examples
+    --------
+    with CatalogWriter('output.fits', config=config) as writer:
+        for cell_id, mbobs in cells:
+            res = do_metadetect(config, mbobs, rng)
+            writer.write(cell_id, res)
+    """
+    def __init__(
+        self, path, config=None, fmt=None, buffer_rows=DEFAULT_BUFFER_ROWS,
+        cell_id_dtype='i8', clobber=False,
+    ):
+        if fmt is None:
+            fmt = get_default_format(path)
+
+        if fmt == 'fits':
+            self._backend = _FITSBackend(path)
+        elif fmt == 'parquet':
+            self._backend = _ParquetBackend(path)
+        else:
+            raise ValueError("fmt should be 'fits' or 'parquet', got '%s'" % fmt)
+
+        if buffer_rows < 1:
+            raise ValueError('buffer_rows must be >= 1, got %s' % buffer_rows)
+
+        self.path = path
+        self.fmt = fmt
+        self.buffer_rows = buffer_rows
+        self.cell_id_dtype = cell_id_dtype
+        self.config_hash = get_config_hash(config)
+
+        if clobber:
+            self._backend.remove()
+
+        for config_hash in self._backend.get_config_hashes():
+            if config_hash != self.config_hash:
+                raise ValueError(
+                    'existing output %s was written with config hash %s, '
+                    'expected %s' % (path, config_hash, self.config_hash)
+                )
+
+        self._buffers = {}
+        self._nbuffered = 0
+        self._nwritten = self._backend.get_nrows()
+
+    @property
+    def nrows(self):
+        """
+        dict keyed by shear type with the number of rows written to disk
+        """
+        return dict(self._nwritten)
+
+    def write(self, cell_id, result):
+        """
+        add the results for a cell, writing to disk if the buffer is full
+
+        Parameters
+        ----------
+        cell_id: int or str
+            The id of the cell, stored in the cell_id column
+        result: dict or None
+            The result from metadetect, keyed by shear type.  None values are
+            skipped.
+        """
+        if result is None:
+            return
+
+        for shear_type, data in result.items():
+            if data is None or data.size == 0:
+                continue
+
+            data = add_cell_id(data, cell_id, dtype=self.cell_id_dtype)
+
+            if shear_type not in self._buffers:
+                self._buffers[shear_type] = []
+
+            self._buffers[shear_type].append(data)
+            self._nbuffered += data.size
+
+        if self._nbuffered >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        write all buffered rows to disk
+        """
+        for shear_type, buff in self._buffers.items():
+            if len(buff) == 0:
+                continue
+
+            data = np.concatenate(buff)
+            logger.debug('writing %d rows for %s', data.size, shear_type)
+            self._backend.write(
+                shear_type=shear_type,
+                data=data,
+                start=self._nwritten.get(shear_type, 0),
+                config_hash=self.config_hash,
+            )
+            self._nwritten[shear_type] = (
+                self._nwritten.get(shear_type, 0) + data.size
+            )
+
+        self._buffers = {}
+        self._nbuffered = 0
+
+    def truncate(self, nrows):
+        """
+        truncate the output to the input number of rows per shear type
+
+        Any buffered rows are discarded, as are any partial files left by
+        an interrupted write.  This is used to remove partial
+        output, e.g. rows written after the last checkpoint of an
+        interrupted run.
+
+        Parameters
+        ----------
+        nrows: dict
+            The number of rows to keep, keyed by shear type.  Shear types
+            not in the dict are truncated to zero rows.
+        """
+        self._buffers = {}
+        self._nbuffered = 0
+        self._backend.remove_partial()
+
+        # a shear type expected in nrows but missing from the output, e.g.
+        # if the output was removed, counts as having no rows written
+        for shear_type in sorted(set(nrows) | set(self._nwritten)):
+            nwritten = self._nwritten.get(shear_type, 0)
+            keep = nrows.get(shear_type, 0)
+            if keep > nwritten:
+                raise ValueError(
+                    'cannot truncate %s to %d rows, only %d were written' % (
+                        shear_type, keep, nwritten,
+                    )
+                )
+            if keep < nwritten:
+                logger.info(
+                    'truncating %s from %d to %d rows',
+                    shear_type, nwritten, keep,
+                )
+                self._backend.truncate(shear_type=shear_type, nrows=keep)
+
+        self._nwritten = self._backend.get_nrows()
+
+    def close(self):
+        """
+        write any remaining buffered rows
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+class _FITSBackend(object):
+    def __init__(self, path):
+        self.path = path
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get_nrows(self):
+        import fitsio
+
+        nrows = {}
+        if os.path.exists(self.path):
+            with fitsio.FITS(self.path) as fits:
+                for hdu in fits[1:]:
+                    nrows[hdu.get_extname()] = hdu.get_nrows()
+        return nrows
+
+    def remove_partial(self):
+        # rows are appended in place, there are no partial files
+        pass
+
+    def get_config_hashes(self):
+        import fitsio
+
+        hashes = set()
+        if os.path.exists(self.path):
+            with fitsio.FITS(self.path) as fits:
+                for hdu in fits[1:]:
+                    hashes.add(hdu.read_header().get(CONFIG_HASH_KEY))
+        return hashes
+
+    def truncate(self, shear_type, nrows):
+        import fitsio
+
+        with fitsio.FITS(self.path, 'rw') as fits:
+            hdu = fits[shear_type]
+            hdu.delete_rows(slice(nrows, hdu.get_nrows()))
+
+    def write(self, shear_type, data, start, config_hash):
+        import fitsio
+
+        with fitsio.FITS(self.path, 'rw') as fits:
+            if shear_type in fits:
+                fits[shear_type].append(data)
+            else:
+                fits.write(
+                    data,
+                    extname=shear_type,
+                    header={CONFIG_HASH_KEY: config_hash},
+                )
+
+
+class _ParquetBackend(object):
+    def __init__(self, path):
+        self.path = path
+
+    def remove(self):
+        import shutil
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+    def get_nrows(self):
+        import pyarrow.parquet as pq
+
+        return {
+            shear_type: sum(
+                pq.ParquetFile(fname).metadata.num_rows
+                for fname in self.get_part_files(shear_type)
+            )
+            for shear_type in self.get_shear_types()
+        }
+
+    def get_config_hashes(self):
+        import pyarrow.parquet as pq
+
+        hashes = set()
+        for shear_type in self.get_shear_types():
+            for fname in self.get_part_files(shear_type):
+                metadata = pq.ParquetFile(fname).schema_arrow.metadata or {}
+                config_hash = metadata.get(CONFIG_HASH_KEY.encode())
+                if config_hash is not None:
+                    config_hash = config_hash.decode()
+                hashes.add(config_hash)
+        return hashes
+
+    def get_shear_types(self):
+        if not os.path.exists(self.path):
+            return []
+        return [
+            shear_type
+            for shear_type in sorted(os.listdir(self.path))
+            if os.path.isdir(os.path.join(self.path, shear_type))
+        ]
+
+    def get_part_files(self, shear_type):
+        # anything else, e.g. a temporary file left by an interrupted
+        # write, is not part of the output
+        dname = os.path.join(self.path, shear_type)
+        return [
+            os.path.join(dname, fname)
+            for fname in sorted(os.listdir(dname))
+            if fname.endswith('.parquet')
+        ]
+
+    def remove_partial(self):
+        # temporary files left by an interrupted write
+        for shear_type in self.get_shear_types():
+            dname = os.path.join(self.path, shear_type)
+            for fname in os.listdir(dname):
+                if fname.endswith(TMP_SUFFIX):
+                    os.remove(os.path.join(dname, fname))
+
+    def truncate(self, shear_type, nrows):
+        import pyarrow.parquet as pq
+
+        start = 0
+        for fname in self.get_part_files(shear_type):
+            if start >= nrows:
+                os.remove(fname)
+            else:
+                start += pq.ParquetFile(fname).metadata.num_rows
+                if start > nrows:
+                    raise ValueError(
+                        'cannot truncate %s to %d rows, it falls within '
+                        'the part file %s' % (shear_type, nrows, fname)
+                    )
+
+    def write(self, shear_type, data, start, config_hash):
+        import pyarrow.parquet as pq
+
+        dname = os.path.join(self.path, shear_type)
+        os.makedirs(dname, exist_ok=True)
+
+        # the starting row is in the name so parts sort in the order written
+        fname = os.path.join(dname, 'part-%012d.parquet' % start)
+
+        # write to a temporary file and move it into place, so an
+        # interrupted write does not leave a partial part file
+        tmpname = fname + TMP_SUFFIX
+        table = _array_to_arrow_table(data, config_hash=config_hash)
+        pq.write_table(table, tmpname)
+        os.replace(tmpname, fname)
+
+
+def _array_to_arrow_table(data, config_hash):
+    import pyarrow as pa
+
+    columns = []
+    for name in data.dtype.names:
+        col = data[name]
+        if col.ndim > 1:
+            size = int(np.prod(col.shape[1:]))
+            flat = pa.array(np.ascontiguousarray(col).ravel())
+            columns.append(pa.FixedSizeListArray.from_arrays(flat, size))
+        else:
+            columns.append(pa.array(col))
+
+    return pa.Table.from_arrays(
+        columns,
+        names=list(data.dtype.names),
+        metadata={CONFIG_HASH_KEY: config_hash},
+    )
@@ -0,0 +1,80 @@
+"""
+Compile the numba kernels ahead of time.
+
+The kernels in masking and interpolate are compiled with cache=True, so the
+machine code is written to disk next to the source, or to NUMBA_CACHE_DIR,
+and later processes load it rather than compiling again.  warmup compiles
+the kernels, or loads them from the cache, for all the argument types used
+in metadetect, so that a scheduler can pay this cost before timing sensitive
+work starts.
+"""
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# image dtypes for the apodization masks; the LSST images are float32
+WARMUP_IMAGE_DTYPES = ('f8', 'f4')
+
+
+def warmup():
+    """
+    compile all numba kernels for the argument types used in metadetect
+
+    Returns
+    -------
+    kernels: list
+        The kernels called, which were compiled or loaded from the cache
+    """
+    from . import masking
+    from . import interpolate
+
+    tm0 = time.time()
+
+    dims = (8, 8)
+    # one mask center on the image, positions and radii are always float64
+    rows = np.array([3.5])
+    cols = np.array([4.0])
+    radius_pixels = np.array([2.0])
+
+    masking._do_mask_foreground(
+        rows=rows,
+        cols=cols,
+        radius_pixels=radius_pixels,
+        bmask=np.zeros(dims, dtype='i4'),
+        flag=2**30,
+    )
+
+    # the apodization radius can be set as an int or a float
+    for ap_rad in (1.5, 1):
+        masking._do_apodization_mask(
+            rows=rows,
+            cols=cols,
+            radius_pixels=radius_pixels,
+            ap_mask=np.ones(dims, dtype='f8'),
+            ap_rad=ap_rad,
+        )
+        for dtype in WARMUP_IMAGE_DTYPES:
+            masking._build_square_apodization_mask(
+                ap_rad, np.ones(dims, dtype=dtype),
+            )
+        masking.get_ap_range(ap_rad)
+
+    bad_msk = np.zeros(dims, dtype=bool)
+    bad_msk[3:5, 3:5] = True
+    interpolate._get_nearby_good_pixels(bad_msk, bad_msk.sum(), 4, 1)
+
+    # _intersects and _ap_kern_kern are compiled into the kernels calling them
+    kernels = [
+        masking.get_ap_range,
+        masking._build_square_apodization_mask,
+        masking._do_apodization_mask,
+        masking._do_mask_foreground,
+        interpolate._get_nearby_good_pixels,
+    ]
+
+    logger.info('numba warmup took %.3f seconds', time.time() - tm0)
+
+    return kernels
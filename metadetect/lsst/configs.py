@@ -6,6 +6,7 @@ from .defaults import (
     DEFAULT_FWHM_SMOOTH,
     DEFAULT_FWHM_REG,
     DEFAULT_STAMP_SIZES,
+    CENTROID_NEEDS_ISOLATION,
 )
 
 
@@ -65,6 +66,7 @@ def _fill_config(config):
     # own verification
     _verify_psf_config(config['psf'])
     _verify_detect_config(config['detect'])
+    _verify_skysub_config(config['skysub'])
 
 
 def get_default_weight_config(meas_type):
@@ -130,7 +132,24 @@ def _verify_detect_config(config):
         config=config, required_keys=['thresh'], name=name,
     )
 
-    _check_keywords(config=config, allowed_keys=['thresh'], name=name)
+    _check_keywords(
+        config=config, allowed_keys=['thresh', 'centroid'], name=name,
+    )
+
+    centroid = config.get('centroid')
+    if centroid is not None and centroid not in CENTROID_NEEDS_ISOLATION:
+        raise ValueError(
+            f'bad centroid "{centroid}" in {name} config, should be one '
+            f'of {list(CENTROID_NEEDS_ISOLATION)}'
+        )
+
+
+def _verify_skysub_config(config):
+
+    _check_keywords(
+        config=config, allowed_keys=['nthreads', 'share_footprints'],
+        name='skysub',
+    )
 
 
 def _verify_weight_config(config):
@@ -19,9 +19,38 @@ DEFAULT_STAMP_SIZES = {
 # threshold for detection
 DEFAULT_THRESH = 5.0
 
+# centroid algorithm run on detections, and whether it needs neighbors to be
+# replaced by noise when it is run.  The peak centroid only uses the peak
+# pixel and its neighbors so it does not need the noise replacer; the psf
+# flux is then not measured, since it would need the replacer
+DEFAULT_CENTROID = 'base_SdssCentroid'
+CENTROID_NEEDS_ISOLATION = {
+    'base_SdssCentroid': True,
+    'base_PeakCentroid': False,
+}
+
+# psf images for spatially varying psfs are reused for sources within this many
+# pixels, reconstructed at the rounded position.  None means reconstruct the
+# psf at each source position.  Spatially constant psfs are always
+# reconstructed once
+DEFAULT_PSF_CACHE_QUANTUM = None
+
+# extract stamps by slicing the exposure arrays rather than creating
+# sub-exposures; the weight is then from the median variance over the full
+# exposure rather than the stamp
+DEFAULT_FAST_STAMPS = False
+
 # whether to find and subtract the sky, happens before metacal
 DEFAULT_SUBTRACT_SKY = False
 
+# control of the sky subtraction.  The bands can be processed in threads, and
+# the detections from the first band can be used to mask objects in the
+# others, which is only appropriate when the bands are well registered
+DEFAULT_SKYSUB_CONFIG = {
+    'nthreads': 1,
+    'share_footprints': False,
+}
+
 # config for fitting the original psfs
 DEFAULT_PSF_CONFIG = {
     'model': 'am',
@@ -38,6 +67,7 @@ DEFAULT_METACAL_CONFIG = {
 # detection config, this may expand
 DEFAULT_DETECT_CONFIG = {
     'thresh': DEFAULT_THRESH,
+    'centroid': DEFAULT_CENTROID,
 }
 
 # the weight subconfig and the stamp_size defaults we be filled in
@@ -45,9 +75,12 @@ DEFAULT_DETECT_CONFIG = {
 DEFAULT_MDET_CONFIG = {
     'meas_type': 'wmom',
     'subtract_sky': DEFAULT_SUBTRACT_SKY,
+    'skysub': deepcopy(DEFAULT_SKYSUB_CONFIG),
     'detect': deepcopy(DEFAULT_DETECT_CONFIG),
     'psf': deepcopy(DEFAULT_PSF_CONFIG),
     'metacal': deepcopy(DEFAULT_METACAL_CONFIG),
     'weight': None,
     'stamp_size': None,
+    'psf_cache_quantum': DEFAULT_PSF_CACHE_QUANTUM,
+    'fast_stamps': DEFAULT_FAST_STAMPS,
 }
@@ -1,4 +1,5 @@
 import logging
+import threading
 import warnings
 import numpy as np
 import esutil as eu
@@ -24,8 +25,10 @@ from ..fitting import fit_mbobs_wavg, get_wavg_output_struct
 
 from . import util
 from .util import ContextNoiseReplacer
-from . import vis
-from .defaults import DEFAULT_THRESH
+from .defaults import (
+    DEFAULT_THRESH, DEFAULT_PSF_CACHE_QUANTUM, DEFAULT_FAST_STAMPS,
+    DEFAULT_CENTROID, CENTROID_NEEDS_ISOLATION,
+)
 
 warnings.filterwarnings('ignore', category=FutureWarning)
 
@@ -36,12 +39,18 @@ def detect_and_deblend(
     mbexp,
     rng,
     thresh=DEFAULT_THRESH,
+    centroid=DEFAULT_CENTROID,
+    unit_noise=None,
+    coadd_weights=None,
     show=False,
 ):
     """
     run detection and deblending of peaks, as well as basic measurments such as
     centroid.  The SDSS deblender is run in order to split footprints.
 
+    If the centroid algorithm needs it, neighbors are replaced with noise when
+    measuring each source
+
     We must combine detection and deblending in the same function because the
     schema gets modified in place, which means we must construct the deblend
     task at the same time as the detect task
@@ -54,6 +63,20 @@ def detect_and_deblend(
         Random number generator for noise replacer
     thresh: float, optional
         The detection threshold in units of the sky noise
+    centroid: str, optional
+        The centroid algorithm, one of the keys of
+        defaults.CENTROID_NEEDS_ISOLATION.  Default base_SdssCentroid.  For
+        centroids that do not need neighbors replaced by noise, such as
+        base_PeakCentroid, the noise replacer is not run and base_PsfFlux,
+        which would need it, is not measured.
+    unit_noise: array, optional
+        Noise with unit variance and the shape of the exposures, used to
+        replace neighbors after scaling to the noise level of the detection
+        exposure.  Send the same field for all the metacal exposures of a cell
+        so it is only drawn once.  If not sent a new field is drawn.
+    coadd_weights: array, optional
+        The weights for coadding the bands into the detection exposure, see
+        util.get_coadd_weights.  If not sent they are calculated.
     show: bool, optional
         If set to True, show images
 
@@ -65,7 +88,7 @@ def detect_and_deblend(
     import lsst.afw.image as afw_image
 
     if len(mbexp.singles) > 1:
-        detexp = util.coadd_exposures(mbexp.singles)
+        detexp = util.coadd_exposures(mbexp.singles, weights=coadd_weights)
         if detexp is None:
             return [], None
     else:
@@ -75,110 +98,243 @@ def detect_and_deblend(
     if not isinstance(detexp, afw_image.ExposureF):
         detexp = afw_image.ExposureF(detexp, deep=True)
 
-    schema = afw_table.SourceTable.makeMinimalSchema()
-
-    # Setup algorithms to run
-    meas_config = SingleFrameMeasurementConfig()
-    meas_config.plugins.names = [
-        "base_SdssCentroid",
-        "base_PsfFlux",
-        "base_SkyCoord",
-    ]
+    pipeline = get_detection_pipeline(
+        thresh=thresh,
+        exclude_mask_planes=util.get_detection_mask(detexp),
+        stats_mask=util.get_stats_mask(detexp),
+        centroid=centroid,
+    )
 
-    # set these slots to none because we aren't running these algorithms
-    meas_config.slots.apFlux = None
-    meas_config.slots.gaussianFlux = None
-    meas_config.slots.calibFlux = None
-    meas_config.slots.modelFlux = None
+    # the metadata is cleared even if a task fails, so it does not
+    # accumulate in the cached tasks
+    try:
+        sources = _run_detection_pipeline(
+            pipeline=pipeline, detexp=detexp, rng=rng, centroid=centroid,
+            unit_noise=unit_noise,
+        )
+    finally:
+        pipeline.reset_metadata()
 
-    # goes with SdssShape above
-    meas_config.slots.shape = None
+    if show:
+        # matplotlib is slow to import, only import it when showing
+        from . import vis
+        vis.show_exp(detexp, use_mpl=True, sources=sources)
 
-    # fix odd issue where it things things are near the edge
-    meas_config.plugins['base_SdssCentroid'].binmax = 1
+    return sources, detexp
 
-    meas_task = SingleFrameMeasurementTask(
-        config=meas_config,
-        schema=schema,
-    )
-    # avoids a warning spamming for every object
-    afw_table.CoordKey.addErrorFields(schema)
-
-    detection_config = SourceDetectionConfig()
-
-    # DM does not have config default stability.  Set all of them explicitly
-    detection_config.minPixels = 1
-    detection_config.isotropicGrow = True
-    detection_config.combinedGrow = True
-    detection_config.nSigmaToGrow = 2.4
-    detection_config.returnOriginalFootprints = False
-    detection_config.includeThresholdMultiplier = 1.0
-    detection_config.thresholdPolarity = "positive"
-    detection_config.adjustBackground = 0.0
-    detection_config.reEstimateBackground = True
-    # these are ignored since we are doing reEstimateBackground = False
-    # detection_config.background
-    # detection_config.tempLocalBackground
-    # detection_config.doTempLocalBackground
-    # detection_config.tempWideBackground
-    # detection_config.doTempWideBackground
-
-    detection_config.nPeaksMaxSimple = 1
-    detection_config.nSigmaForKernel = 7.0
-    detection_config.excludeMaskPlanes = util.get_detection_mask(detexp)
-
-    # the defaults changed from from stdev to pixel_std but
-    # we don't want that
-
-    detection_config.thresholdType = "stdev"
-    # our changes from defaults
-    detection_config.reEstimateBackground = False
-
-    detection_config.thresholdValue = thresh
-
-    # these will be ignored when finding the image standard deviation
-    detection_config.statsMask = util.get_stats_mask(detexp)
-
-    detection_task = SourceDetectionTask(config=detection_config)
-
-    # these tasks must use the same schema and all be constructed before any
-    # other tasks using the same schema are run because schema is modified in
-    # place by tasks, and the constructor does a check that fails if we do this
-    # afterward
-    deblend_config = SourceDeblendConfig()
-    deblend_config.maxFootprintArea = 0
-    deblend_task = SourceDeblendTask(
-        config=deblend_config,
-        schema=schema,
-    )
 
-    table = afw_table.SourceTable.make(schema)
+def _run_detection_pipeline(pipeline, detexp, rng, centroid, unit_noise):
+    """
+    detect, deblend and measure the centroids with the tasks in the pipeline
+    """
+    # a fresh table for each run, the tasks and schema are reused
+    table = afw_table.SourceTable.make(pipeline.schema)
 
-    result = detection_task.run(table, detexp)
+    result = pipeline.detection_task.run(table, detexp)
 
     if result is not None:
         sources = result.sources
-        deblend_task.run(detexp, sources)
+        pipeline.deblend_task.run(detexp, sources)
 
-        with ContextNoiseReplacer(detexp, sources, rng) as replacer:
+        if CENTROID_NEEDS_ISOLATION[centroid]:
+            noise_image = util.get_noise_image(
+                detexp, rng=rng, remove_poisson=False, unit_noise=unit_noise,
+            )
+            with ContextNoiseReplacer(
+                detexp, sources, rng, noise_image=noise_image,
+            ) as replacer:
 
-            for source in sources:
+                for source in sources:
 
-                if source.get('deblend_nChild') != 0:
-                    continue
+                    if source.get('deblend_nChild') != 0:
+                        continue
 
-                source_id = source.getId()
+                    source_id = source.getId()
 
-                with replacer.sourceInserted(source_id):
-                    meas_task.callMeasure(source, detexp)
+                    with replacer.sourceInserted(source_id):
+                        pipeline.meas_task.callMeasure(source, detexp)
+        else:
+            for source in sources:
+                if source.get('deblend_nChild') == 0:
+                    pipeline.meas_task.callMeasure(source, detexp)
 
     else:
         sources = []
 
-    if show:
-        vis.show_exp(detexp, use_mpl=True, sources=sources)
+    return sources
 
-    return sources, detexp
+
+# the tasks are not thread safe, so the cache of DetectionPipeline, keyed by
+# the detection settings, is kept separately for each thread
+_DETECTION_PIPELINES = threading.local()
+
+
+def get_detection_pipeline(
+    thresh, exclude_mask_planes, stats_mask, centroid=DEFAULT_CENTROID,
+):
+    """
+    get a DetectionPipeline for the input settings, constructing it only the
+    first time it is requested in this thread
+
+    Parameters
+    ----------
+    thresh: float
+        The detection threshold in units of the sky noise
+    exclude_mask_planes: list of str
+        Mask planes for regions that are not searched for objects
+    stats_mask: list of str
+        Mask planes that are ignored when finding the image standard
+        deviation
+    centroid: str, optional
+        The centroid algorithm.  Default base_SdssCentroid.
+
+    Returns
+    -------
+    pipeline: DetectionPipeline
+    """
+    key = (
+        float(thresh), tuple(exclude_mask_planes), tuple(stats_mask), centroid,
+    )
+
+    cache = getattr(_DETECTION_PIPELINES, 'cache', None)
+    if cache is None:
+        cache = _DETECTION_PIPELINES.cache = {}
+
+    pipeline = cache.get(key)
+    if pipeline is None:
+        pipeline = DetectionPipeline(
+            thresh=thresh,
+            exclude_mask_planes=exclude_mask_planes,
+            stats_mask=stats_mask,
+            centroid=centroid,
+        )
+        cache[key] = pipeline
+
+    return pipeline
+
+
+class DetectionPipeline(object):
+    """
+    The schema and the measurement, detection and deblending tasks used by
+    detect_and_deblend
+
+    Constructing the tasks is expensive, so they are built once and reused.
+    Each run should make a new table from the schema, and call
+    reset_metadata when done.
+
+    Parameters
+    ----------
+    thresh: float
+        The detection threshold in units of the sky noise
+    exclude_mask_planes: list of str
+        Mask planes for regions that are not searched for objects
+    stats_mask: list of str
+        Mask planes that are ignored when finding the image standard
+        deviation
+    centroid: str, optional
+        The centroid algorithm.  Default base_SdssCentroid.
+    """
+    def __init__(
+        self, thresh, exclude_mask_planes, stats_mask,
+        centroid=DEFAULT_CENTROID,
+    ):
+        # the schema is only modified by the task constructors, not when the
+        # tasks are run, so the tasks can be reused for any number of tables
+        # made from it
+        self.schema = schema = afw_table.SourceTable.makeMinimalSchema()
+
+        # Setup algorithms to run.  The psf flux needs neighbors replaced by
+        # noise, so it is only run along with centroids that need it too
+        meas_config = SingleFrameMeasurementConfig()
+        if CENTROID_NEEDS_ISOLATION[centroid]:
+            meas_config.plugins.names = [
+                centroid,
+                "base_PsfFlux",
+                "base_SkyCoord",
+            ]
+        else:
+            meas_config.plugins.names = [
+                centroid,
+                "base_SkyCoord",
+            ]
+            meas_config.slots.psfFlux = None
+        meas_config.slots.centroid = centroid
+
+        # set these slots to none because we aren't running these algorithms
+        meas_config.slots.apFlux = None
+        meas_config.slots.gaussianFlux = None
+        meas_config.slots.calibFlux = None
+        meas_config.slots.modelFlux = None
+
+        # goes with SdssShape above
+        meas_config.slots.shape = None
+
+        if centroid == 'base_SdssCentroid':
+            # fix odd issue where it things things are near the edge
+            meas_config.plugins['base_SdssCentroid'].binmax = 1
+
+        self.meas_task = SingleFrameMeasurementTask(
+            config=meas_config,
+            schema=schema,
+        )
+        # avoids a warning spamming for every object
+        afw_table.CoordKey.addErrorFields(schema)
+
+        detection_config = SourceDetectionConfig()
+
+        # DM does not have config default stability.  Set all of them explicitly
+        detection_config.minPixels = 1
+        detection_config.isotropicGrow = True
+        detection_config.combinedGrow = True
+        detection_config.nSigmaToGrow = 2.4
+        detection_config.returnOriginalFootprints = False
+        detection_config.includeThresholdMultiplier = 1.0
+        detection_config.thresholdPolarity = "positive"
+        detection_config.adjustBackground = 0.0
+        detection_config.reEstimateBackground = True
+        # these are ignored since we are doing reEstimateBackground = False
+        # detection_config.background
+        # detection_config.tempLocalBackground
+        # detection_config.doTempLocalBackground
+        # detection_config.tempWideBackground
+        # detection_config.doTempWideBackground
+
+        detection_config.nPeaksMaxSimple = 1
+        detection_config.nSigmaForKernel = 7.0
+        detection_config.excludeMaskPlanes = list(exclude_mask_planes)
+
+        # the defaults changed from from stdev to pixel_std but
+        # we don't want that
+
+        detection_config.thresholdType = "stdev"
+        # our changes from defaults
+        detection_config.reEstimateBackground = False
+
+        detection_config.thresholdValue = thresh
+
+        # these will be ignored when finding the image standard deviation
+        detection_config.statsMask = list(stats_mask)
+
+        self.detection_task = SourceDetectionTask(config=detection_config)
+
+        # these tasks must use the same schema and all be constructed before any
+        # other tasks using the same schema are run because schema is modified in
+        # place by tasks, and the constructor does a check that fails if we do this
+        # afterward
+        deblend_config = SourceDeblendConfig()
+        deblend_config.maxFootprintArea = 0
+        self.deblend_task = SourceDeblendTask(
+            config=deblend_config,
+            schema=schema,
+        )
+
+    def reset_metadata(self):
+        """
+        clear the metadata the tasks record for each run, which would
+        otherwise grow without bound as the tasks are reused
+        """
+        for task in (self.meas_task, self.detection_task, self.deblend_task):
+            util.reset_task_metadata(task)
 
 
 def measure(
@@ -188,6 +344,8 @@ def measure(
     fitter,
     stamp_size,
     fwhm_reg=0,
+    psf_cache_quantum=DEFAULT_PSF_CACHE_QUANTUM,
+    fast_stamps=DEFAULT_FAST_STAMPS,
 ):
     """
     run measurements on the input exposure, given the input measurement task,
@@ -208,6 +366,13 @@ def measure(
     fwhm_reg: float, optional
         Optional regularization for calculating shapes.  The fwhm is converted
         to T and T+Treg is used in the denominator
+    psf_cache_quantum: float, optional
+        For spatially varying psfs, reuse the psf image for sources within
+        this many pixels, see PSFImageCache.  Default None, meaning the psf
+        is reconstructed at each source position.
+    fast_stamps: bool, optional
+        If True, extract stamps by slicing the exposure arrays, see
+        StampExtractor.  Default False.
 
     Returns
     -------
@@ -217,6 +382,13 @@ def measure(
     if len(sources) == 0:
         return None
 
+    psf_caches = {
+        band: PSFImageCache(mbexp[band], quantum=psf_cache_quantum)
+        for band in mbexp.filters
+    }
+    if fast_stamps:
+        extractor = StampExtractor(mbexp, psf_caches=psf_caches)
+
     nband = len(mbexp.filters)
     exp_bbox = mbexp.getBBox()
     wcs = mbexp.singles[0].getWcs()
@@ -234,9 +406,15 @@ def measure(
 
         flags = 0
         try:
-            mbobs = _get_stamp_mbobs(
-                mbexp=mbexp, source=source, stamp_size=stamp_size,
-            )
+            if fast_stamps:
+                mbobs = extractor.get_mbobs(
+                    source=source, stamp_size=stamp_size,
+                )
+            else:
+                mbobs = _get_stamp_mbobs(
+                    mbexp=mbexp, source=source, stamp_size=stamp_size,
+                    psf_caches=psf_caches,
+                )
 
             # TODO do something with bmask_flags?
             this_res = fit_mbobs_wavg(
@@ -290,13 +468,18 @@ def get_bmasks(sources, exposure):
 
     Returns
     -------
-    list of bmask values
+    array of bmask values
     """
-    bmasks = []
-    for source in sources:
-        bmask = get_bmask(source=source, exposure=exposure)
-        bmasks.append(bmask)
-    return bmasks
+    if len(sources) == 0:
+        return np.zeros(0, dtype=exposure.mask.array.dtype)
+
+    peaks = [source.getFootprint().getPeaks()[0] for source in sources]
+    ix = np.array([peak.getIx() for peak in peaks])
+    iy = np.array([peak.getIy() for peak in peaks])
+
+    # the peaks are in the parent coordinate system
+    xy0 = exposure.getXY0()
+    return exposure.mask.array[iy - xy0.getY(), ix - xy0.getX()]
 
 
 def get_bmask(source, exposure):
@@ -320,7 +503,7 @@ def get_bmask(source, exposure):
     return maskval
 
 
-def extract_obs(exp, source):
+def extract_obs(exp, source, psf_cache=None):
     """
     convert an image object into an ngmix.Observation, including
     a psf observation
@@ -331,6 +514,8 @@ def extract_obs(exp, source):
         The exposure
     source: lsst.afw.table.SourceRecord
         The source record
+    psf_cache: PSFImageCache, optional
+        If sent, get the psf image from this cache
 
     returns
     --------
@@ -353,7 +538,21 @@ def extract_obs(exp, source):
 
     orig_cen = source.getCentroid()
 
-    psf_im = extract_psf_image(exposure=exp, orig_cen=orig_cen)
+    if psf_cache is not None:
+        psf_im = psf_cache.get_psf_image(orig_cen)
+    else:
+        psf_im = extract_psf_image(exposure=exp, orig_cen=orig_cen)
+
+    return _make_obs(
+        im=im, wt=wt, bmask=bmask, jacob=jacob, psf_im=psf_im,
+        orig_cen=orig_cen,
+    )
+
+
+def _make_obs(im, wt, bmask, jacob, psf_im, orig_cen):
+    """
+    make the observation for a stamp, including a psf observation
+    """
 
     # fake the psf pixel noise
     psf_err = psf_im.max()*0.0001
@@ -388,7 +587,199 @@ def extract_obs(exp, source):
     return obs
 
 
-def _get_stamp_mbobs(mbexp, source, stamp_size, clip=False):
+class StampExtractor(object):
+    """
+    Extract postage stamp observations by slicing the exposure arrays,
+    rather than creating a sub-exposure for each source and band
+
+    The image, variance and mask arrays are pulled from each exposure once,
+    and the stamps are views into them.  The weight for each stamp is the
+    inverse of the median of the positive variance over the full exposure,
+    rather than over the stamp as for extract_obs.  The jacobian is the local
+    linearization of the wcs at the source centroid.
+
+    Parameters
+    ----------
+    mbexp: lsst.afw.image.MultibandExposure
+        The exposures
+    psf_caches: dict, optional
+        PSFImageCache for each band.  If not sent, caches are created that
+        reconstruct the psf at each source position.
+    """
+    def __init__(self, mbexp, psf_caches=None):
+        self.mbexp = mbexp
+
+        exp_bbox = mbexp.getBBox()
+        self.x0 = exp_bbox.getMinX()
+        self.y0 = exp_bbox.getMinY()
+
+        if psf_caches is None:
+            psf_caches = {
+                band: PSFImageCache(mbexp[band]) for band in mbexp.filters
+            }
+
+        self.band_data = {}
+        for band in mbexp.filters:
+            exp = mbexp[band]
+            var = exp.variance.array
+
+            wpos = np.where(var > 0)
+            if wpos[0].size > 0:
+                medvar = np.median(var[wpos])
+            else:
+                medvar = None
+
+            self.band_data[band] = {
+                'exp': exp,
+                'image': exp.image.array,
+                'variance': var,
+                'mask': exp.mask.array,
+                'medvar': medvar,
+                'psf_cache': psf_caches[band],
+            }
+
+        # coadds typically share the wcs, in which case the jacobian is only
+        # calculated once per source
+        wcs = mbexp.singles[0].getWcs()
+        self.same_wcs = all(exp.getWcs() == wcs for exp in mbexp.singles)
+
+    def get_mbobs(self, source, stamp_size):
+        """
+        get the observations for a source
+
+        Parameters
+        ----------
+        source: lsst.afw.table.SourceRecord
+            The source for which to get the stamp
+        stamp_size: int
+            The stamp size, see _get_bbox.  If the stamp does not fit
+            into the exposure, a lsst.pex.exceptions.LengthError is raised
+
+        Returns
+        -------
+        mbobs: ngmix.MultiBandObsList
+        """
+        bbox = _get_bbox(self.mbexp, source, stamp_size)
+
+        rows = slice(bbox.getMinY() - self.y0, bbox.getMaxY() - self.y0 + 1)
+        cols = slice(bbox.getMinX() - self.x0, bbox.getMaxX() - self.x0 + 1)
+
+        orig_cen = _get_source_cen(source)
+        centroid = source.getCentroid()
+
+        jacob = None
+        mbobs = ngmix.MultiBandObsList()
+        for band, data in self.band_data.items():
+
+            var = data['variance'][rows, cols]
+            if data['medvar'] is None or not np.any(var > 0):
+                raise AllZeroWeightError('all weights <= 0')
+
+            wt = np.full(var.shape, 1.0/data['medvar'], dtype=var.dtype)
+
+            if jacob is None or not self.same_wcs:
+                jacob = util.get_jacobian(
+                    exp=data['exp'], cen=orig_cen, xy0=bbox.getMin(),
+                )
+
+            psf_im = data['psf_cache'].get_psf_image(centroid)
+
+            obs = _make_obs(
+                im=data['image'][rows, cols],
+                wt=wt,
+                bmask=data['mask'][rows, cols],
+                jacob=jacob.copy(),
+                psf_im=psf_im,
+                orig_cen=centroid,
+            )
+
+            obslist = ngmix.ObsList(meta={'band': band})
+            obslist.append(obs)
+            mbobs.append(obslist)
+
+        return mbobs
+
+
+class PSFImageCache(object):
+    """
+    Cache of psf images for an exposure
+
+    If the psf is spatially constant, for example the KernelPsf set for
+    metacal exposures, the image is reconstructed once.  Otherwise, if a
+    quantum is sent, the position is rounded to a multiple of the quantum
+    and the image is reconstructed once at each rounded position.
+
+    Parameters
+    ----------
+    exposure: lsst.afw.image.Exposure
+        The exposure
+    quantum: float, optional
+        Rounding for positions in pixels.  Default None, meaning the psf for
+        a spatially varying psf is reconstructed at each position.
+    """
+    def __init__(self, exposure, quantum=DEFAULT_PSF_CACHE_QUANTUM):
+        if quantum is not None and quantum <= 0:
+            raise ValueError(f'quantum must be > 0, got {quantum}')
+
+        self.exposure = exposure
+        self.quantum = quantum
+        self.constant = is_constant_psf(exposure.getPsf())
+        self._images = {}
+
+    def get_psf_image(self, orig_cen):
+        """
+        get the psf image at the specified location, see extract_psf_image
+
+        Parameters
+        ----------
+        orig_cen: lsst.geom.Point2D
+            The location at which to draw the image
+
+        Returns
+        -------
+        ndarray
+        """
+        if self.constant:
+            key = None
+            cen = orig_cen
+        elif self.quantum is not None:
+            key = (
+                int(np.round(orig_cen.getX() / self.quantum)),
+                int(np.round(orig_cen.getY() / self.quantum)),
+            )
+            cen = geom.Point2D(key[0] * self.quantum, key[1] * self.quantum)
+        else:
+            return extract_psf_image(exposure=self.exposure, orig_cen=orig_cen)
+
+        psfim = self._images.get(key)
+        if psfim is None:
+            psfim = extract_psf_image(exposure=self.exposure, orig_cen=cen)
+            self._images[key] = psfim
+
+        return psfim.copy()
+
+
+def is_constant_psf(psf):
+    """
+    check if a psf is spatially constant
+
+    Parameters
+    ----------
+    psf: lsst.afw.detection.Psf
+        The psf
+
+    Returns
+    -------
+    True if the psf is a kernel psf with a kernel that does not vary
+    spatially
+    """
+    if not hasattr(psf, 'getKernel'):
+        return False
+
+    return not psf.getKernel().isSpatiallyVarying()
+
+
+def _get_stamp_mbobs(mbexp, source, stamp_size, clip=False, psf_caches=None):
     """
     Get a postage stamp MultibandExposure
 
@@ -409,12 +800,17 @@ def _get_stamp_mbobs(mbexp, source, stamp_size, clip=False):
         lsst.pex.exceptions.LengthError is raised
 
         Only relevant if stamp_size is sent.  Default False
+    psf_caches: dict, optional
+        PSFImageCache for each band
 
     Returns
     -------
     lsst.afw.image.ExposureF
     """
 
+    if psf_caches is None:
+        psf_caches = {}
+
     bbox = _get_bbox(mbexp, source, stamp_size, clip=clip)
 
     mbobs = ngmix.MultiBandObsList()
@@ -424,6 +820,7 @@ def _get_stamp_mbobs(mbexp, source, stamp_size, clip=False):
         obs = extract_obs(
             exp=subexp,
             source=source,
+            psf_cache=psf_caches.get(band),
         )
 
         obslist = ngmix.ObsList(meta={'band': band})
@@ -486,7 +883,7 @@ def _get_bbox(mbexp, source, stamp_size, clip=False):
     return bbox
 
 
-def extract_psf_image(exposure, orig_cen):
+def extract_psf_image(exposure, orig_cen, cache=None):
     """
     get the psf associated with this image.
 
@@ -499,14 +896,19 @@ def extract_psf_image(exposure, orig_cen):
         The exposure data
     orig_cen: lsst.geom.Point2D
         The location at which to draw the image
+    cache: metadetect.lsst.util.ExposureCache, optional
+        If sent, the psf image is taken from or stored in this cache
 
     Returns
     -------
     ndarray
     """
     try:
-        psfobj = exposure.getPsf()
-        psfim = psfobj.computeKernelImage(orig_cen).array
+        if cache is not None:
+            psfim = cache.get_psf_kernel_image(exp=exposure, cen=orig_cen)
+        else:
+            psfobj = exposure.getPsf()
+            psfim = psfobj.computeKernelImage(orig_cen).array
     except InvalidParameterError:
         raise MissingDataError("could not reconstruct PSF")
 
@@ -599,18 +1001,35 @@ def _extract_jacobian_at_source(exp, source):
     orig_cen = exp.getWcs().skyToPixel(source.getCoord())
 
     if np.isnan(orig_cen.getY()):
-        LOG.info('falling back on integer location')
-        # fall back to integer pixel location
-        peak = source.getFootprint().getPeaks()[0]
-        orig_cen_i = peak.getI()
-        orig_cen = geom.Point2D(
-            x=orig_cen_i.getX(),
-            y=orig_cen_i.getY(),
-        )
+        orig_cen = _get_peak_cen(source)
 
     return get_jacobian(exp, orig_cen)
 
 
+def _get_source_cen(source):
+    """
+    get the centroid of the source, falling back to the peak if it is not
+    finite
+    """
+    orig_cen = source.getCentroid()
+
+    if np.isnan(orig_cen.getY()):
+        orig_cen = _get_peak_cen(source)
+
+    return orig_cen
+
+
+def _get_peak_cen(source):
+    LOG.info('falling back on integer location')
+    # fall back to integer pixel location
+    peak = source.getFootprint().getPeaks()[0]
+    orig_cen_i = peak.getI()
+    return geom.Point2D(
+        x=orig_cen_i.getX(),
+        y=orig_cen_i.getY(),
+    )
+
+
 def get_output_dtype():
 
     dt = [
@@ -1,12 +1,15 @@
 """
 Code to do metacal with lsst exposures
 """
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from ngmix.metacal.metacal import _get_gauss_target_psf
 import galsim
 import lsst.afw.image as afw_image
 from .util import (
     get_integer_center, get_jacobian, get_stack_kernel_psf, get_mbexp,
+    ExposureCache,
 )
 
 DEFAULT_TYPES = ['noshear', '1p', '1m']
@@ -14,7 +17,9 @@ INTERP = 'lanczos15'
 STEP = 0.01
 
 
-def get_metacal_mbexps_fixnoise(mbexp, noise_mbexp, types=None):
+def get_metacal_mbexps_fixnoise(
+    mbexp, noise_mbexp, types=None, nthreads=1, cache=None,
+):
     """
     Get metacal MultibandExposures with fixed noise
 
@@ -26,6 +31,12 @@ def get_metacal_mbexps_fixnoise(mbexp, noise_mbexp, types=None):
         The exposure data with pure noise
     types: list, optional
         The metacal types, e.g. ('noshear', '1p', '1m')
+    nthreads: int, optional
+        Number of threads used to draw the images for the bands and types
+        of both the data and noise.  Default 1.
+    cache: metadetect.lsst.util.ExposureCache, optional
+        If sent, the psf kernel images and jacobians are taken from or stored
+        in this cache
 
     Returns
     -------
@@ -33,8 +44,10 @@ def get_metacal_mbexps_fixnoise(mbexp, noise_mbexp, types=None):
         dicts keyed by type, holding exposures
     """
 
-    mdict = get_metacal_mbexps(mbexp=mbexp, types=types)
-    noise_mdict = get_metacal_mbexps(mbexp=noise_mbexp, types=types, rot=True)
+    mdict, noise_mdict = _get_metacal_mbexps_multi(
+        mbexps=[mbexp, noise_mbexp], rots=[False, True], types=types,
+        nthreads=nthreads, cache=cache,
+    )
     for shear_type in mdict:
         for exp, nexp in zip(mdict[shear_type], noise_mdict[shear_type]):
             exp.image.array[:, :] += nexp.image.array[:, :]
@@ -43,7 +56,7 @@ def get_metacal_mbexps_fixnoise(mbexp, noise_mbexp, types=None):
     return mdict, noise_mdict
 
 
-def get_metacal_mbexps(mbexp, types=None, rot=False):
+def get_metacal_mbexps(mbexp, types=None, rot=False, nthreads=1, cache=None):
     """
     Get metacal MultibandExposures
 
@@ -55,6 +68,12 @@ def get_metacal_mbexps(mbexp, types=None, rot=False):
         The metacal types, e.g. ('noshear', '1p', '1m')
     rot: bool, optional
         If set to True, rotate before shearing, then rotate back.
+    nthreads: int, optional
+        Number of threads used to draw the images for the bands and types.
+        Default 1.
+    cache: metadetect.lsst.util.ExposureCache, optional
+        If sent, the psf kernel images and jacobians are taken from or stored
+        in this cache
 
     Returns
     -------
@@ -62,32 +81,16 @@ def get_metacal_mbexps(mbexp, types=None, rot=False):
         dict keyed by type, holding exposures
     """
 
-    if types is None:
-        types = DEFAULT_TYPES
-
-    mdict_with_explists = {}
-    for shear_type in types:
-        mdict_with_explists[shear_type] = []
-
-    for iband, band in enumerate(mbexp.filters):
-        exp = mbexp[band]
-
-        this_mdict = get_metacal_exps(exp, types=types, rot=rot)
-
-        for shear_type in this_mdict:
-            exp = this_mdict[shear_type]
-            mdict_with_explists[shear_type].append(exp)
-
-    # now build the mbexp
-    mdict = {}
-    for shear_type in types:
-        # this properly copies over the wcs and filter label
-        mdict[shear_type] = get_mbexp(mdict_with_explists[shear_type])
-
+    mdict, = _get_metacal_mbexps_multi(
+        mbexps=[mbexp], rots=[rot], types=types, nthreads=nthreads,
+        cache=cache,
+    )
     return mdict
 
 
-def get_metacal_exps_fixnoise(exp, noise_exp, types=None):
+def get_metacal_exps_fixnoise(
+    exp, noise_exp, types=None, nthreads=1, cache=None,
+):
     """
     Get metacal exposures with fixed noise
 
@@ -99,6 +102,12 @@ def get_metacal_exps_fixnoise(exp, noise_exp, types=None):
         The exposure data with pure noise
     types: list, optional
         The metacal types, e.g. ('noshear', '1p', '1m')
+    nthreads: int, optional
+        Number of threads used to draw the images for the types of both the
+        data and noise.  Default 1.
+    cache: metadetect.lsst.util.ExposureCache, optional
+        If sent, the psf kernel images and jacobians are taken from or stored
+        in this cache
 
     Returns
     -------
@@ -107,8 +116,16 @@ def get_metacal_exps_fixnoise(exp, noise_exp, types=None):
     if types is None:
         types = DEFAULT_TYPES
 
-    mdict = get_metacal_exps(exp, types=types)
-    noise_mdict = get_metacal_exps(noise_exp, types=types, rot=True)
+    if cache is None:
+        cache = ExposureCache()
+
+    preps = [
+        _prepare_metacal(exp=exp, rot=False, cache=cache),
+        _prepare_metacal(exp=noise_exp, rot=True, cache=cache),
+    ]
+    mdict, noise_mdict = _draw_metacal_exps(
+        preps=preps, types=types, nthreads=nthreads,
+    )
 
     for shear_type in types:
         exp = mdict[shear_type]
@@ -120,7 +137,7 @@ def get_metacal_exps_fixnoise(exp, noise_exp, types=None):
     return mdict, noise_mdict
 
 
-def get_metacal_exps(exp, types=None, rot=False):
+def get_metacal_exps(exp, types=None, rot=False, nthreads=1, cache=None):
     """
     Get metacal exposures
 
@@ -132,6 +149,11 @@ def get_metacal_exps(exp, types=None, rot=False):
         The metacal types, e.g. ('noshear', '1p', '1m')
     rot: bool, optional
         If set to True, rotate before shearing, then rotate back.
+    nthreads: int, optional
+        Number of threads used to draw the images for the types.  Default 1.
+    cache: metadetect.lsst.util.ExposureCache, optional
+        If sent, the psf kernel images and jacobians are taken from or stored
+        in this cache
 
     Returns
     -------
@@ -141,11 +163,61 @@ def get_metacal_exps(exp, types=None, rot=False):
     if types is None:
         types = DEFAULT_TYPES
 
+    if cache is None:
+        cache = ExposureCache()
+
+    mdict, = _draw_metacal_exps(
+        preps=[_prepare_metacal(exp=exp, rot=rot, cache=cache)], types=types,
+        nthreads=nthreads,
+    )
+    return mdict
+
+
+def _get_metacal_mbexps_multi(mbexps, rots, types, nthreads, cache):
+    """
+    get metacal MultibandExposures for each of the inputs, drawing all bands
+    and types for all inputs with the same threads
+    """
+
+    if types is None:
+        types = DEFAULT_TYPES
+
+    if cache is None:
+        cache = ExposureCache()
+
+    preps = [
+        _prepare_metacal(exp=mbexp[band], rot=rot, cache=cache)
+        for mbexp, rot in zip(mbexps, rots)
+        for band in mbexp.filters
+    ]
+    exp_mdicts = _draw_metacal_exps(preps=preps, types=types, nthreads=nthreads)
+
+    mdicts = []
+    start = 0
+    for mbexp in mbexps:
+        nband = len(mbexp.filters)
+        band_mdicts = exp_mdicts[start:start + nband]
+        start += nband
+
+        # this properly copies over the wcs and filter label
+        mdicts.append({
+            shear_type: get_mbexp([bm[shear_type] for bm in band_mdicts])
+            for shear_type in types
+        })
+
+    return mdicts
+
+
+def _prepare_metacal(exp, rot, cache):
+    """
+    set up the deconvolved image and the reconvolution psf for an exposure
+    """
+
     cen, _ = get_integer_center(exp.getWcs(), exp.getBBox(), as_double=True)
 
-    gwcs = get_galsim_jacobian_wcs(exp=exp, cen=cen)
+    gwcs = cache.get_galsim_wcs(exp=exp, cen=cen)
 
-    psf_image_array = get_psf_kernel_image(exp=exp, cen=cen)
+    psf_image_array = cache.get_psf_kernel_image(exp=exp, cen=cen)
     psf_flux = psf_image_array.sum()
 
     eimage = exp.image.array.copy()
@@ -167,6 +239,10 @@ def get_metacal_exps(exp, types=None, rot=False):
         galsim.Deconvolve(psf_int),
     )
 
+    # galsim builds the k space tables of the interpolated images lazily;
+    # build them now so the objects are only read when drawing in threads
+    image_int_nopsf.kValue(0, 0)
+
     gauss_psf = _get_gauss_target_psf(psf_int, flux=psf_flux)
 
     dilation = 1.0 + 2.0*STEP
@@ -175,15 +251,42 @@ def get_metacal_exps(exp, types=None, rot=False):
     psf_dilated_image = psf_image.copy()
     psf_dilated.drawImage(image=psf_dilated_image, method='no_pixel')
 
-    mdict = {}
-    for shear_type in types:
-        mdict[shear_type] = _get_metacal_exp(
-            exp=exp, image=image, image_int_nopsf=image_int_nopsf,
-            psf_dilated=psf_dilated, psf_dilated_image=psf_dilated_image,
-            shear_type=shear_type, rot=rot,
-        )
+    return {
+        'exp': exp,
+        'image': image,
+        'image_int_nopsf': image_int_nopsf,
+        'psf_dilated': psf_dilated,
+        'psf_dilated_image': psf_dilated_image,
+        'rot': rot,
+    }
 
-    return mdict
+
+def _draw_metacal_exps(preps, types, nthreads):
+    """
+    draw the metacal exposures for each prepared exposure and type, returning
+    a list of dicts keyed by type in the same order as the inputs
+
+    The drawing releases the GIL, so the draws are done in a thread pool if
+    nthreads > 1
+    """
+    tasks = [(prep, shear_type) for prep in preps for shear_type in types]
+
+    def _draw(task):
+        prep, shear_type = task
+        return _get_metacal_exp(shear_type=shear_type, **prep)
+
+    if nthreads > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(max_workers=nthreads) as executor:
+            # map returns results in the order of the tasks
+            sexps = list(executor.map(_draw, tasks))
+    else:
+        sexps = [_draw(task) for task in tasks]
+
+    ntypes = len(types)
+    return [
+        dict(zip(types, sexps[i*ntypes:(i + 1)*ntypes]))
+        for i in range(len(preps))
+    ]
 
 
 def _get_metacal_exp(
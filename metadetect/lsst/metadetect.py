@@ -8,15 +8,17 @@ from .. import procflags
 from .skysub import subtract_sky_mbexp
 
 from .configs import get_config
+from .defaults import DEFAULT_CENTROID, CENTROID_NEEDS_ISOLATION
 from . import measure
 from .metacal_exposures import get_metacal_mbexps_fixnoise
-from .util import get_integer_center, get_jacobian
+from .util import get_integer_center, get_coadd_weights, ExposureCache
 
 LOG = logging.getLogger('lsst_metadetect')
 
 
 def run_metadetect(
     mbexp, noise_mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None, show=False,
+    prepared=None,
 ):
     """
     Run metadetection on the input MultiBandObsList
@@ -49,6 +51,9 @@ def run_metadetect(
         in this dict override defaults; see lsst_configs.py
     show: bool, optional
         if set to True images will be shown
+    prepared: PreparedCell, optional
+        The products shared with run_photometry, made from the same mbexp.  If
+        sent, mfrac_mbexp, ormasks and config must not be sent.
 
     Returns
     -------
@@ -58,28 +63,38 @@ def run_metadetect(
         metacal_psf is set to 'fitgauss' and the fitting fails
     """
 
-    config = get_config(config)
-
-    ormask = combine_ormasks(mbexp, ormasks)
-    mfrac, wgts = get_mfrac_mbexp(mbexp=mbexp, mfrac_mbexp=mfrac_mbexp)
-
-    if config['subtract_sky']:
-        subtract_sky_mbexp(mbexp=mbexp, thresh=config['detect']['thresh'])
-
-    psf_stats = fit_original_psfs_mbexp(
-        mbexp=mbexp,
-        wgts=wgts,
-        rng=rng,
+    prepared = get_prepared_cell(
+        mbexp=mbexp, rng=rng, mfrac_mbexp=mfrac_mbexp, ormasks=ormasks,
+        config=config, prepared=prepared,
     )
+    config = prepared.config
+    cache = prepared.cache
 
     fitter = get_fitter(config, rng=rng)
 
     metacal_types = config['metacal'].get('types', None)
+    metacal_nthreads = config['metacal'].get('nthreads', 1)
 
     mdict, noise_mdict = get_metacal_mbexps_fixnoise(
         mbexp=mbexp, noise_mbexp=noise_mbexp, types=metacal_types,
+        nthreads=metacal_nthreads, cache=cache,
     )
 
+    # the same noise field is used to replace neighbors in all the metacal
+    # exposures, which have the shape of the originals
+    centroid = config['detect'].get('centroid', DEFAULT_CENTROID)
+    if CENTROID_NEEDS_ISOLATION[centroid]:
+        unit_noise = rng.normal(size=mbexp.singles[0].image.array.shape)
+    else:
+        unit_noise = None
+
+    # metacal only scales the variance by a constant, so the relative weights
+    # for coadding the bands for detection are the same for all types
+    if len(mbexp.singles) > 1:
+        coadd_weights = get_coadd_weights(mbexp.singles)
+    else:
+        coadd_weights = None
+
     result = {}
     for shear_str, mcal_mbexp in mdict.items():
 
@@ -88,27 +103,108 @@ def run_metadetect(
             fitter=fitter,
             config=config,
             rng=rng,
+            unit_noise=unit_noise,
+            coadd_weights=coadd_weights,
             show=show,
         )
 
         if res is not None:
+            # the metacal exposures have the same wcs and bbox as the
+            # originals, so the cached jacobian for the original can be used
             band = mcal_mbexp.filters[0]
-            exp = mcal_mbexp[band]
+            exp = mbexp[band]
 
-            add_mfrac(config=config, mfrac=mfrac, res=res, exp=exp)
-            add_ormask(ormask, res)
-            add_original_psf(psf_stats, res)
+            add_mfrac(
+                config=config, mfrac=prepared.mfrac, res=res, exp=exp,
+                cache=cache,
+            )
+            add_ormask(prepared.ormask, res)
+            add_original_psf(prepared.psf_stats, res)
 
         result[shear_str] = res
 
     return result
 
 
+class PreparedCell(object):
+    """
+    The products for a cell that are shared by run_metadetect and
+    run_photometry, computed once so both can be run on the same data
+
+    Construction combines the ormasks, gets the mfrac image and the weights
+    for the bands, subtracts the sky if requested and fits the original psfs.
+
+    Parameters
+    ----------
+    mbexp: lsst.afw.image.MultibandExposure
+        The exposures to process.  If sky subtraction is configured it is
+        subtracted in place.
+    rng: np.random.RandomState
+        Random number generator, used for the psf fitting
+    mfrac_mbexp: lsst.afw.image.MultibandExposure, optional
+        The fraction of masked exposures for the pixel, see run_metadetect
+    ormasks: list of images, optional
+        A list of logical or masks, see run_metadetect
+    config: dict, optional
+        Configuration for the fitter, metacal, psf, detect, Entries
+        in this dict override defaults; see lsst_configs.py
+    """
+    def __init__(self, mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None):
+        self.mbexp = mbexp
+        self.config = get_config(config)
+
+        # psf images and jacobians at the exposure centers are used in several
+        # places
+        self.cache = ExposureCache()
+
+        self.ormask = combine_ormasks(mbexp, ormasks)
+        self.mfrac, self.wgts = get_mfrac_mbexp(
+            mbexp=mbexp, mfrac_mbexp=mfrac_mbexp,
+        )
+
+        if self.config['subtract_sky']:
+            subtract_sky_mbexp(
+                mbexp=mbexp,
+                thresh=self.config['detect']['thresh'],
+                **self.config['skysub']
+            )
+
+        self.psf_stats = fit_original_psfs_mbexp(
+            mbexp=mbexp,
+            wgts=self.wgts,
+            rng=rng,
+            cache=self.cache,
+        )
+
+
+def get_prepared_cell(mbexp, rng, mfrac_mbexp, ormasks, config, prepared):
+    """
+    check the input PreparedCell, or make one if it is None
+    """
+    if prepared is None:
+        return PreparedCell(
+            mbexp=mbexp, rng=rng, mfrac_mbexp=mfrac_mbexp, ormasks=ormasks,
+            config=config,
+        )
+
+    if prepared.mbexp is not mbexp:
+        raise ValueError('the prepared cell was made from a different mbexp')
+
+    if mfrac_mbexp is not None or ormasks is not None or config is not None:
+        raise ValueError(
+            'do not send mfrac_mbexp, ormasks or config with a prepared cell'
+        )
+
+    return prepared
+
+
 def detect_deblend_and_measure(
     mbexp,
     fitter,
     config,
     rng,
+    unit_noise=None,
+    coadd_weights=None,
     show=False,
 ):
     """
@@ -131,6 +227,12 @@ def detect_deblend_and_measure(
         The detection threshold in units of the sky noise
     stamp_size: int
         Size for postage stamps.
+    unit_noise: array, optional
+        Noise with unit variance used to replace neighbors, see
+        measure.detect_and_deblend
+    coadd_weights: array, optional
+        The weights for coadding the bands for detection, see
+        measure.detect_and_deblend
     show: bool, optional
         If set to True, show images during processing
     """
@@ -141,6 +243,9 @@ def detect_deblend_and_measure(
         mbexp=mbexp,
         rng=rng,
         thresh=config['detect']['thresh'],
+        centroid=config['detect'].get('centroid', DEFAULT_CENTROID),
+        unit_noise=unit_noise,
+        coadd_weights=coadd_weights,
         show=show,
     )
 
@@ -156,14 +261,19 @@ def detect_deblend_and_measure(
         fitter=fitter,
         stamp_size=config['stamp_size'],
         fwhm_reg=fwhm_reg,
+        psf_cache_quantum=config['psf_cache_quantum'],
+        fast_stamps=config['fast_stamps'],
     )
 
     return results
 
 
-def add_mfrac(config, mfrac, res, exp):
+def add_mfrac(config, mfrac, res, exp, cache=None):
     """
     calculate and add mfrac to the input result array
+
+    If a metadetect.lsst.util.ExposureCache is sent, the jacobian is taken
+    from or stored in the cache
     """
     if np.any(mfrac > 0):
 
@@ -175,7 +285,10 @@ def add_mfrac(config, mfrac, res, exp):
             bbox=exp.getBBox(),
             as_double=True,
         )
-        jac = get_jacobian(exp=exp, cen=cen)
+        if cache is None:
+            cache = ExposureCache()
+
+        jac = cache.get_jacobian(exp=exp, cen=cen)
 
         res['mfrac'] = measure_weighted_mfrac(
             mfrac=mfrac,
@@ -213,9 +326,6 @@ def measure_weighted_mfrac(
     y : np.ndarray
         The input y/row values for the positions at which to compute the
         weighted average.
-    box_sizes : np.ndarray
-        The size of the stamp to use to measure the weighted average. Should be
-        big enough to hold 2 * `fwhm`.
     jac: ngmix.Jacobian
         The jacobian for the data
     fwhm : float or None
@@ -231,67 +341,58 @@ def measure_weighted_mfrac(
     if fwhm is None:
         fwhm = 1.2
 
+    x = np.atleast_1d(x)
+    y = np.atleast_1d(y)
+
     ny, nx = mfrac.shape
 
-    gauss_wgt = ngmix.GMixModel(
-        [0, 0, 0, 0, ngmix.moments.fwhm_to_T(fwhm), 1],
-        'gauss',
-    )
     sigma = ngmix.moments.fwhm_to_sigma(fwhm)
     box_rad = int(round(sigma * 5))
 
-    mfracs = []
-    for i in range(x.shape[0]):
-        ix = int(np.floor(x[i] + 0.5))
-        iy = int(np.floor(y[i] + 0.5))
-
-        xstart = ix - box_rad
-        xend = ix + box_rad + 1
-        ystart = iy - box_rad
-        yend = iy + box_rad + 1
-
-        if xstart < 0:
-            xstart = 0
-        if ystart < 0:
-            ystart = 0
-        if xend > nx:
-            xend = nx
-        if yend > ny:
-            yend = ny
-
-        sub_mfrac = mfrac[xstart:xend, ystart:yend]
-        if sub_mfrac.size == 0:
-            mfracs.append(1.0)
-        else:
-            cy, cx = (y[i] - ystart, x[i] - xstart)
-            this_jac = jac.copy()
-            this_jac.set_cen(row=cy, col=cx)
+    # all objects are done at once, with a (nobj, npix) array of pixels in a
+    # box around each object, clipped to the image
+    offsets = np.arange(-box_rad, box_rad + 1)
+    drow, dcol = np.meshgrid(offsets, offsets, indexing='ij')
 
-            obs = ngmix.Observation(
-                image=sub_mfrac,
-                jacobian=this_jac,
-            )
+    ix = np.floor(x + 0.5).astype('i8')
+    iy = np.floor(y + 0.5).astype('i8')
+    rows = iy[:, np.newaxis] + drow.ravel()[np.newaxis, :]
+    cols = ix[:, np.newaxis] + dcol.ravel()[np.newaxis, :]
+
+    inbounds = (rows >= 0) & (rows < ny) & (cols >= 0) & (cols < nx)
+    vals = mfrac[np.clip(rows, 0, ny - 1), np.clip(cols, 0, nx - 1)]
+
+    # offsets from the object position in arcsec
+    rowdiff = rows - y[:, np.newaxis]
+    coldiff = cols - x[:, np.newaxis]
+    v = jac.dvdrow * rowdiff + jac.dvdcol * coldiff
+    u = jac.dudrow * rowdiff + jac.dudcol * coldiff
+    rad2 = u**2 + v**2
 
-            stats = gauss_wgt.get_weighted_sums(obs, maxrad=box_rad)
+    # Gaussian aperture, with the same radius cut as
+    # ngmix.GMix.get_weighted_sums
+    use = inbounds & (rad2 < box_rad**2)
+    wts = np.exp(-0.5 * rad2 / sigma**2) * use
 
-            # this is the weighted average in the image using the
-            # Gaussian as the weight.
-            mfracs.append(stats["sums"][5] / stats["wsum"])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # this is the weighted average in the image using the
+        # Gaussian as the weight.
+        mfracs = (wts * vals).sum(axis=1) / wts.sum(axis=1)
 
-    return np.array(mfracs)
+    # boxes entirely off the image
+    mfracs[~np.any(inbounds, axis=1)] = 1.0
+
+    return mfracs
 
 
 def add_ormask(ormask, res):
     """
     copy in ormask values using the row, col positions
     """
-    for i in range(res.size):
-        row_diff = res['row'][i] - res['row0'][i]
-        col_diff = res['col'][i] - res['col0'][i]
-        local_row = int(np.floor(row_diff + 0.5))
-        local_col = int(np.floor(col_diff + 0.5))
+    local_row = np.floor(res['row'] - res['row0'] + 0.5).astype('i8')
+    local_col = np.floor(res['col'] - res['col0'] + 0.5).astype('i8')
 
-        res['ormask'][i] = ormask[local_row, local_col]
+    res['ormask'] = ormask[local_row, local_col]
 
 
 def add_original_psf(psf_stats, res):
@@ -412,12 +513,15 @@ def get_mfrac_mbexp(mbexp, mfrac_mbexp):
     return mfrac, wgts
 
 
-def fit_original_psfs_mbexp(mbexp, rng, wgts):
+def fit_original_psfs_mbexp(mbexp, rng, wgts, cache=None):
     """
     fit the original psfs at the center of the image and get the mean g1,g2,T
     across all bands
 
     This can fail and flags will be set, but we proceed
+
+    If a metadetect.lsst.util.ExposureCache is sent, the psf images and
+    jacobians are taken from or stored in the cache
     """
     from .measure import extract_psf_image
 
@@ -432,6 +536,9 @@ def fit_original_psfs_mbexp(mbexp, rng, wgts):
     )
     runner = ngmix.runners.PSFRunner(fitter=fitter, guesser=guesser, ntry=4)
 
+    if cache is None:
+        cache = ExposureCache()
+
     try:
         g1sum = 0.0
         g2sum = 0.0
@@ -443,9 +550,9 @@ def fit_original_psfs_mbexp(mbexp, rng, wgts):
                 bbox=exp.getBBox(),
                 as_double=True,
             )
-            jac = get_jacobian(exp=exp, cen=cen)
+            jac = cache.get_jacobian(exp=exp, cen=cen)
 
-            psf_im = extract_psf_image(exp, cen)
+            psf_im = extract_psf_image(exp, cen, cache=cache)
 
             psf_cen = (np.array(psf_im.shape)-1.0)/2.0
             psf_jacob = jac.copy()
@@ -1,12 +1,11 @@
 import logging
 import warnings
-from .skysub import subtract_sky_mbexp
 
-from .configs import get_config
+from .defaults import DEFAULT_CENTROID
 from . import measure
 from .metadetect import (
-    fit_original_psfs_mbexp, get_mfrac_mbexp, get_fitter, combine_ormasks,
-    add_ormask, add_original_psf, add_mfrac,
+    get_fitter, add_ormask, add_original_psf, add_mfrac, get_prepared_cell,
+    PreparedCell, run_metadetect,
 )
 
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -14,7 +13,10 @@ warnings.filterwarnings('ignore', category=FutureWarning)
 LOG = logging.getLogger('lsst_photometry')
 
 
-def run_photometry(mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None, show=False):
+def run_photometry(
+    mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None, show=False,
+    prepared=None,
+):
     """
     Run photometry on the input data
 
@@ -42,25 +44,20 @@ def run_photometry(mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None, show
         in this dict override defaults; see lsst_configs.py
     show: bool, optional
         if set to True, images will be shown
+    prepared: metadetect.lsst.metadetect.PreparedCell, optional
+        The products shared with run_metadetect, made from the same mbexp.  If
+        sent, mfrac_mbexp, ormasks and config must not be sent.
 
     Returns
     -------
     ndarray of results with measuremens
     """
 
-    config = get_config(config)
-
-    ormask = combine_ormasks(mbexp, ormasks)
-    mfrac, wgts = get_mfrac_mbexp(mbexp, mfrac_mbexp)
-
-    if config['subtract_sky']:
-        subtract_sky_mbexp(mbexp=mbexp, thresh=config['detect']['thresh'])
-
-    psf_stats = fit_original_psfs_mbexp(
-        mbexp=mbexp,
-        wgts=wgts,
-        rng=rng,
+    prepared = get_prepared_cell(
+        mbexp=mbexp, rng=rng, mfrac_mbexp=mfrac_mbexp, ormasks=ormasks,
+        config=config, prepared=prepared,
     )
+    config = prepared.config
 
     fitter = get_fitter(config, rng=rng)
 
@@ -68,6 +65,7 @@ def run_photometry(mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None, show
         mbexp=mbexp,
         rng=rng,
         thresh=config['detect']['thresh'],
+        centroid=config['detect'].get('centroid', DEFAULT_CENTROID),
         show=show,
     )
 
@@ -83,8 +81,47 @@ def run_photometry(mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None, show
         band = mbexp.filters[0]
         exp = mbexp[band]
 
-        add_mfrac(config=config, mfrac=mfrac, res=res, exp=exp)
-        add_ormask(ormask, res)
-        add_original_psf(psf_stats, res)
+        add_mfrac(
+            config=config, mfrac=prepared.mfrac, res=res, exp=exp,
+            cache=prepared.cache,
+        )
+        add_ormask(prepared.ormask, res)
+        add_original_psf(prepared.psf_stats, res)
 
     return res
+
+
+def run_metadetect_and_photometry(
+    mbexp, noise_mbexp, rng, mfrac_mbexp=None, ormasks=None, config=None,
+    show=False,
+):
+    """
+    Run metadetection and photometry on the same input data, doing the
+    ormask, mfrac, sky subtraction and original psf fitting steps once for
+    both; see run_metadetect and run_photometry for the parameters
+
+    The detections are not shared.  The noshear exposure of metadetect is
+    reconvolved with a larger psf and has extra noise added, so its
+    detections differ from those on the original exposures, which
+    run_photometry detects and measures on its own.
+
+    Returns
+    -------
+    result, phot_result
+        The result dict from run_metadetect and the results from
+        run_photometry
+    """
+    prepared = PreparedCell(
+        mbexp=mbexp, rng=rng, mfrac_mbexp=mfrac_mbexp, ormasks=ormasks,
+        config=config,
+    )
+
+    result = run_metadetect(
+        mbexp=mbexp, noise_mbexp=noise_mbexp, rng=rng, show=show,
+        prepared=prepared,
+    )
+    phot_result = run_photometry(
+        mbexp=mbexp, rng=rng, show=show, prepared=prepared,
+    )
+
+    return result, phot_result
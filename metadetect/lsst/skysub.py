@@ -1,3 +1,6 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import lsst.afw.table as afw_table
 from lsst.meas.algorithms import (
     SubtractBackgroundTask,
@@ -10,7 +13,7 @@ from .defaults import DEFAULT_THRESH
 from . import util
 
 
-def determine_and_subtract_sky(exp):
+def determine_and_subtract_sky(exp, back_task=None):
     """
     Determine and subtract the sky from the input exposure.
     The exposure is modified.
@@ -19,18 +22,24 @@ def determine_and_subtract_sky(exp):
     ----------
     exp: Exposure
         The exposure to be processed
+    back_task: SubtractBackgroundTask, optional
+        The task to use.  If not sent one is constructed, ignoring the
+        pixels in the stats mask for the exposure
     """
 
-    bp_to_skip = util.get_stats_mask(exp)
-    back_config = SubtractBackgroundConfig(ignoredPixelMask=bp_to_skip)
-    back_task = SubtractBackgroundTask(config=back_config)
+    if back_task is None:
+        bp_to_skip = util.get_stats_mask(exp)
+        back_config = SubtractBackgroundConfig(ignoredPixelMask=bp_to_skip)
+        back_task = SubtractBackgroundTask(config=back_config)
 
     # returns background data, but we are ignoring it for now
     background = back_task.run(exp)
     return background
 
 
-def subtract_sky_mbexp(mbexp, thresh=DEFAULT_THRESH):
+def subtract_sky_mbexp(
+    mbexp, thresh=DEFAULT_THRESH, nthreads=1, share_footprints=False,
+):
     """
     subtract sky
 
@@ -40,12 +49,39 @@ def subtract_sky_mbexp(mbexp, thresh=DEFAULT_THRESH):
         The exposures to process
     thresh: float
         Threshold for detection
+    nthreads: int, optional
+        Number of threads used to process the bands.  Default 1.
+    share_footprints: bool, optional
+        If True, run the detection and sky subtraction iterations for the
+        first band only, then subtract the sky once from the other bands,
+        masking the pixels detected in the first band.  This is only
+        appropriate when the bands are well registered.  Default False.
     """
-    for exp in mbexp:
-        iterate_detection_and_skysub(
-            exposure=exp,
-            thresh=thresh,
-        )
+    exps = list(mbexp)
+
+    if share_footprints:
+        iterate_detection_and_skysub(exposure=exps[0], thresh=thresh)
+
+        def _process(exp):
+            copy_detected(exps[0], exp)
+            tasks = get_skysub_tasks(
+                thresh=thresh, stats_mask=util.get_stats_mask(exp),
+            )
+            determine_and_subtract_sky(exp, back_task=tasks.back_task)
+            tasks.reset_metadata()
+
+        exps = exps[1:]
+    else:
+        def _process(exp):
+            iterate_detection_and_skysub(exposure=exp, thresh=thresh)
+
+    if nthreads > 1 and len(exps) > 1:
+        with ThreadPoolExecutor(max_workers=nthreads) as executor:
+            # consume the results to raise any exceptions
+            list(executor.map(_process, exps))
+    else:
+        for exp in exps:
+            _process(exp)
 
 
 def iterate_detection_and_skysub(
@@ -73,19 +109,18 @@ def iterate_detection_and_skysub(
     if niter < 1:
         raise ValueError(f'niter {niter} is less than 1')
 
-    schema = afw_table.SourceTable.makeMinimalSchema()
-    detection_config = SourceDetectionConfig()
-    detection_config.reEstimateBackground = False
-    detection_config.thresholdValue = thresh
-    detection_task = SourceDetectionTask(config=detection_config)
+    tasks = get_skysub_tasks(
+        thresh=thresh, stats_mask=util.get_stats_mask(exposure),
+    )
+    detection_task = tasks.detection_task
 
-    table = afw_table.SourceTable.make(schema)
+    table = afw_table.SourceTable.make(tasks.schema)
 
     # keep a running sum of each sky that was subtracted
     try:
         sky_meas = 0.0
         for i in range(niter):
-            determine_and_subtract_sky(exposure)
+            determine_and_subtract_sky(exposure, back_task=tasks.back_task)
             result = detection_task.run(table, exposure)
 
             sky_meas += exposure.getMetadata()['BGMEAN']
@@ -102,5 +137,94 @@ def iterate_detection_and_skysub(
         err = str(err).replace('lsst.pipe.base.task.TaskError:', '')
         detection_task.log.warn(err)
         result = None
+    finally:
+        tasks.reset_metadata()
 
     return result
+
+
+def copy_detected(exp, other):
+    """
+    set the DETECTED mask plane of the other exposure to that of the first
+
+    Parameters
+    ----------
+    exp: Exposure
+        The exposure with the detections
+    other: Exposure
+        The exposure to modify, with the same bounding box
+    """
+    detected = (exp.mask.array & exp.mask.getPlaneBitMask('DETECTED')) != 0
+
+    bit = other.mask.getPlaneBitMask('DETECTED')
+    mask = other.mask.array
+    mask &= ~bit
+    mask[detected] |= bit
+
+
+# the tasks are not thread safe, so the cache of SkySubTasks, keyed by the
+# settings, is kept separately for each thread
+_SKYSUB_TASKS = threading.local()
+
+
+def get_skysub_tasks(thresh, stats_mask):
+    """
+    get a SkySubTasks for the input settings, constructing it only the first
+    time it is requested in this thread
+
+    Parameters
+    ----------
+    thresh: float
+        Threshold for detection
+    stats_mask: list of str
+        Mask planes for pixels that are ignored when determining the sky
+
+    Returns
+    -------
+    tasks: SkySubTasks
+    """
+    cache = getattr(_SKYSUB_TASKS, 'cache', None)
+    if cache is None:
+        cache = _SKYSUB_TASKS.cache = {}
+
+    key = (float(thresh), tuple(stats_mask))
+    tasks = cache.get(key)
+    if tasks is None:
+        tasks = SkySubTasks(thresh=thresh, stats_mask=stats_mask)
+        cache[key] = tasks
+
+    return tasks
+
+
+class SkySubTasks(object):
+    """
+    The schema and the background and detection tasks used for sky
+    subtraction, constructed once and reused
+
+    Parameters
+    ----------
+    thresh: float
+        Threshold for detection
+    stats_mask: list of str
+        Mask planes for pixels that are ignored when determining the sky
+    """
+    def __init__(self, thresh, stats_mask):
+        back_config = SubtractBackgroundConfig(
+            ignoredPixelMask=list(stats_mask),
+        )
+        self.back_task = SubtractBackgroundTask(config=back_config)
+
+        self.schema = afw_table.SourceTable.makeMinimalSchema()
+
+        detection_config = SourceDetectionConfig()
+        detection_config.reEstimateBackground = False
+        detection_config.thresholdValue = thresh
+        self.detection_task = SourceDetectionTask(config=detection_config)
+
+    def reset_metadata(self):
+        """
+        clear the metadata the tasks record for each run, which would
+        otherwise grow without bound as the tasks are reused
+        """
+        util.reset_task_metadata(self.back_task)
+        util.reset_task_metadata(self.detection_task)
@@ -116,3 +116,20 @@ def test_detect_config():
 
     with pytest.raises(ValueError):
         get_config({'detect': {'blah': 5}})
+
+    config = get_config({'detect': {'thresh': 5, 'centroid': 'base_PeakCentroid'}})
+    assert config['detect']['centroid'] == 'base_PeakCentroid'
+
+    with pytest.raises(ValueError):
+        get_config({'detect': {'thresh': 5, 'centroid': 'blah'}})
+
+
+def test_skysub_config():
+    config = get_config()
+    assert config['skysub'] == {'nthreads': 1, 'share_footprints': False}
+
+    config = get_config({'skysub': {'nthreads': 3}})
+    assert config['skysub'] == {'nthreads': 3}
+
+    with pytest.raises(ValueError):
+        get_config({'skysub': {'blah': 5}})
@@ -86,3 +86,109 @@ def test_conversion(copy_mask_to):
     psf_obj2 = exp2.getPsf()
     psf_image2 = psf_obj2.computeKernelImage(cen).array
     assert np.all(psf_image == psf_image2)
+
+
+def test_exposure_cache():
+    rng = np.random.RandomState(seed=3113)
+
+    sim_data = make_lsst_sim(rng, 200)
+    exp = sim_data['band_data']['i'][0]
+
+    cen, _ = util.get_integer_center(
+        wcs=exp.getWcs(), bbox=exp.getBBox(), as_double=True,
+    )
+
+    cache = util.ExposureCache()
+
+    psf_image = cache.get_psf_kernel_image(exp=exp, cen=cen)
+    assert np.all(psf_image == exp.getPsf().computeKernelImage(cen).array)
+
+    # copies are returned
+    psf_image[:, :] = 0
+    assert np.any(cache.get_psf_kernel_image(exp=exp, cen=cen) != 0)
+
+    jac = cache.get_jacobian(exp=exp, cen=cen)
+    ejac = util.get_jacobian(exp=exp, cen=cen)
+    for n in jac._data.dtype.names:
+        assert jac._data[n] == ejac._data[n]
+
+    gwcs = cache.get_galsim_wcs(exp=exp, cen=cen)
+    assert gwcs == ejac.get_galsim_wcs()
+    assert cache.get_galsim_wcs(exp=exp, cen=cen) is gwcs
+
+    obs = util.exp2obs(exp, cache=cache)
+    assert np.all(obs.psf.image == exp.getPsf().computeKernelImage(cen).array)
+
+
+def test_psf_image_cache():
+    from metadetect.lsst import measure
+
+    rng = np.random.RandomState(seed=4141)
+
+    sim_data = make_lsst_sim(rng, 200)
+    exp = sim_data['band_data']['i'][0]
+
+    cen1 = geom.Point2D(50.2, 60.7)
+    cen2 = geom.Point2D(50.4, 61.1)
+
+    # rounded to the nearest pixel
+    cache = measure.PSFImageCache(exp, quantum=1)
+    eim = measure.extract_psf_image(exp, geom.Point2D(50, 61))
+    assert np.all(cache.get_psf_image(cen1) == eim)
+    assert np.all(cache.get_psf_image(cen2) == eim)
+
+    cache = measure.PSFImageCache(exp)
+    assert np.all(
+        cache.get_psf_image(cen1) == measure.extract_psf_image(exp, cen1)
+    )
+
+    # the psf set for metacal exposures is constant
+    kexp = afw_image.ExposureF(exp, deep=True)
+    kexp.setPsf(util.get_stack_kernel_psf(eim))
+    assert measure.is_constant_psf(kexp.getPsf())
+
+    cache = measure.PSFImageCache(kexp)
+    assert cache.constant
+    assert np.all(cache.get_psf_image(cen1) == cache.get_psf_image(cen2))
+    assert len(cache._images) == 1
+
+    with pytest.raises(ValueError):
+        measure.PSFImageCache(exp, quantum=0)
+
+
+def test_coadd_exposures():
+    rng = np.random.RandomState(seed=5151)
+
+    bands = ['r', 'i', 'z']
+    sim_data = make_lsst_sim(rng, 200, bands=bands)
+    exps = [sim_data['band_data'][band][0] for band in bands]
+    exps[1].variance.array[10:20, 30:40] = 0
+
+    coadd_exp = util.coadd_exposures(exps)
+
+    weights = util.get_coadd_weights(exps)
+    image = np.zeros(exps[0].image.array.shape)
+    ivar = np.zeros(image.shape)
+    for exp, weight in zip(exps, weights):
+        var = exp.variance.array
+        w = np.where(var > 0)
+        image[w] += exp.image.array[w] * weight
+        ivar[w] += 1/var[w]
+
+    image *= 1/weights.sum()
+    assert np.allclose(coadd_exp.image.array, image, rtol=1.e-5, atol=1.e-6)
+    assert np.allclose(coadd_exp.variance.array, 1/ivar, rtol=1.e-5)
+
+    # only the relative weights matter, so the weights can be reused for
+    # exposures with variance scaled by a constant
+    scaled_exps = []
+    for exp in exps:
+        sexp = afw_image.ExposureF(exp, deep=True)
+        sexp.variance.array[:, :] *= 2
+        scaled_exps.append(sexp)
+
+    scaled_coadd_exp = util.coadd_exposures(scaled_exps, weights=weights)
+    assert np.allclose(
+        scaled_coadd_exp.image.array, coadd_exp.image.array,
+        rtol=1.e-5, atol=1.e-6,
+    )
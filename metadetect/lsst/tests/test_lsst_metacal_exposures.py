@@ -181,6 +181,71 @@ def test_metacal_mbexp(ntrial=10, show=False):
                 assert np.all(tweight == eweight)
 
 
+def test_metacal_mbexp_threads():
+    dim = 250
+    buff = 50
+    bands = ['r', 'i', 'z']
+
+    rng = np.random.RandomState(8123)
+
+    galaxy_catalog = make_galaxy_catalog(
+        rng=rng,
+        gal_type='fixed',
+        layout='grid',
+        coadd_dim=dim,
+        buff=buff,
+    )
+    psf = make_fixed_psf(psf_type='gauss')
+
+    sim_data = make_sim(
+        bands=bands,
+        rng=rng,
+        galaxy_catalog=galaxy_catalog,
+        coadd_dim=dim,
+        se_dim=dim,
+        g1=0.02,
+        g2=0.00,
+        psf=psf,
+    )
+
+    exps = [sim_data['band_data'][band][0] for band in bands]
+    noise_exps = []
+    for exp in exps:
+        nexp = deepcopy(exp)
+        nexp.setPsf(exp.getPsf())
+
+        noise = np.sqrt(exp.variance.array)
+        nexp.image.array[:, :] = noise * rng.normal(size=exp.image.array.shape)
+        noise_exps.append(nexp)
+
+    mbexp = get_mbexp(exps)
+    noise_mbexp = get_mbexp(noise_exps)
+
+    types = ('noshear', '1p', '1m', '2p', '2m')
+    mdict, noise_mdict = get_metacal_mbexps_fixnoise(
+        mbexp, noise_mbexp, types=types,
+    )
+    tmdict, tnoise_mdict = get_metacal_mbexps_fixnoise(
+        mbexp, noise_mbexp, types=types, nthreads=4,
+    )
+
+    assert list(tmdict.keys()) == list(types)
+    for key in types:
+        assert list(tmdict[key].filters) == bands
+        for band in bands:
+            assert np.all(
+                tmdict[key][band].image.array == mdict[key][band].image.array
+            )
+            assert np.all(
+                tnoise_mdict[key][band].image.array
+                == noise_mdict[key][band].image.array
+            )
+            assert np.all(
+                tmdict[key][band].variance.array
+                == mdict[key][band].variance.array
+            )
+
+
 def compare_images(im1, im2, label1='im1', label2='im2'):
     import matplotlib.pyplot as mplt
     fig, axs = mplt.subplots(nrows=2, ncols=2)
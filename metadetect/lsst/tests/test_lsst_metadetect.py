@@ -2,6 +2,7 @@
 test using lsst simple sim
 """
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pytest
 
@@ -11,6 +12,7 @@ import metadetect
 from metadetect import procflags
 from metadetect.lsst.metadetect import run_metadetect, get_fitter
 from metadetect.lsst.configs import get_config
+from metadetect.lsst.defaults import DEFAULT_THRESH, CENTROID_NEEDS_ISOLATION
 from metadetect.lsst import util
 import descwl_shear_sims
 from descwl_coadd.coadd import make_coadd
@@ -312,6 +314,143 @@ def test_lsst_metadetect_fullcoadd_smoke():
         assert len(res[shear][flux_name][0]) == len(bands)
 
 
+def _check_pipeline_metadata_empty(pipeline):
+    for task in (
+        pipeline.meas_task, pipeline.detection_task, pipeline.deblend_task,
+    ):
+        for subtask in task.getTaskDict().values():
+            assert len(subtask.metadata.names()) == 0
+
+
+def test_lsst_detection_pipeline_reuse():
+    from metadetect.lsst import measure
+
+    all_cens = []
+    for i in range(2):
+        rng = np.random.RandomState(seed=55)
+        sim_data = make_lsst_sim(55)
+        data = do_coadding(rng=rng, sim_data=sim_data, nowarp=True)
+
+        sources, detexp = measure.detect_and_deblend(
+            mbexp=data['mbexp'], rng=rng,
+        )
+        all_cens.append(
+            np.array([source.getCentroid() for source in sources])
+        )
+
+    assert all_cens[0].shape == (25, 2)
+    assert np.array_equal(all_cens[0], all_cens[1])
+
+    # the tasks are built once for the same settings, those used by
+    # detect_and_deblend above
+    kw = dict(
+        thresh=DEFAULT_THRESH,
+        exclude_mask_planes=util.get_detection_mask(detexp),
+        stats_mask=util.get_stats_mask(detexp),
+    )
+    pipeline = measure.get_detection_pipeline(**kw)
+    assert measure.get_detection_pipeline(**kw) is pipeline
+
+    # the run metadata is cleared so it does not grow as tasks are reused
+    _check_pipeline_metadata_empty(pipeline)
+
+    kw['thresh'] = 2 * DEFAULT_THRESH
+    assert measure.get_detection_pipeline(**kw) is not pipeline
+
+    # each thread gets its own pipeline
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        other = executor.submit(measure.get_detection_pipeline, **kw).result()
+    assert other is not measure.get_detection_pipeline(**kw)
+
+
+def test_lsst_detection_pipeline_failure(monkeypatch):
+    from metadetect.lsst import measure
+
+    rng = np.random.RandomState(seed=56)
+    sim_data = make_lsst_sim(56)
+    data = do_coadding(rng=rng, sim_data=sim_data, nowarp=True)
+
+    _, detexp = measure.detect_and_deblend(mbexp=data['mbexp'], rng=rng)
+    pipeline = measure.get_detection_pipeline(
+        thresh=DEFAULT_THRESH,
+        exclude_mask_planes=util.get_detection_mask(detexp),
+        stats_mask=util.get_stats_mask(detexp),
+    )
+
+    # fail after the detection and deblending tasks have run
+    def _fail(*args, **kwargs):
+        raise RuntimeError('measurement failed')
+
+    monkeypatch.setattr(pipeline.meas_task, 'callMeasure', _fail)
+    with pytest.raises(RuntimeError):
+        measure.detect_and_deblend(mbexp=data['mbexp'], rng=rng)
+
+    _check_pipeline_metadata_empty(pipeline)
+
+
+def test_lsst_detect_peak_centroid():
+    from metadetect.lsst import measure
+
+    rng = np.random.RandomState(seed=71)
+    sim_data = make_lsst_sim(71)
+    data = do_coadding(rng=rng, sim_data=sim_data, nowarp=True)
+
+    # the peak centroid does not need the noise replacer
+    all_cens = {}
+    for centroid in ['base_SdssCentroid', 'base_PeakCentroid']:
+        sources, detexp = measure.detect_and_deblend(
+            mbexp=data['mbexp'], rng=rng, centroid=centroid,
+        )
+        all_cens[centroid] = np.array(
+            [source.getCentroid() for source in sources]
+        )
+
+        # the psf flux is only measured with neighbors replaced
+        names = sources.schema.getNames()
+        assert (
+            ('base_PsfFlux_instFlux' in names)
+            == CENTROID_NEEDS_ISOLATION[centroid]
+        )
+
+    assert all_cens['base_PeakCentroid'].shape == (25, 2)
+    assert np.allclose(
+        all_cens['base_PeakCentroid'], all_cens['base_SdssCentroid'], atol=1,
+    )
+
+    config = {'detect': {'thresh': 5, 'centroid': 'base_PeakCentroid'}}
+    res = run_metadetect(config=config, rng=rng, **data)
+    for shear in ('noshear', '1p', '1m'):
+        assert np.any(res[shear]['wmom_flags'] == 0)
+
+
+def test_lsst_measure_fast_stamps():
+    from metadetect.lsst import measure
+
+    rng = np.random.RandomState(seed=919)
+
+    bands = ['r', 'i']
+    sim_data = make_lsst_sim(919, bands=bands)
+    data = do_coadding(rng=rng, sim_data=sim_data, nowarp=True)
+
+    sources, detexp = measure.detect_and_deblend(
+        mbexp=data['mbexp'], rng=rng,
+    )
+
+    fitter = get_fitter({'meas_type': 'wmom', 'weight': {'fwhm': 1.2}}, rng=rng)
+
+    res = {}
+    for fast_stamps in [False, True]:
+        res[fast_stamps] = measure.measure(
+            mbexp=data['mbexp'], detexp=detexp, sources=sources,
+            fitter=fitter, stamp_size=32, fast_stamps=fast_stamps,
+        )
+
+    # the sim variance is constant, so the weights are the same
+    assert np.array_equal(res[True]['wmom_flags'], res[False]['wmom_flags'])
+    for name in ['wmom_g', 'wmom_T', 'wmom_s2n', 'wmom_band_flux']:
+        assert np.allclose(res[True][name], res[False][name])
+
+
 def test_lsst_zero_weights(show=False):
     """
     At time of writing, DM stack will still detect in regions with inf
@@ -461,6 +600,70 @@ def test_lsst_metadetect_mfrac_ormask(show=False):
             assert np.any(res[shear]["ormask"] & flag != 0)
 
 
+def _measure_weighted_mfrac_reference(*, mfrac, x, y, jac, fwhm):
+    # the previous implementation, one object at a time with the ngmix
+    # weighted sums, with the box taken as [row, col]
+    sigma = ngmix.moments.fwhm_to_sigma(fwhm)
+    box_rad = int(round(sigma * 5))
+    gauss_wgt = ngmix.GMixModel(
+        [0, 0, 0, 0, ngmix.moments.fwhm_to_T(fwhm), 1],
+        'gauss',
+    )
+
+    ny, nx = mfrac.shape
+    mfracs = []
+    for i in range(x.shape[0]):
+        ix = int(np.floor(x[i] + 0.5))
+        iy = int(np.floor(y[i] + 0.5))
+
+        xstart = max(ix - box_rad, 0)
+        xend = min(ix + box_rad + 1, nx)
+        ystart = max(iy - box_rad, 0)
+        yend = min(iy + box_rad + 1, ny)
+
+        if xstart >= xend or ystart >= yend:
+            mfracs.append(1.0)
+            continue
+
+        sub_mfrac = mfrac[ystart:yend, xstart:xend]
+        this_jac = jac.copy()
+        this_jac.set_cen(row=y[i] - ystart, col=x[i] - xstart)
+        obs = ngmix.Observation(image=sub_mfrac, jacobian=this_jac)
+        stats = gauss_wgt.get_weighted_sums(obs, maxrad=box_rad)
+        mfracs.append(stats["sums"][5] / stats["wsum"])
+
+    return np.array(mfracs)
+
+
+def test_lsst_measure_weighted_mfrac():
+    from metadetect.lsst.metadetect import measure_weighted_mfrac
+
+    rng = np.random.RandomState(seed=55)
+
+    # a non-square image with objects at x != y, some with x beyond the
+    # number of rows, so swapping rows and columns would give other values
+    mfrac = rng.uniform(size=(50, 80))
+    x = np.array([10.3, 31.6, 45.0, 62.7, 75.2, 79.4, -20.0])
+    y = np.array([12.1, 20.8, 40.4, 8.6, 33.3, 0.3, -20.0])
+    jac = ngmix.DiagonalJacobian(row=0, col=0, scale=0.2)
+    fwhm = 1.2
+
+    mfracs = measure_weighted_mfrac(mfrac=mfrac, x=x, y=y, jac=jac, fwhm=fwhm)
+    expected = _measure_weighted_mfrac_reference(
+        mfrac=mfrac, x=x, y=y, jac=jac, fwhm=fwhm,
+    )
+    assert np.allclose(mfracs, expected)
+
+    # the off image object
+    assert mfracs[-1] == 1.0
+
+    # the transposed image and positions give the same values
+    tmfracs = measure_weighted_mfrac(
+        mfrac=mfrac.T.copy(), x=y, y=x, jac=jac, fwhm=fwhm,
+    )
+    assert np.allclose(tmfracs, mfracs)
+
+
 if __name__ == '__main__':
     # test_lsst_metadetect_am()
     test_lsst_masked_as_bright(show=True)
@@ -188,5 +188,56 @@ def test_multiband_noise_replacer(show=False):
         assert np.all(cexp.image.array == exp.image.array)
 
 
+def test_noise_replacer_noise_image():
+    import lsst.afw.image as afw_image
+    seed = 314
+    rng = np.random.RandomState(seed)
+
+    sim = make_lsst_sim(rng)
+
+    exps = [texps[0] for _, texps in sim['band_data'].items()]
+    mbexp = util.get_mbexp(exps)
+    sources = detect_and_deblend(mbexp)
+
+    exposure = mbexp.singles[0]
+    exp_copy = afw_image.ExposureF(exposure, deep=True)
+
+    unit_noise = rng.normal(size=exposure.image.array.shape)
+    noise_image = util.get_noise_image(
+        exposure, rng=rng, remove_poisson=False, unit_noise=unit_noise,
+    )
+    bbox = exposure.getBBox()
+
+    with util.ContextNoiseReplacer(
+        exposure, sources, rng, noise_image=noise_image,
+    ) as replacer:
+
+        detected = np.zeros(exposure.image.array.shape, dtype=bool)
+        for source in sources:
+            if source.getParent() == 0:
+                rows, cols = util.get_footprint_indices(
+                    source.getFootprint(), bbox,
+                )
+                detected[rows, cols] = True
+
+        image = exposure.image.array
+        assert np.any(detected)
+        assert np.all(image[detected] == noise_image[detected].astype('f4'))
+        assert np.all(image[~detected] == exp_copy.image.array[~detected])
+
+        source = sources[0]
+        rows, cols = util.get_footprint_indices(source.getFootprint(), bbox)
+        with replacer.sourceInserted(source.getId()):
+            assert np.all(
+                image[rows, cols] == exp_copy.image.array[rows, cols]
+            )
+
+        assert np.all(
+            image[rows, cols] == noise_image[rows, cols].astype('f4')
+        )
+
+    assert np.all(exp_copy.image.array == exposure.image.array)
+
+
 if __name__ == '__main__':
     test_multiband_noise_replacer(show=True)
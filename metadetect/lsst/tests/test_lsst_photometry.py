@@ -125,6 +125,39 @@ def test_lsst_photometry_smoke(meas_type, subtract_sky, nowarp):
     assert res[flux_name].shape[1] == len(bands)
 
 
+def test_lsst_metadetect_and_photometry():
+    from metadetect.lsst.metadetect import PreparedCell
+
+    rng = np.random.RandomState(seed=881)
+
+    bands = ['r', 'i']
+    sim_data = make_lsst_sim(881, bands=bands)
+    data = do_coadding(rng=rng, sim_data=sim_data, nowarp=True)
+
+    config = {'subtract_sky': True}
+    res, phot_res = lsst_phot.run_metadetect_and_photometry(
+        rng=rng, config=config, **data
+    )
+
+    assert phot_res.size == 25
+    for shear in ('noshear', '1p', '1m'):
+        assert np.any(res[shear]['wmom_flags'] == 0)
+
+    # the psf stats are from the shared fit to the original psfs
+    for name in ['psfrec_g', 'psfrec_T']:
+        assert np.all(res['noshear'][name] == phot_res[name][0])
+
+    prepared = PreparedCell(mbexp=data['mbexp'], rng=rng)
+    with pytest.raises(ValueError):
+        lsst_phot.run_photometry(
+            mbexp=data['mbexp'], rng=rng, config=config, prepared=prepared,
+        )
+    with pytest.raises(ValueError):
+        lsst_phot.run_photometry(
+            mbexp=data['noise_mbexp'], rng=rng, prepared=prepared,
+        )
+
+
 if __name__ == '__main__':
     for mt in ['pgauss', 'ksigma']:
         for nowarp in [True, False]:
@@ -14,7 +14,7 @@ logging.basicConfig(
 )
 
 
-def make_lsst_sim(rng, gal_type, sky_n_sigma, star_density=0):
+def make_lsst_sim(rng, gal_type, sky_n_sigma, star_density=0, bands=('i',)):
     coadd_dim = 251
 
     # the EDGE region is 5 pixels wide but, give a bit more space because the
@@ -58,6 +58,7 @@ def make_lsst_sim(rng, gal_type, sky_n_sigma, star_density=0):
         galaxy_catalog=galaxy_catalog,
         star_catalog=stars,
         coadd_dim=coadd_dim,
+        bands=list(bands),
         g1=0.02,
         g2=0.00,
         psf=psf,
@@ -215,6 +216,49 @@ def test_skysub_sim_fixed_gal(sky_n_sigma):
     check_skysub(meanvals, errvals, image_noise, true_sky=true_sky)
 
 
+@pytest.mark.parametrize('share_footprints', [False, True])
+def test_skysub_mbexp_threads(share_footprints):
+    """
+    the bands processed in threads get the same sky as when processed
+    serially
+    """
+    from metadetect.lsst.util import get_mbexp, get_stats_mask
+
+    bands = ['r', 'i', 'z']
+    sky_n_sigma = -2.0
+
+    skies = {}
+    for nthreads in [1, 3]:
+        rng = np.random.RandomState(77)
+        sim = make_lsst_sim(
+            rng, gal_type='fixed', sky_n_sigma=sky_n_sigma, bands=bands,
+        )
+        mbexp = get_mbexp([sim['band_data'][band][0] for band in bands])
+
+        lsst_skysub.subtract_sky_mbexp(
+            mbexp=mbexp, thresh=5, nthreads=nthreads,
+            share_footprints=share_footprints,
+        )
+
+        skies[nthreads] = np.array(
+            [exp.getMetadata()['BGMEAN'] for exp in mbexp]
+        )
+
+        for exp in mbexp:
+            noise = np.sqrt(np.median(exp.variance.array))
+            assert abs(exp.getMetadata()['BGMEAN'] - sky_n_sigma * noise) < noise
+
+        # the run metadata of the reused tasks is cleared
+        tasks = lsst_skysub.get_skysub_tasks(
+            thresh=5, stats_mask=get_stats_mask(mbexp[bands[0]]),
+        )
+        for task in (tasks.back_task, tasks.detection_task):
+            for subtask in task.getTaskDict().values():
+                assert len(subtask.metadata.names()) == 0
+
+    assert np.all(skies[1] == skies[3])
+
+
 @pytest.mark.skipif(
     "CATSIM_DIR" not in os.environ,
     reason='simulation input data is not present',
@@ -10,24 +10,33 @@ class ContextNoiseReplacer(object):
     """
     noise replacer that works as a context manager
 
+    On construction the pixels in the footprints of all top level sources are
+    replaced with noise.  A source can then be inserted, restoring the
+    original pixels in its footprint, and removed again, putting the noise
+    back.  The original image is restored when the replacer ends.
+
+    Only the footprint pixels are swapped, using index arrays computed once
+    for each source, and only the image plane is modified.
+
     Parameters
     ----------
-    mbexp: lsst.afw.image.Exposure
+    exposure: lsst.afw.image.Exposure
         The data
     sources: lsst.afw.table.SourceCatalog
         Catalog of sources
+    rng: np.random.RandomState
+        Random number generator for the noise image
     noise_image: array, optional
-        Optional noise image to use.  If not sent one is generated.
+        Optional noise image to use, with the same shape as the image.  If not
+        sent one is generated.
 
     Examples
     --------
-    with ContextNoiseReplacer(exposure=exp, sources=sources) as replacer:
+    with ContextNoiseReplacer(exposure=exp, sources=sources, rng=rng) as replacer:
         # do something
     """
 
     def __init__(self, exposure, sources, rng, noise_image=None):
-        from lsst.meas.base import NoiseReplacerConfig, NoiseReplacer
-        import lsst.afw.detection as afw_det
 
         # Notes for metacal.
         #
@@ -39,35 +48,42 @@ class ContextNoiseReplacer(object):
         # making the field the same for all metacal images we reduce variance in
         # the calculation of the response
 
-        config = NoiseReplacerConfig()
-
-        # TODO DM needs to fix the crash
-        # config.noiseSource = 'variance'
-        config.noiseSeedMultiplier = rng.randint(0, 2**24)
-
         if noise_image is None:
             # TODO remove_poisson should be true for real data
             noise_image = get_noise_image(exposure, rng=rng, remove_poisson=False)
 
-        footprints = {}
+        self.image = exposure.image.array
+        self.noise_image = noise_image
+
+        if self.noise_image.shape != self.image.shape:
+            raise ValueError(
+                'noise image shape %s does not match image shape %s' % (
+                    self.noise_image.shape, self.image.shape,
+                )
+            )
+
+        self.original_image = self.image.copy()
+
+        bbox = exposure.getBBox()
+
+        self.indices = {}
+        top_rows = []
+        top_cols = []
         for source in sources:
-            parent_id = source.getParent()
-            fp = source.getFootprint()
-            heavy = afw_det.makeHeavyFootprint(fp, exposure.maskedImage)
-            footprints[source.getId()] = (parent_id, heavy)
-        # footprints = {
-        #     source.getId(): (source.getParent(), source.getFootprint())
-        #     for source in sources
-        # }
-
-        # This constructor will replace all detected pixels with noise in the
-        # image
-        self.replacer = NoiseReplacer(
-            config,
-            exposure=exposure,
-            footprints=footprints,
-            noiseImage=noise_image,
-        )
+            rows, cols = get_footprint_indices(source.getFootprint(), bbox)
+            self.indices[source.getId()] = (rows, cols)
+
+            if source.getParent() == 0:
+                top_rows.append(rows)
+                top_cols.append(cols)
+
+        if len(top_rows) > 0:
+            self.top_indices = (np.concatenate(top_rows), np.concatenate(top_cols))
+        else:
+            self.top_indices = (np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8'))
+
+        # replace all detected pixels with noise in the image
+        self._set_from(self.noise_image, self.top_indices)
 
     @contextmanager
     def sourceInserted(self, source_id):
@@ -88,16 +104,22 @@ class ContextNoiseReplacer(object):
         """
         Insert a source
         """
-        self.replacer.insertSource(source_id)
+        self._set_from(self.original_image, self.indices[source_id])
 
     def removeSource(self, source_id):
         """
         Remove a source
         """
-        self.replacer.removeSource(source_id)
+        self._set_from(self.noise_image, self.indices[source_id])
 
     def end(self):
-        self.replacer.end()
+        """
+        restore the original image
+        """
+        self._set_from(self.original_image, self.top_indices)
+
+    def _set_from(self, source_image, indices):
+        self.image[indices] = source_image[indices]
 
     def __enter__(self):
         return self
@@ -106,6 +128,29 @@ class ContextNoiseReplacer(object):
         self.end()
 
 
+def get_footprint_indices(footprint, bbox):
+    """
+    get the row and column indices of the pixels in a footprint, relative to
+    the start of the input bounding box
+
+    Parameters
+    ----------
+    footprint: lsst.afw.detection.Footprint
+        The footprint
+    bbox: lsst.geom.Box2I
+        The bounding box of the image
+
+    Returns
+    -------
+    rows, cols: arrays
+        Indices that can be used to index the image array
+    """
+    ys, xs = footprint.getSpans().indices()
+    rows = np.asarray(ys, dtype='i8') - bbox.getBeginY()
+    cols = np.asarray(xs, dtype='i8') - bbox.getBeginX()
+    return rows, cols
+
+
 class MultibandNoiseReplacer(object):
     """
     noise replacer that works on multiple bands
@@ -236,7 +281,7 @@ def get_noise_replacer(exposure, sources, noise_image=None):
     )
 
 
-def get_noise_image(exp, rng, remove_poisson):
+def get_noise_image(exp, rng, remove_poisson, unit_noise=None):
     """
     get a noise image based on the input exposure
 
@@ -252,14 +297,16 @@ def get_noise_image(exp, rng, remove_poisson):
     remove_poisson: bool
         If True, remove the poisson noise from the variance
         estimate.
+    unit_noise: array, optional
+        Optional noise field with unit variance and the shape of the image,
+        scaled to the noise level of the exposure.  Send the same field to
+        use the same noise for different versions of an image, e.g. the
+        metacal images.  If not sent a new field is drawn using the rng.
 
     Returns
     -------
-    MaskedImage
+    array
     """
-    import lsst.afw.image as afw_image
-
-    noise_exp = afw_image.ExposureF(exp, deep=True)
 
     signal = exp.image.array
     variance = exp.variance.array
@@ -278,12 +325,10 @@ def get_noise_image(exp, rng, remove_poisson):
     else:
         var = np.median(variance[use])
 
-    noise = rng.normal(scale=np.sqrt(var), size=signal.shape)
-
-    noise_exp.image.array[:, :] = noise
-    noise_exp.variance.array[:, :] = var
+    if unit_noise is None:
+        unit_noise = rng.normal(size=signal.shape)
 
-    return noise_exp.getMaskedImage()
+    return np.sqrt(var) * unit_noise
 
 
 def get_mbexp(exposures):
@@ -360,7 +405,7 @@ def try_clone_psf(psf):
     return new_psf
 
 
-def coadd_exposures(exposures):
+def coadd_exposures(exposures, weights=None):
     """
     coadd a set of exposures, assuming they share the same wcs
 
@@ -368,6 +413,11 @@ def coadd_exposures(exposures):
     ----------
     exposures: [lsst.afw.image.Exposure]
         List of exposures to coadd
+    weights: array, optional
+        The weight for each exposure, see get_coadd_weights.  Only the
+        relative weights matter, so weights can be reused for exposures whose
+        variances differ by a constant factor, such as the metacal exposures.
+        If not sent they are calculated.
 
     Returns
     --------
@@ -376,55 +426,50 @@ def coadd_exposures(exposures):
     import lsst.geom as geom
     import lsst.afw.image as afw_image
 
-    wsum = 0.0
-
-    for i, exp in enumerate(exposures):
-
-        shape = exp.image.array.shape
-
-        ycen, xcen = (np.array(shape) - 1)/2
-        cen = geom.Point2D(xcen, ycen)
-
-        psfobj = exp.getPsf()
-        this_psfim = psfobj.computeKernelImage(cen).array
-
-        if i == 0:
-            coadd_exp = afw_image.ExposureF(exp, deep=True)
-            coadd_exp.image.array[:, :] = 0.0
-
-            weight = np.zeros(shape, dtype='f4')
+    if weights is None:
+        weights = get_coadd_weights(exposures)
 
-            psf_im = this_psfim.copy()
-            psf_im[:, :] = 0
+    wsum = weights.sum()
+    if wsum <= 0:
+        logger.info('found wsum <= 0')
+        return None
 
-        coadd_exp.mask.array |= exp.mask.array
+    shape = exposures[0].image.array.shape
+    ycen, xcen = (np.array(shape) - 1)/2
+    cen = geom.Point2D(xcen, ycen)
 
-        w = np.where(exp.variance.array > 0)
-        medvar = np.median(exp.variance.array[w])
-        this_weight = 1.0/medvar
+    psf_ims = np.stack([
+        exp.getPsf().computeKernelImage(cen).array for exp in exposures
+    ])
 
-        coadd_exp.image.array[w] += exp.image.array[w] * this_weight
-        psf_im += this_psfim * this_weight
+    images = np.stack([exp.image.array for exp in exposures])
+    variances = np.stack([exp.variance.array for exp in exposures])
+    good = variances > 0
 
-        weight[w] += 1.0/exp.variance.array[w]
+    coadd_exp = afw_image.ExposureF(exposures[0], deep=True)
 
-        wsum += this_weight
+    # only pixels with positive variance contribute, but the normalization is
+    # the sum of the weights for all exposures
+    coadd_exp.image.array[:, :] = np.tensordot(
+        weights / wsum, np.where(good, images, 0.0), axes=1,
+    )
 
-    if wsum <= 0:
-        logger.info('found wsum <= 0')
-        return None
+    coadd_exp.mask.array[:, :] = np.bitwise_or.reduce(
+        np.stack([exp.mask.array for exp in exposures]), axis=0,
+    )
 
-    fac = 1.0/wsum
+    ivar = np.divide(
+        1.0, variances, out=np.zeros(variances.shape), where=good,
+    ).sum(axis=0)
 
-    coadd_exp.image.array[:, :] *= fac
+    coadd_exp.variance.array[:, :] = np.inf
+    w = np.where(ivar > 0)
+    coadd_exp.variance.array[w] = 1/ivar[w]
 
     # the psf is always normalized
+    psf_im = np.tensordot(weights, psf_ims, axes=1)
     psf_im *= 1.0/psf_im.sum()
 
-    coadd_exp.variance.array[:, :] = np.inf
-    w = np.where(weight > 0)
-    coadd_exp.variance.array[w] = 1/weight[w]
-
     coadd_psf = get_stack_kernel_psf(psf_im)
     coadd_exp.setPsf(coadd_psf)
 
@@ -433,6 +478,28 @@ def coadd_exposures(exposures):
     return coadd_exp
 
 
+def get_coadd_weights(exposures):
+    """
+    get the weights used by coadd_exposures, the inverse of the median of the
+    positive variance in each exposure
+
+    Parameters
+    ----------
+    exposures: [lsst.afw.image.Exposure]
+        List of exposures to coadd
+
+    Returns
+    --------
+    array of weights
+    """
+    weights = np.zeros(len(exposures))
+    for i, exp in enumerate(exposures):
+        var = exp.variance.array
+        weights[i] = 1.0/np.median(var[var > 0])
+
+    return weights
+
+
 def get_stack_kernel_psf(psf_image):
     """
     create a KernelPsf from the input image
@@ -471,38 +538,33 @@ def coadd_mbobs(mbobs):
     lsst.afw.image.ExposureF
     """
 
-    wsum = 0.0
-
     meta = {}
-    for i, obslist in enumerate(mbobs):
-        obs = obslist[0]
-        meta.update(obs.meta)
-
-        shape = obs.image.shape
-
-        if i == 0:
-            coadd_image = np.zeros(shape, dtype='f4')
-            coadd_weight = np.zeros(shape, dtype='f4')
+    for obslist in mbobs:
+        meta.update(obslist[0].meta)
 
-            coadd_psf = np.zeros(obs.psf.image.shape)
+    band_obs = [obslist[0] for obslist in mbobs]
 
-        w = np.where(obs.weight > 0)
-        this_weight = np.median(obs.weight[w])
+    weights = np.zeros(len(band_obs))
+    for i, obs in enumerate(band_obs):
+        weights[i] = np.median(obs.weight[obs.weight > 0])
 
-        coadd_image[:, :] += obs.image * this_weight
-        coadd_weight[:, :] += obs.weight
-        coadd_psf[:, :] += obs.psf.image * this_weight
+    wsum = weights.sum()
 
-        wsum += this_weight
-
-    fac = 1.0/wsum
-
-    coadd_image[:, :] *= fac
+    coadd_image = np.tensordot(
+        weights / wsum, np.stack([obs.image for obs in band_obs]), axes=1,
+    ).astype('f4')
+    coadd_weight = np.stack(
+        [obs.weight for obs in band_obs]
+    ).sum(axis=0, dtype='f4')
 
     # the psf is always normalized
+    coadd_psf = np.tensordot(
+        weights, np.stack([obs.psf.image for obs in band_obs]), axes=1,
+    )
     coadd_psf *= 1.0/coadd_psf.sum()
 
     # use the jacobians from the last obs
+    obs = band_obs[-1]
     jac = obs.jacobian
     psf_jac = obs.psf.jacobian
 
@@ -635,7 +697,7 @@ def obs2exp(obs, exp=None, copy_mask_from='bmask', copy_psf=False):
     return exp
 
 
-def exp2obs(exp, copy_mask_to='ormask', store_exp=False):
+def exp2obs(exp, copy_mask_to='ormask', store_exp=False, cache=None):
     """
     convert an exposure to an observation.  The wcs is linearized
     and the psf is reconstructed as a kernel image.
@@ -660,6 +722,9 @@ def exp2obs(exp, copy_mask_to='ormask', store_exp=False):
         obs.ormask and obs.bmask is set to zero.
     store_exp: bool, optional
         If set to True, store the original exposure in .meta['exposure']
+    cache: ExposureCache, optional
+        If sent, the jacobian and psf image are taken from or stored in
+        this cache
 
     Returns
     -------
@@ -676,15 +741,17 @@ def exp2obs(exp, copy_mask_to='ormask', store_exp=False):
         as_double=True,
     )
 
-    jac = get_jacobian(exp=exp, cen=cen)
+    if cache is None:
+        cache = ExposureCache()
+
+    jac = cache.get_jacobian(exp=exp, cen=cen)
 
     dims = exp.image.array.shape
     weight = np.zeros(dims)
     w = np.where(exp.variance.array > 0)
     weight[w] = 1.0/exp.variance.array[w]
 
-    psf_obj = exp.getPsf()
-    psf_image = psf_obj.computeKernelImage(cen).array
+    psf_image = cache.get_psf_kernel_image(exp=exp, cen=cen)
 
     assert psf_image.shape[0] == psf_image.shape[1], 'psf is not square'
     assert psf_image.shape[0] % 2 != 0, 'psf dims are not odd'
@@ -728,7 +795,99 @@ def exp2obs(exp, copy_mask_to='ormask', store_exp=False):
     )
 
 
-def get_jacobian(exp, cen):
+class ExposureCache(object):
+    """
+    Cache of psf kernel images, jacobians and galsim jacobian wcs for
+    exposures, keyed by the exposure and the location
+
+    Reconstructing the psf can be expensive, e.g. for a CoaddPsf, and the same
+    quantities at the center of each exposure are needed in several places.
+    Create one of these for a set of exposures, e.g. in run_metadetect, and
+    pass it to the functions that need them.
+
+    The exposures are kept alive by the cache, so they are not mistaken for
+    new exposures created at the same address.  Copies of the cached values
+    are returned, so callers are free to modify them.
+    """
+    def __init__(self):
+        self._data = {}
+
+    def get_psf_kernel_image(self, exp, cen):
+        """
+        get the psf kernel image for the exposure at the specified location
+
+        Parameters
+        ----------
+        exp: lsst.afw.image.Exposure
+            The exposure data
+        cen: lsst.geom.Point2D
+            The location at which to reconstruct the psf
+
+        Returns
+        -------
+        image as a numpy array
+        """
+        image = self._get(
+            'psf', exp, cen,
+            lambda: exp.getPsf().computeKernelImage(cen).array,
+        )
+        return image.copy()
+
+    def get_jacobian(self, exp, cen):
+        """
+        get an ngmix jacobian for the exposure at the specified location,
+        see get_jacobian
+
+        Parameters
+        ----------
+        exp: lsst.afw.image.Exposure
+            The exposure data
+        cen: lsst.geom.Point2D
+            The location at which to get the jacobian
+
+        Returns
+        -------
+        ngmix.Jacobian
+        """
+        jac = self._get(
+            'jacobian', exp, cen, lambda: get_jacobian(exp=exp, cen=cen),
+        )
+        return jac.copy()
+
+    def get_galsim_wcs(self, exp, cen):
+        """
+        get the galsim jacobian wcs for the exposure at the specified
+        location
+
+        Parameters
+        ----------
+        exp: lsst.afw.image.Exposure
+            The exposure data
+        cen: lsst.geom.Point2D
+            The location at which to get the wcs
+
+        Returns
+        -------
+        galsim.JacobianWCS
+        """
+        # galsim wcs objects are immutable so no copy is needed
+        return self._get(
+            'galsim_wcs', exp, cen,
+            lambda: self.get_jacobian(exp=exp, cen=cen).get_galsim_wcs(),
+        )
+
+    def _get(self, kind, exp, cen, func):
+        key = (kind, id(exp), cen.getX(), cen.getY())
+
+        entry = self._data.get(key)
+        if entry is None:
+            entry = (exp, func())
+            self._data[key] = entry
+
+        return entry[1]
+
+
+def get_jacobian(exp, cen, xy0=None):
     """
     get an ngmix jacobian at the specified location
 
@@ -740,6 +899,9 @@ def get_jacobian(exp, cen):
         The position at which to get the jacobian.  It is also used as the
         center for the ngmix jacobian as relative to the corner of the bounding
         box.
+    xy0: lsst.geom.Point2I, optional
+        The corner to which the center is relative.  Default is the corner of
+        the exposure bounding box, exp.getXY0()
 
     Returns
     -------
@@ -748,7 +910,8 @@ def get_jacobian(exp, cen):
     import lsst.geom as geom
 
     wcs = exp.getWcs()
-    xy0 = exp.getXY0()
+    if xy0 is None:
+        xy0 = exp.getXY0()
 
     dm_jac = wcs.linearizePixelToSky(cen, geom.arcseconds)
     matrix = dm_jac.getLinear().getMatrix()
@@ -797,6 +960,22 @@ def get_integer_center(wcs, bbox, as_double=False):
     return pixcen, skycen
 
 
+def reset_task_metadata(task):
+    """
+    replace the metadata of a DM task and its subtasks with empty metadata
+
+    The tasks record the timing of each run in their metadata, so it grows
+    without bound when a task is reused for many runs
+
+    Parameters
+    ----------
+    task: lsst.pipe.base.Task
+        The task
+    """
+    for subtask in task.getTaskDict().values():
+        subtask.metadata = type(subtask.metadata)()
+
+
 def get_stats_mask(exp):
     """
     Get a stats mask for use in getting image statistics.  If BRIGHT
@@ -44,8 +44,8 @@ def show_exp(exp, mess=None, use_mpl=False, sources=None):
             bbox = exp.getBBox()
             pprint(exp.mask.getMaskPlaneDict())
             axs[0].scatter(
-                sources['base_SdssCentroid_x'] - bbox.beginX,
-                sources['base_SdssCentroid_y'] - bbox.beginY,
+                sources.getX() - bbox.beginX,
+                sources.getY() - bbox.beginY,
                 color='red',
             )
 
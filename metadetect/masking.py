@@ -3,7 +3,7 @@ import numpy as np
 from .interpolate import interpolate_image_at_mask
 
 
-@njit
+@njit(cache=True)
 def get_ap_range(ap_rad):
     """
     Get the range over which the the apodization kernel drops to zero
@@ -57,7 +57,7 @@ def apply_apodization_corrections(*, mbobs, ap_rad, mask_bit_val):
                         obs.ignore_zero_weight = False
 
 
-@njit
+@njit(cache=True)
 def _build_square_apodization_mask(ap_rad, ap_mask):
     ap_range = get_ap_range(ap_rad)
 
@@ -390,7 +390,7 @@ def make_foreground_apodization_mask(
     return ap_mask
 
 
-@njit
+@njit(cache=True)
 def _intersects(row, col, radius_pixels, nrows, ncols):
     """
     low level routine to check if the mask intersects the image.
@@ -424,7 +424,7 @@ def _intersects(row, col, radius_pixels, nrows, ncols):
         return False
 
 
-@njit
+@njit(cache=True)
 def _ap_kern_kern(x, m, h):
     # cumulative triweight kernel
     y = (x - m) / h + 3
@@ -443,7 +443,7 @@ def _ap_kern_kern(x, m, h):
         return val
 
 
-@njit
+@njit(cache=True)
 def _do_apodization_mask(*, rows, cols, radius_pixels, ap_mask, ap_rad):
     """low-level code to make the apodization mask
 
@@ -484,7 +484,7 @@ def _do_apodization_mask(*, rows, cols, radius_pixels, ap_mask, ap_rad):
     return nmasked
 
 
-@njit
+@njit(cache=True)
 def _do_mask_foreground(*, rows, cols, radius_pixels, bmask, flag):
     """
     low level code to mask foreground objects
@@ -0,0 +1,125 @@
+"""
+Accounting of the memory held in arrays by metadetect.
+
+The bytes are counted from the arrays held at each stage, the input
+observations, the metacal images, the stamps and the results, so the
+accounting costs almost nothing.  If tracemalloc is tracing, its peak is
+reported as well.
+"""
+import tracemalloc
+
+
+def get_obs_nbytes(obs):
+    """
+    get the bytes held in the arrays of an observation, including its psf
+
+    Parameters
+    ----------
+    obs: ngmix.Observation
+
+    Returns
+    -------
+    nbytes: int
+    """
+    nbytes = obs.image.nbytes + obs.weight.nbytes
+
+    if obs.has_bmask():
+        nbytes += obs.bmask.nbytes
+    if obs.has_ormask():
+        nbytes += obs.ormask.nbytes
+    if obs.has_noise():
+        nbytes += obs.noise.nbytes
+    if obs.has_mfrac():
+        nbytes += obs.mfrac.nbytes
+    if obs.has_psf():
+        nbytes += get_obs_nbytes(obs.psf)
+
+    return nbytes
+
+
+def get_mbobs_nbytes(mbobs):
+    """
+    get the bytes held in the arrays of a MultiBandObsList
+
+    Parameters
+    ----------
+    mbobs: ngmix.MultiBandObsList
+
+    Returns
+    -------
+    nbytes: int
+    """
+    return sum(
+        get_obs_nbytes(obs)
+        for obslist in mbobs
+        for obs in obslist
+    )
+
+
+def get_mbobs_list_nbytes(mbobs_list):
+    """
+    get the bytes held in the arrays of a list of MultiBandObsList, such as
+    the stamps for all objects
+
+    Parameters
+    ----------
+    mbobs_list: list of ngmix.MultiBandObsList
+
+    Returns
+    -------
+    nbytes: int
+    """
+    return sum(get_mbobs_nbytes(mbobs) for mbobs in mbobs_list)
+
+
+class MemoryTracker(object):
+    """
+    Count the bytes held by each stage and the peak held at once
+    """
+    def __init__(self):
+        self.stages = {}
+        self.held = 0
+        self.peak = 0
+
+    def add(self, stage, nbytes):
+        """
+        add arrays held by a stage; the largest amount seen is kept for
+        each stage
+
+        Parameters
+        ----------
+        stage: str
+            The stage, e.g. 'metacal'
+        nbytes: int
+            The number of bytes
+        """
+        self.stages[stage] = max(self.stages.get(stage, 0), nbytes)
+        self.held += nbytes
+        self.peak = max(self.peak, self.held)
+
+    def release(self, nbytes):
+        """
+        release arrays that are no longer held
+
+        Parameters
+        ----------
+        nbytes: int
+            The number of bytes
+        """
+        self.held -= nbytes
+
+    def get_stats(self):
+        """
+        get the memory statistics
+
+        Returns
+        -------
+        stats: dict
+            The bytes for each stage, the peak bytes held at once, and
+            tracemalloc_peak if tracemalloc is tracing
+        """
+        stats = dict(self.stages)
+        stats['peak'] = self.peak
+        if tracemalloc.is_tracing():
+            stats['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+        return stats
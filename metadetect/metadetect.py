@@ -10,8 +10,10 @@ from . import detect
 from . import fitting
 from . import procflags
 from . import shearpos
+from .defaults import PRECISION_DTYPES, DEFAULT_PRECISION
 from .util import Namer
 from .mfrac import measure_mfrac
+from .memory import MemoryTracker, get_mbobs_nbytes, get_mbobs_list_nbytes
 from .fitting import (
     fit_mbobs_list_wavg,
     combine_fit_res,
@@ -25,7 +27,7 @@ logger = logging.getLogger(__name__)
 def do_metadetect(
     config, mbobs, rng, shear_band_combs=None,
     color_key_func=None, color_dep_mbobs=None,
-    det_band_combs=None,
+    det_band_combs=None, tracer=None,
 ):
     """Run metadetect on the multi-band observations.
 
@@ -57,6 +59,9 @@ def do_metadetect(
     color_dep_mbobs: dict of mbobs, optional
         A dictionary of color-dependently rendered observations of the mbobs for use
         in color-dependent metadetect.
+    tracer: metadetect.tracing.Tracer, optional
+        If given, called with the time taken by detection, each object fit, mfrac
+        and position unshearing, see metadetect.tracing.
 
     Returns
     -------
@@ -69,6 +74,7 @@ def do_metadetect(
         color_key_func=color_key_func,
         color_dep_mbobs=color_dep_mbobs,
         det_band_combs=det_band_combs,
+        tracer=tracer,
     )
     md.go()
     return md.result
@@ -127,6 +133,9 @@ class Metadetect(dict):
     color_dep_mbobs: dict of mbobs, optional
         A dictionary of color-dependently rendered observations of the mbobs for use
         in color-dependent metadetect.
+    tracer: metadetect.tracing.Tracer, optional
+        If given, called with the time taken by detection, each object fit, mfrac
+        and position unshearing, see metadetect.tracing.
     """
     def __init__(
         self, config, mbobs, rng, show=False,
@@ -134,8 +143,10 @@ class Metadetect(dict):
         color_key_func=None,
         color_dep_mbobs=None,
         det_band_combs=None,
+        tracer=None,
     ):
         self._show = show
+        self._tracer = tracer
 
         self._set_config(config)
         self.mbobs = mbobs
@@ -184,6 +195,15 @@ class Metadetect(dict):
             'meds setting must be present in config'
         self['nodet_flags'] = self.get('nodet_flags', 0)
 
+        self['precision'] = self.get('precision', DEFAULT_PRECISION)
+        if self['precision'] not in PRECISION_DTYPES:
+            raise ValueError(
+                "bad precision '%s', expected one of %s" % (
+                    self['precision'], list(PRECISION_DTYPES),
+                )
+            )
+        self._dtype = PRECISION_DTYPES[self['precision']]
+
     def _get_ormask_and_bmask(self, mbobs):
         """
         set the ormask and bmask, ored from all epochs
@@ -208,8 +228,12 @@ class Metadetect(dict):
         """
         get the masked fraction image, averaged over all bands
         """
+        shape = mbobs[0][0].image.shape
+
+        # accumulated in double precision and cast once to the cell precision
         wgts = []
-        mfrac = np.zeros_like(mbobs[0][0].image)
+        mfrac = np.zeros(shape, dtype='f8')
+        scratch = np.empty(shape, dtype='f8')
         for band, obslist in enumerate(mbobs):
             nepoch = len(obslist)
             assert nepoch == 1, 'expected 1 epoch, got %d' % nepoch
@@ -221,15 +245,16 @@ class Metadetect(dict):
             else:
                 wgt = np.median(obs.weight[msk])
             if hasattr(obs, "mfrac"):
-                mfrac += (obs.mfrac * wgt)
+                np.multiply(obs.mfrac, wgt, out=scratch)
+                mfrac += scratch
             wgts.append(wgt)
 
         if np.sum(wgts) > 0:
-            mfrac = mfrac / np.sum(wgts)
+            mfrac /= np.sum(wgts)
         else:
             mfrac[:, :] = 1.0
 
-        return mfrac
+        return mfrac.astype(self._dtype, copy=False)
 
     def _set_fitter(self):
         """
@@ -345,9 +370,51 @@ class Metadetect(dict):
 
         return self._result
 
+    @property
+    def memory(self):
+        """
+        get the bytes held in arrays by each stage of the last run, the peak
+        held at once and whether the low memory strategy was used; see
+        metadetect.memory.MemoryTracker
+        """
+        if not hasattr(self, '_memory'):
+            raise RuntimeError('run go() first')
+
+        stats = self._memory.get_stats()
+        stats['low_memory'] = self._low_memory
+        return stats
+
     def go(self):
         """Run metadetect and set the result."""
 
+        self._memory = MemoryTracker()
+        self._low_memory = False
+        self._stream_metacal = False
+
+        if self._tracer is None:
+            self._go()
+            return
+
+        self._tracer.begin_cell()
+        try:
+            self._go()
+        finally:
+            self._tracer.end_cell()
+
+    def _go(self):
+        mbobs_nbytes = get_mbobs_nbytes(self.mbobs)
+        self._memory.add('mbobs', mbobs_nbytes)
+
+        if self.color_key_func is None and (
+            self.get('stream_metacal', False)
+            or self._use_low_memory(mbobs_nbytes)
+        ):
+            # make, measure and release the metacal images for one shear type
+            # at a time
+            logger.info("using the low memory strategy")
+            self._low_memory = True
+            self._stream_metacal = True
+
         mfrac = self._get_mfrac(self.mbobs)
         any_all_zero_weight = False
         any_all_masked = False
@@ -372,18 +439,51 @@ class Metadetect(dict):
             self._result = None
             return
 
+        # each band combination and shear type is measured with its own rng,
+        # seeded from this draw, so the results do not depend on the order in
+        # which they are measured
+        self._measure_seed = self.rng.randint(0, 2**31)
+
+        band_combs = list(enumerate(
+            zip(self._shear_band_combs, self._det_band_combs)
+        ))
+        if self._stream_metacal:
+            # the images for each shear type are made when popped from the
+            # stream, and released once all band combinations are measured
+            all_band_res = []
+            for shear_str in list(mcal_res):
+                shear_mcal_res = {shear_str: mcal_res.pop(shear_str)}
+                mcal_nbytes = get_mbobs_nbytes(shear_mcal_res[shear_str])
+                self._memory.add('metacal', mcal_nbytes)
+
+                for icomb, (shear_bands, det_bands) in band_combs:
+                    all_band_res.append(self._go_bands(
+                        shear_bands, shear_mcal_res, det_bands, icomb,
+                    ))
+
+                del shear_mcal_res
+                self._memory.release(mcal_nbytes)
+        elif self.color_key_func is not None and self.color_dep_mbobs is not None:
+            self._memory.add('metacal', _get_mcal_res_nbytes(mcal_res))
+            all_band_res = [
+                self._go_bands_with_color(
+                    shear_bands, mcal_res, det_bands, icomb,
+                )
+                for icomb, (shear_bands, det_bands) in band_combs
+            ]
+        else:
+            self._memory.add('metacal', _get_mcal_res_nbytes(mcal_res))
+            all_band_res = [
+                self._go_bands(shear_bands, mcal_res, det_bands, icomb)
+                for icomb, (shear_bands, det_bands) in band_combs
+            ]
+
         # past this point, the code should always return a dictionary with the minimal
         # metacal types
         # this indicates that a measurement should have been possible
         # we may find nothing, but that is a different thing
         all_res = {}
-        for shear_bands, det_bands in zip(
-            self._shear_band_combs, self._det_band_combs
-        ):
-            if self.color_key_func is not None and self.color_dep_mbobs is not None:
-                res = self._go_bands_with_color(shear_bands, mcal_res, det_bands)
-            else:
-                res = self._go_bands(shear_bands, mcal_res, det_bands)
+        for res in all_band_res:
             if res is not None:
                 for k, v in res.items():
                     if v is None:
@@ -403,9 +503,39 @@ class Metadetect(dict):
                 # metacal images
                 all_res[mcal_type] = None
 
+        self._memory.add(
+            'result',
+            sum(v.nbytes for v in all_res.values() if v is not None),
+        )
         self._result = all_res
 
-    def _go_bands(self, shear_bands, mcal_res, det_bands):
+    def _use_low_memory(self, mbobs_nbytes):
+        """
+        check if the input and metacal images would exceed the memory_budget
+        in the config, in bytes
+        """
+        budget = self.get('memory_budget', None)
+        if budget is None:
+            return False
+
+        ntypes = len(self['metacal'].get(
+            "types", ngmix.metacal.METACAL_MINIMAL_TYPES
+        ))
+        # the images for each metacal type are about the size of the input
+        return mbobs_nbytes * (1 + ntypes) > budget
+
+    def _get_measure_rng(self, icomb, shear_str):
+        """
+        get the rng for measuring a band combination and shear type
+        """
+        types = list(self['metacal'].get(
+            "types", ngmix.metacal.METACAL_MINIMAL_TYPES
+        ))
+        return np.random.RandomState(
+            [self._measure_seed, icomb, types.index(shear_str)]
+        )
+
+    def _go_bands(self, shear_bands, mcal_res, det_bands, icomb):
         kdata = self._get_mbobs_data(None, shear_bands)
 
         _result = {}
@@ -413,7 +543,11 @@ class Metadetect(dict):
             cat, mbobs_list = self._do_detect(
                 shear_mbobs,
                 det_bands,
+                shear_str=shear_str,
             )
+            stamps_nbytes = get_mbobs_list_nbytes(mbobs_list)
+            self._memory.add('stamps', stamps_nbytes)
+
             _result[shear_str] = self._measure(
                 mbobs_list=mbobs_list,
                 shear_bands=shear_bands,
@@ -424,11 +558,15 @@ class Metadetect(dict):
                 bmask=kdata["bmask"],
                 ormask=kdata["ormask"],
                 psf_stats=kdata["psf_stats"],
+                rng=self._get_measure_rng(icomb, shear_str),
             )
 
+            del mbobs_list
+            self._memory.release(stamps_nbytes)
+
         return _result
 
-    def _go_bands_with_color(self, shear_bands, mcal_res, det_bands):
+    def _go_bands_with_color(self, shear_bands, mcal_res, det_bands, icomb):
         _result = {}
         for shear_str, shear_mbobs in mcal_res.items():
             if not self._fitter_is_wavg[0]:
@@ -438,7 +576,9 @@ class Metadetect(dict):
                 )
 
             # we first detect and get color of each detection
-            cat, mbobs_list = self._do_detect(shear_mbobs, det_bands)
+            cat, mbobs_list = self._do_detect(
+                shear_mbobs, det_bands, shear_str=shear_str,
+            )
             nocolor_data = fit_mbobs_list_wavg(
                 mbobs_list=mbobs_list,
                 fitter=self._fitters[0],
@@ -458,6 +598,7 @@ class Metadetect(dict):
             ]
 
             # now we remeasure the object at that mbobs
+            rng = self._get_measure_rng(icomb, shear_str)
             color_data = []
             for i, color_key in enumerate(color_keys):
                 kdata = self._get_mbobs_data(color_key, shear_bands)
@@ -485,6 +626,7 @@ class Metadetect(dict):
                     bmask=kdata["bmask"],
                     ormask=kdata["ormask"],
                     psf_stats=kdata["psf_stats"],
+                    rng=rng,
                 )
                 if _data is not None:
                     color_data.append(_data)
@@ -529,7 +671,10 @@ class Metadetect(dict):
             self._mcalpsf_data_cache[key]["psf_fit_flags"] = _psf_fit_flags
             logger.info("PSF fits took %s seconds", time.time() - t0)
 
-            mcal_res = self._get_all_metacal(mbobs)
+            if key is None and self._stream_metacal:
+                mcal_res = self._get_metacal_stream(mbobs)
+            else:
+                mcal_res = self._get_all_metacal(mbobs)
             self._mcalpsf_data_cache[key]["mcal_res"] = mcal_res
 
         sbkey = tuple(sorted(shear_bands))
@@ -558,7 +703,7 @@ class Metadetect(dict):
 
     def _measure(
         self, *, mbobs_list, shear_bands, cat, shear_str, mfrac, bmask,
-        ormask, psf_stats, det_bands,
+        ormask, psf_stats, det_bands, rng,
     ):
 
         t0 = time.time()
@@ -569,6 +714,7 @@ class Metadetect(dict):
             self._fitter_coadd,
         ):
             ft0 = time.time()
+            obj_callback = self._get_obj_callback(shear_str, fitter)
             if is_wavg:
                 res = fit_mbobs_list_wavg(
                     mbobs_list=mbobs_list,
@@ -577,6 +723,7 @@ class Metadetect(dict):
                     bmask_flags=self.get("bmask_flags", 0),
                     fwhm_reg=fwhm_reg,
                     symmetrize=symm,
+                    obj_callback=obj_callback,
                 )
             else:
                 res = fit_mbobs_list_joint(
@@ -584,9 +731,10 @@ class Metadetect(dict):
                     fitter_name=fitter,
                     shear_bands=shear_bands,
                     bmask_flags=self.get("bmask_flags", 0),
-                    rng=self.rng,
+                    rng=rng,
                     symmetrize=symm,
                     coadd=coadd,
+                    obj_callback=obj_callback,
                 )
             ft0 = time.time() - ft0
             logger.info(
@@ -615,6 +763,24 @@ class Metadetect(dict):
 
         return res
 
+    def _get_obj_callback(self, shear_str, fitter):
+        """
+        get the callback sending the object fit times to the tracer
+        """
+        if self._tracer is None:
+            return None
+
+        tracer = self._tracer
+        name = fitter.kind if hasattr(fitter, "kind") else fitter
+
+        def _obj_callback(i, mbobs, duration):
+            tracer.object_fit(
+                shear_type=shear_str, fitter=name, index=i, mbobs=mbobs,
+                duration=duration,
+            )
+
+        return _obj_callback
+
     def _add_positions_and_psf(
         self, *, cat, res, shear_str, mfrac, bmask, ormask, psf_stats, det_bands,
     ):
@@ -657,7 +823,7 @@ class Metadetect(dict):
         newres['psfrec_g'][:, 0] = psf_stats['g1']
         newres['psfrec_g'][:, 1] = psf_stats['g2']
         newres['psfrec_T'][:] = psf_stats['T']
-        newres['mfrac_img'][:] = np.mean(mfrac)
+        newres['mfrac_img'][:] = np.mean(mfrac, dtype='f8')
 
         if cat.size > 0:
             obs = self.mbobs[0][0]
@@ -665,18 +831,22 @@ class Metadetect(dict):
             newres['sx_col'] = cat['x']
             newres['sx_row'] = cat['y']
 
-            rows_noshear, cols_noshear = shearpos.unshear_positions_obs(
-                newres['sx_row'],
-                newres['sx_col'],
-                shear_str,
-                obs,  # an example for jacobian and image shape
-                # default is 0.01 but make sure to use the passed in default
-                # if needed
-                step=self['metacal'].get("step", shearpos.DEFAULT_STEP),
+            t0 = time.time()
+            rows_noshear, cols_noshear = (
+                self._get_shear_pos_transform().unshear_positions(
+                    newres['sx_row'],
+                    newres['sx_col'],
+                    shear_str,
+                )
             )
 
             newres['sx_row_noshear'] = rows_noshear
             newres['sx_col_noshear'] = cols_noshear
+            if self._tracer is not None:
+                self._tracer.unshear(
+                    shear_type=shear_str, nobj=cat.size,
+                    duration=time.time() - t0,
+                )
 
             if 'ormask_region' in self and self['ormask_region'] > 1:
                 ormask_region = self['ormask_region']
@@ -722,6 +892,7 @@ class Metadetect(dict):
                 mask=bmask,
             )
 
+            t0 = time.time()
             if np.any(mfrac > 0):
                 newres["mfrac"] = measure_mfrac(
                     mfrac=mfrac,
@@ -744,9 +915,28 @@ class Metadetect(dict):
                 newres["mfrac"] = 0
                 newres["mfrac_noshear"] = 0
 
+            if self._tracer is not None:
+                self._tracer.mfrac(
+                    shear_type=shear_str, nobj=cat.size,
+                    duration=time.time() - t0,
+                )
+
         return newres
 
-    def _do_detect(self, mbobs, det_bands):
+    def _get_shear_pos_transform(self):
+        """
+        get the transform for unshearing positions, built once per cell
+        """
+        if not hasattr(self, '_shear_pos_transform'):
+            self._shear_pos_transform = shearpos.ShearPositionTransform.from_obs(
+                self.mbobs[0][0],  # an example for jacobian and image shape
+                # default is 0.01 but make sure to use the passed in default
+                # if needed
+                step=self['metacal'].get("step", shearpos.DEFAULT_STEP),
+            )
+        return self._shear_pos_transform
+
+    def _do_detect(self, mbobs, det_bands, shear_str=None):
         """
         use a MEDSifier to run detection
         """
@@ -760,6 +950,7 @@ class Metadetect(dict):
             sx_config=self.get('sx', None),
             meds_config=self['meds'],
             nodet_flags=self['nodet_flags'],
+            dtype=self._dtype,
         )
 
         if self._show:
@@ -780,8 +971,28 @@ class Metadetect(dict):
         )
         logger.info("detect took %s seconds", time.time() - t0)
 
+        if self._tracer is not None:
+            self._tracer.detect(
+                shear_type=shear_str, det_bands=det_bands,
+                nobj=medsifier.cat.size, duration=time.time() - t0,
+            )
+
         return medsifier.cat, mbobs_list
 
+    def _get_metacal_stream(self, mbobs):
+        """
+        get a MetacalStream to make the sheared versions of the observations
+        one shear type at a time, or None if metacal fails
+        """
+        t0 = time.time()
+        try:
+            stream = MetacalStream(mbobs, rng=self.rng, config=self['metacal'])
+        except BootPSFFailure:
+            stream = None
+        logger.info("first metacal type took %s seconds", time.time() - t0)
+
+        return stream
+
     def _get_all_metacal(self, mbobs):
         """
         get the sheared versions of the observations
@@ -825,6 +1036,88 @@ class Metadetect(dict):
         return odict
 
 
+class MetacalStream(object):
+    """
+    Make the metacal images for one shear type at a time, so that only one
+    type is held in memory.
+
+    Before making each type the rng is set to its state at creation, so the
+    images are the same as those from ngmix.metacal.get_all_metacal for all
+    types at once.  After making each type the rng is set back to where it
+    was, so later draws are also the same as after get_all_metacal.  The
+    first type is made at creation, so a BootPSFFailure is raised then.
+
+    Parameters
+    ----------
+    mbobs: ngmix.MultiBandObsList
+        The observations
+    rng: np.random.RandomState
+        Random number generator
+    config: dict
+        The metacal config, sent to ngmix.metacal.get_all_metacal
+    """
+    def __init__(self, mbobs, rng, config):
+        self.mbobs = mbobs
+        self.rng = rng
+        self.config = config
+        self.types = list(config.get(
+            "types", ngmix.metacal.METACAL_MINIMAL_TYPES
+        ))
+
+        self._start_state = rng.get_state()
+        self._first = self._make(self.types[0])
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        return iter(list(self.types))
+
+    def pop(self, shear_str):
+        """
+        make the images for a shear type and remove it from the stream
+
+        Parameters
+        ----------
+        shear_str: str
+            The shear type, e.g. '1p'
+
+        Returns
+        -------
+        mbobs: ngmix.MultiBandObsList
+        """
+        self.types.remove(shear_str)
+
+        if self._first is not None and self._first[0] == shear_str:
+            shear_mbobs = self._first[1]
+            self._first = None
+            return shear_mbobs
+
+        state = self.rng.get_state()
+        shear_mbobs = self._make(shear_str)[1]
+        self.rng.set_state(state)
+
+        return shear_mbobs
+
+    def _make(self, shear_str):
+        self.rng.set_state(self._start_state)
+
+        config = dict(self.config)
+        config['types'] = [shear_str]
+        odict = ngmix.metacal.get_all_metacal(
+            self.mbobs,
+            rng=self.rng,
+            **config
+        )
+        return shear_str, odict[shear_str]
+
+
+def _get_mcal_res_nbytes(mcal_res):
+    return sum(
+        get_mbobs_nbytes(shear_mbobs) for shear_mbobs in mcal_res.values()
+    )
+
+
 def _get_psf_stats(mbobs, global_flags):
     if global_flags != 0:
         flags = procflags.PSF_FAILURE | global_flags
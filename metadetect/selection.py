@@ -0,0 +1,262 @@
+"""
+Code to apply many named selections, or cuts, to metadetect catalogs.
+
+A cut is a string of clauses joined by &, each comparing a column, or an
+element of an array column, to a number, e.g.
+
+    'wmom_flags == 0 & wmom_s2n > 10 & wmom_T_ratio > 1.2'
+    'wmom_g[0] < 0.5'
+
+Clauses are evaluated once per catalog and kept as masks packed with
+np.packbits.  The clauses are grouped by column so each column is read once
+for all the cuts, and a cut is the bitwise and of the packed masks for its
+clauses.  Selection variants that share clauses, such as a grid of s2n
+thresholds with the same flag cut, then cost little more than one pass over
+the columns.
+"""
+import operator
+import re
+
+import numpy as np
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+_CLAUSE_RE = re.compile(
+    r'^\s*(?P<name>[A-Za-z_]\w*)\s*(\[\s*(?P<index>\d+)\s*\])?'
+    r'\s*(?P<op>==|!=|<=|>=|<|>)\s*(?P<value>\S+)\s*$'
+)
+
+# the number of bits set in each byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype='i8')
+
+
+def parse_cut(cut):
+    """
+    parse a cut expression into its clauses
+
+    Parameters
+    ----------
+    cut: str
+        The cut, clauses joined by &, e.g. 'wmom_flags == 0 & wmom_s2n > 10'
+
+    Returns
+    -------
+    clauses: tuple
+        Sorted tuple of unique clauses (name, index, op, value), where index
+        is None for scalar columns
+    """
+    clauses = set()
+    for clause_str in cut.split('&'):
+        match = _CLAUSE_RE.match(clause_str)
+        if match is None:
+            raise ValueError(
+                'could not parse clause "%s" in cut "%s"' % (
+                    clause_str.strip(), cut,
+                )
+            )
+
+        index = match.group('index')
+        if index is not None:
+            index = int(index)
+
+        value_str = match.group('value')
+        try:
+            value = int(value_str)
+        except ValueError:
+            try:
+                value = float(value_str)
+            except ValueError:
+                raise ValueError(
+                    'bad value "%s" in cut "%s"' % (value_str, cut)
+                )
+
+        clauses.add((match.group('name'), index, match.group('op'), value))
+
+    return tuple(sorted(clauses, key=repr))
+
+
+class Cut(object):
+    """
+    A single cut that can be called on a catalog to get a boolean mask
+
+    Cuts can be pickled, for example to send as the select function of a
+    calib.ResponseAccumulator.
+
+    Parameters
+    ----------
+    cut: str
+        The cut, clauses joined by &, e.g. 'wmom_flags == 0 & wmom_s2n > 10'
+    """
+    def __init__(self, cut):
+        self.cut = cut
+        self.clauses = parse_cut(cut)
+
+    def __call__(self, data):
+        return CatalogSelector(data).get_mask(self.cut)
+
+    def __repr__(self):
+        return 'Cut(%r)' % self.cut
+
+
+class CatalogSelector(object):
+    """
+    Evaluate cuts on a catalog, caching the packed masks for each clause and
+    each cut
+
+    Parameters
+    ----------
+    data: array
+        The catalog, e.g. the catalog for one shear type from metadetect
+
+    Examples
+    --------
+    selector = CatalogSelector(res['noshear'])
+    masks = selector.get_masks({
+        's2n10': 'wmom_flags == 0 & wmom_s2n > 10',
+        's2n20': 'wmom_flags == 0 & wmom_s2n > 20',
+    })
+    """
+    def __init__(self, data):
+        self.data = data
+        self.size = data.size
+        self._clause_cache = {}
+        self._cut_cache = {}
+
+    def get_masks(self, cuts):
+        """
+        get boolean masks for a set of named cuts
+
+        All clauses that are not yet cached are evaluated first, reading each
+        column once.
+
+        Parameters
+        ----------
+        cuts: dict
+            The cut expressions keyed by name
+
+        Returns
+        -------
+        masks: dict
+            Boolean masks keyed by name
+        """
+        self._eval_clauses(
+            clause
+            for cut in cuts.values()
+            for clause in parse_cut(cut)
+        )
+        return {name: self.get_mask(cut) for name, cut in cuts.items()}
+
+    def get_mask(self, cut):
+        """
+        get a boolean mask for a cut
+
+        Parameters
+        ----------
+        cut: str
+            The cut expression
+
+        Returns
+        -------
+        mask: array of bool
+        """
+        return np.unpackbits(
+            self.get_packed(cut), count=self.size,
+        ).astype(bool)
+
+    def get_count(self, cut):
+        """
+        get the number of objects passing a cut, without unpacking the mask
+
+        Parameters
+        ----------
+        cut: str
+            The cut expression
+
+        Returns
+        -------
+        count: int
+        """
+        # the padding bits are always zero
+        return int(_POPCOUNT[self.get_packed(cut)].sum())
+
+    def get_packed(self, cut):
+        """
+        get the mask for a cut packed with np.packbits
+
+        Parameters
+        ----------
+        cut: str
+            The cut expression
+
+        Returns
+        -------
+        packed: array of uint8
+        """
+        clauses = parse_cut(cut)
+
+        packed = self._cut_cache.get(clauses)
+        if packed is None:
+            self._eval_clauses(clauses)
+
+            packed = self._clause_cache[clauses[0]].copy()
+            for clause in clauses[1:]:
+                np.bitwise_and(packed, self._clause_cache[clause], out=packed)
+
+            self._cut_cache[clauses] = packed
+
+        return packed
+
+    def _eval_clauses(self, clauses):
+        bycol = {}
+        for clause in clauses:
+            if clause not in self._clause_cache:
+                name, index, op, value = clause
+                bycol.setdefault((name, index), set()).add((op, value))
+
+        for (name, index), opvals in bycol.items():
+            col = self.data[name]
+            if index is not None:
+                col = col[:, index]
+
+            # one contiguous copy of the column for all its clauses
+            col = np.ascontiguousarray(col)
+
+            for op, value in opvals:
+                self._clause_cache[(name, index, op, value)] = np.packbits(
+                    OPERATORS[op](col, value)
+                )
+
+
+def select_result(result, cuts):
+    """
+    get boolean masks for a set of named cuts for each shear type in a
+    metadetect result
+
+    Parameters
+    ----------
+    result: dict
+        The result dict from metadetect, keyed by shear type.  Shear types
+        with None values are kept as None.
+    cuts: dict
+        The cut expressions keyed by name
+
+    Returns
+    -------
+    masks: dict
+        Keyed by shear type, each a dict of boolean masks keyed by cut name
+    """
+    masks = {}
+    for shear_type, data in result.items():
+        if data is None:
+            masks[shear_type] = None
+        else:
+            masks[shear_type] = CatalogSelector(data).get_masks(cuts)
+
+    return masks
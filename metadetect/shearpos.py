@@ -4,6 +4,11 @@ import galsim
 from ngmix.metacal import DEFAULT_STEP
 
 SKIP_SHEARS = ['noshear', '1p_psf', '1m_psf', '2p_psf', '2m_psf']
+SHEAR_TYPES = ['1p', '1m', '2p', '2m']
+
+# number of distinct (jacobian, dims, step) transforms to keep around
+TRANSFORM_CACHE_SIZE = 64
+_TRANSFORM_CACHE = {}
 
 
 def shear_positions_obs(rows, cols, shear_str, obs, step=DEFAULT_STEP):
@@ -66,40 +71,8 @@ def shear_positions(rows, cols, shear_str, jac, dims, step=DEFAULT_STEP):
         rows and cols in the sheared coordinates
     """
 
-    if shear_str in SKIP_SHEARS:
-        return rows, cols
-
-    shear = get_galsim_shear(shear_str, step)
-
-    # this is the matrix that does shearing in u, v
-    a = shear.getMatrix()
-
-    # we need the canonical image center in (u, v) for undoing the
-    # shearing
-
-    row_cen = (dims[0] - 1) / 2
-    col_cen = (dims[1] - 1) / 2
-
-    v_cen, u_cen = jac.get_vu(row=row_cen, col=col_cen)
-
-    # apply WCS to get to world coords
-    v, u = jac.get_vu(row=rows, col=cols)
-
-    # unshear (subtract and then add the canonical center in u, v)
-    u = np.atleast_1d(u) - u_cen
-    v = np.atleast_1d(v) - v_cen
-
-    pos = np.vstack((u, v))
-
-    out = np.dot(a, pos)
-    assert out.shape[1] == u.shape[0]
-    u_sheared = out[0, :] + u_cen
-    v_sheared = out[1, :] + v_cen
-
-    # undo the WCS to get to image coords
-    rows_sheared, cols_sheared = jac.get_rowcol(v=v_sheared, u=u_sheared)
-
-    return rows_sheared, cols_sheared
+    tr = get_shear_position_transform(jac=jac, dims=dims, step=step)
+    return tr.shear_positions(rows, cols, shear_str)
 
 
 def unshear_positions_obs(rows, cols, shear_str, obs, step=DEFAULT_STEP):
@@ -159,41 +132,8 @@ def unshear_positions(rows, cols, shear_str, jac, dims, step=DEFAULT_STEP):
         rows and cols in the unsheared coordinates
     """
 
-    if shear_str in SKIP_SHEARS:
-        return rows, cols
-
-    shear = get_galsim_shear(shear_str, step)
-
-    # this is the matrix that undoes shearing in u, v
-    ainv = np.linalg.inv(shear.getMatrix())
-
-    # we need the canonical image center in (u, v) for undoing the
-    # shearing
-
-    row_cen = (dims[0] - 1) / 2
-    col_cen = (dims[1] - 1) / 2
-
-    v_cen, u_cen = jac.get_vu(row=row_cen, col=col_cen)
-
-    # apply WCS to get to world coords
-    v, u = jac.get_vu(row=rows, col=cols)
-
-    # unshear (subtract and then add the canonical center in u, v)
-    u = np.atleast_1d(u) - u_cen
-    v = np.atleast_1d(v) - v_cen
-
-    pos = np.vstack((u, v))
-
-    out = np.dot(ainv, pos)
-    assert out.shape[1] == u.shape[0]
-    u_unsheared = out[0] + u_cen
-    v_unsheared = out[1] + v_cen
-
-    # undo the WCS to get to image coords
-    rows_unsheared, cols_unsheared = \
-        jac.get_rowcol(v=v_unsheared, u=u_unsheared)
-
-    return rows_unsheared, cols_unsheared
+    tr = get_shear_position_transform(jac=jac, dims=dims, step=step)
+    return tr.unshear_positions(rows, cols, shear_str)
 
 
 def get_galsim_shear(shear_str, step):
@@ -213,3 +153,208 @@ def get_galsim_shear(shear_str, step):
         raise ValueError('can only convert 1p,1m,2p,2m to galsim Shear')
 
     return shear
+
+
+class ShearPositionTransform(object):
+    """
+    Precomputed transforms between sheared and unsheared pixel positions
+    for all of the metacal shear types.
+
+    Shearing about the canonical image center in (u, v) and going back to
+    pixels is an affine map in pixel space
+
+        p' = M (p - p_cen) + p_cen
+
+    with M = J^-1 A J, where J is the Jacobian matrix and A is the shear
+    matrix (or its inverse for unshearing).  The matrices are computed once
+    here so that transforming positions is a single matrix multiply.
+
+    Parameters
+    ----------
+    jac: ngmix.Jacobian
+        Describes the wcs
+    dims: (nrows, ncols)
+        The shape of the image data
+    step: float, optional
+        shear step for metacal, default 0.01
+    """
+    def __init__(self, jac, dims, step=DEFAULT_STEP):
+        self.dims = tuple(dims)
+        self.step = step
+
+        self._row_cen = (self.dims[0] - 1) / 2
+        self._col_cen = (self.dims[1] - 1) / 2
+
+        # maps (row, col) offsets to (u, v) offsets
+        jmat = np.array([
+            [jac.dudrow, jac.dudcol],
+            [jac.dvdrow, jac.dvdcol],
+        ])
+        jinv = np.linalg.inv(jmat)
+
+        self._shear_mats = {}
+        self._unshear_mats = {}
+        for shear_str in SHEAR_TYPES:
+            a = get_galsim_shear(shear_str, step).getMatrix()
+            self._shear_mats[shear_str] = jinv @ a @ jmat
+            self._unshear_mats[shear_str] = jinv @ np.linalg.inv(a) @ jmat
+
+    @classmethod
+    def from_obs(cls, obs, step=DEFAULT_STEP):
+        """
+        make the transform from an example observation
+
+        Parameters
+        ----------
+        obs: ngmix.Observation
+            The observation data, used for the jacobian and image shape
+        step: float, optional
+            shear step for metacal, default 0.01
+        """
+        return cls(jac=obs.jacobian, dims=obs.image.shape, step=step)
+
+    def get_matrix(self, shear_str, unshear=False):
+        """
+        get the 2x2 pixel to pixel matrix for the input shear type
+
+        Parameters
+        ----------
+        shear_str: string
+            '1p', '1m', '2p', '2m'
+        unshear: bool, optional
+            If True, get the matrix that undoes the shear.  Default False.
+
+        Returns
+        -------
+        mat: array
+            The matrix acting on (row, col) offsets from the image center.
+        """
+        mats = self._unshear_mats if unshear else self._shear_mats
+        if shear_str not in mats:
+            raise ValueError('can only convert 1p,1m,2p,2m to galsim Shear')
+        return mats[shear_str]
+
+    def shear_positions(self, rows, cols, shear_str):
+        """
+        shear the input row and column positions
+
+        Parameters
+        ----------
+        rows: array
+            array of row values in unsheared coordinates
+        cols: array
+            array of col values in unsheared coordinates
+        shear_str: string
+            'noshear', '1p', '1m', '2p', '2m'
+
+        Returns
+        -------
+        rows_sheared, cols_sheared:
+            rows and cols in the sheared coordinates
+        """
+        return self._apply(rows, cols, shear_str, unshear=False)
+
+    def unshear_positions(self, rows, cols, shear_str):
+        """
+        unshear the input row and column positions
+
+        Parameters
+        ----------
+        rows: array
+            array of row values in sheared coordinates
+        cols: array
+            array of col values in sheared coordinates
+        shear_str: string
+            'noshear', '1p', '1m', '2p', '2m'
+
+        Returns
+        -------
+        rows_unsheared, cols_unsheared:
+            rows and cols in the unsheared coordinates
+        """
+        return self._apply(rows, cols, shear_str, unshear=True)
+
+    def unshear_positions_all(self, rows, cols, shear_strs=None):
+        """
+        unshear positions for a set of shear types at once
+
+        Parameters
+        ----------
+        rows: dict or array
+            Row values in sheared coordinates.  If a dict, it should be keyed
+            by shear type, otherwise the same positions are used for all
+            types.
+        cols: dict or array
+            Col values in sheared coordinates, same convention as rows.
+        shear_strs: list of str, optional
+            The shear types to use.  Default is the keys of rows if it is a
+            dict, otherwise noshear plus the four sheared types.
+
+        Returns
+        -------
+        res: dict
+            keyed by shear type, holding (rows_unsheared, cols_unsheared)
+        """
+        if shear_strs is None:
+            if isinstance(rows, dict):
+                shear_strs = list(rows.keys())
+            else:
+                shear_strs = ['noshear'] + SHEAR_TYPES
+
+        res = {}
+        for shear_str in shear_strs:
+            _rows = rows[shear_str] if isinstance(rows, dict) else rows
+            _cols = cols[shear_str] if isinstance(cols, dict) else cols
+            res[shear_str] = self.unshear_positions(_rows, _cols, shear_str)
+
+        return res
+
+    def _apply(self, rows, cols, shear_str, unshear):
+        if shear_str in SKIP_SHEARS:
+            return rows, cols
+
+        mat = self.get_matrix(shear_str, unshear=unshear)
+
+        drows = np.atleast_1d(rows) - self._row_cen
+        dcols = np.atleast_1d(cols) - self._col_cen
+
+        new_rows = mat[0, 0] * drows + mat[0, 1] * dcols + self._row_cen
+        new_cols = mat[1, 0] * drows + mat[1, 1] * dcols + self._col_cen
+
+        return new_rows, new_cols
+
+
+def get_shear_position_transform(jac, dims, step=DEFAULT_STEP):
+    """
+    get a ShearPositionTransform, reusing a cached one for the same
+    jacobian, image shape and step
+
+    Parameters
+    ----------
+    jac: ngmix.Jacobian
+        Describes the wcs
+    dims: (nrows, ncols)
+        The shape of the image data
+    step: float, optional
+        shear step for metacal, default 0.01
+
+    Returns
+    -------
+    ShearPositionTransform
+    """
+    key = (
+        float(jac.dudrow), float(jac.dudcol),
+        float(jac.dvdrow), float(jac.dvdcol),
+        int(dims[0]), int(dims[1]),
+        float(step),
+    )
+
+    tr = _TRANSFORM_CACHE.get(key)
+    if tr is None:
+        if len(_TRANSFORM_CACHE) >= TRANSFORM_CACHE_SIZE:
+            _TRANSFORM_CACHE.clear()
+
+        tr = ShearPositionTransform(jac=jac, dims=dims, step=step)
+        _TRANSFORM_CACHE[key] = tr
+
+    return tr
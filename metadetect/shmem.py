@@ -0,0 +1,266 @@
+"""
+Code to pass observations and results between processes in shared memory
+rather than by pickling the pixel data.
+
+The pixel arrays of a MultiBandObsList are copied once into a single shared
+memory block.  The handle that is sent to a worker holds only the name of the
+block and a small description of the observations, and the worker builds
+observations whose arrays are views into the block.  Results are returned the
+same way.
+
+The process that creates a block for observations owns it and must unlink it
+when the workers are done.  Result blocks are created by the worker and
+ownership passes to the process that reads them, which must unlink them.
+Blocks are registered with the multiprocessing resource tracker, which is
+shared by the workers of a pool, so blocks leaked after a crash are freed when
+the pool shuts down.
+
+Examples
+--------
+# in the parent
+with SharedMBObs(mbobs) as shared:
+    # the handle is small to pickle
+    shared_res = pool.submit(process, shared).result()
+
+res = shared_res.get_result()
+shared_res.unlink()
+
+# in the worker, the observations must be deleted before the block is closed
+def process(shared):
+    with shared:
+        res = do_metadetect(config, shared.get_mbobs(), rng)
+    return SharedResult(res)
+"""
+import gc
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .cellbundle import get_mbobs_layout, make_mbobs, _align
+
+
+class SharedMBObs(object):
+    """
+    A MultiBandObsList held in shared memory
+
+    Create in the process that owns the data, pass to workers and call
+    get_mbobs in the worker.  Only the name of the block and the description
+    of the observations are pickled.
+
+    Used as a context manager, the block is closed on exit and, in the
+    owning process, unlinked.
+
+    Parameters
+    ----------
+    mbobs: ngmix.MultiBandObsList
+        The observations.  All meta data must be JSON serializable.
+    """
+    def __init__(self, mbobs):
+        header, arrays, nbytes = get_mbobs_layout(mbobs)
+
+        self.header = header
+        self._shm = _create(nbytes)
+        self.name = self._shm.name
+        self.owner = True
+
+        for arrdesc, arr in arrays:
+            _get_view(self._shm, arrdesc)[...] = arr
+
+    def get_mbobs(self):
+        """
+        get the MultiBandObsList, with arrays that are views into the shared
+        memory
+
+        Modifications to the arrays, e.g. masking, are visible to all
+        processes sharing the block.  Keep this object open while the
+        observations are in use.
+        """
+        shm = self._get_shm()
+        return make_mbobs(self.header, lambda arrdesc: _get_view(shm, arrdesc))
+
+    def close(self):
+        """
+        detach from the shared memory in this process
+        """
+        _close(self)
+
+    def unlink(self):
+        """
+        free the shared memory, call once when all processes are done
+        """
+        _unlink(self)
+
+    def _get_shm(self):
+        if self._shm is None:
+            self._shm = _attach(self.name)
+        return self._shm
+
+    def __getstate__(self):
+        return {'header': self.header, 'name': self.name}
+
+    def __setstate__(self, state):
+        self.header = state['header']
+        self.name = state['name']
+        self.owner = False
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+
+class SharedResult(object):
+    """
+    A metadetect result, a dict of structured arrays, held in shared memory
+
+    Create in the worker and return it to the parent, which calls get_result
+    and then unlink.  Ownership of the block passes to the process that
+    unpickles this object.
+
+    Parameters
+    ----------
+    result: dict or None
+        The result from metadetect, keyed by shear type.  None values are
+        kept.
+    """
+    def __init__(self, result):
+        self.is_none = result is None
+        if self.is_none:
+            result = {}
+
+        self.layout = {}
+        nbytes = 0
+        for key, data in result.items():
+            if data is None:
+                self.layout[key] = None
+            else:
+                self.layout[key] = {
+                    'dtype': data.dtype,
+                    'shape': list(data.shape),
+                    'offset': nbytes,
+                }
+                nbytes = _align(nbytes + data.nbytes)
+
+        self._shm = _create(nbytes)
+        self.name = self._shm.name
+
+        for key, data in result.items():
+            if data is not None:
+                _get_view(self._shm, self.layout[key])[...] = data
+
+        # the process that unpickles this object owns the block
+        self.owner = False
+
+    def get_result(self, copy=True):
+        """
+        get the result
+
+        Parameters
+        ----------
+        copy: bool, optional
+            If True, the default, return copies of the arrays so the block
+            can be unlinked immediately.  Otherwise the arrays are views into
+            the shared memory and this object must be kept open while they
+            are in use.
+
+        Returns
+        -------
+        result: dict or None
+        """
+        if self.is_none:
+            return None
+
+        shm = self._get_shm()
+
+        result = {}
+        for key, arrdesc in self.layout.items():
+            if arrdesc is None:
+                result[key] = None
+            else:
+                data = _get_view(shm, arrdesc)
+                result[key] = data.copy() if copy else data
+
+        return result
+
+    def close(self):
+        """
+        detach from the shared memory in this process
+        """
+        _close(self)
+
+    def unlink(self):
+        """
+        free the shared memory
+        """
+        _unlink(self)
+
+    def _get_shm(self):
+        if self._shm is None:
+            self._shm = _attach(self.name)
+        return self._shm
+
+    def __getstate__(self):
+        return {'is_none': self.is_none, 'layout': self.layout, 'name': self.name}
+
+    def __setstate__(self, state):
+        self.is_none = state['is_none']
+        self.layout = state['layout']
+        self.name = state['name']
+        self.owner = True
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+
+def _get_view(shm, arrdesc):
+    return np.ndarray(
+        tuple(arrdesc['shape']),
+        dtype=np.dtype(arrdesc['dtype']),
+        buffer=shm.buf,
+        offset=arrdesc['offset'],
+    )
+
+
+def _create(nbytes):
+    # blocks of size zero are not allowed
+    return shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+
+def _attach(name):
+    return shared_memory.SharedMemory(name=name)
+
+
+def _close(shared):
+    if shared._shm is None:
+        return
+
+    try:
+        shared._shm.close()
+    except BufferError:
+        # arrays that view the block may only be held in reference cycles
+        gc.collect()
+        try:
+            shared._shm.close()
+        except BufferError:
+            raise BufferError(
+                'arrays viewing shared memory %s are still in use; delete '
+                'them before closing' % shared.name
+            )
+
+    shared._shm = None
+
+
+def _unlink(shared):
+    shm = shared._get_shm()
+    shm.unlink()
+    _close(shared)
@@ -19,6 +19,9 @@ DEFAULT_SIM_CONFIG = {
     'fracdev_high': 0.99,
     'bulge_colors': np.array([0.5, 1.0, 1.5, 2.5]),
     'disk_colors': np.array([1.25, 1.0, 0.75, 0.5]),
+    # draw each object into a postage stamp and add it to the image, rather
+    # than drawing the sum of all objects over the full image
+    'fast': False,
 }
 
 
@@ -39,10 +42,26 @@ class Sim(dict):
             rng=self.rng,
         )
 
+        if self['fast']:
+            # the noise for all bands is drawn in one call
+            self._noise_rng = np.random.default_rng(
+                self.rng.randint(0, 2**31)
+            )
+
+    def get_mbobs_list(self, ncell):
+        """
+        get a list of simulated MultiBandObsList, one for each cell, e.g.
+        for benchmarking
+        """
+        return [self.get_mbobs() for _ in range(ncell)]
+
     def get_mbobs(self):
         """
         get a simulated MultiBandObsList
         """
+        if self['fast']:
+            return self._get_mbobs_fast()
+
         all_band_obj = self._get_band_objects()
 
         mbobs = ngmix.MultiBandObsList()
@@ -80,6 +99,120 @@ class Sim(dict):
 
         return mbobs
 
+    def _get_mbobs_fast(self):
+        """
+        get a simulated MultiBandObsList, drawing the bulge and disk of each
+        object once into postage stamps that are scaled by the colors and
+        added into the images for all bands
+        """
+        nband = self['nband']
+        bands = [_band % MAX_NBAND for _band in range(nband)]
+        dims = self['dims']
+
+        images = np.zeros((nband,) + tuple(dims))
+
+        for i in range(self['nobj']):
+            r50 = self._get_r50()
+            flux = self._get_flux()
+            fracdev = self._get_fracdev()
+            dx, dy = self._get_dxdy()
+
+            g1d, g2d = self._get_g()
+
+            bulge_stamp, disk_stamp, rows, cols = self._draw_stamps(
+                r50=r50, g1d=g1d, g2d=g2d, dx=dx, dy=dy,
+            )
+
+            for iband, band in enumerate(bands):
+                images[iband, rows, cols] += (
+                    fracdev*flux*self['bulge_colors'][band] * bulge_stamp
+                    + (1-fracdev)*flux*self['disk_colors'][band] * disk_stamp
+                )
+
+        noises = np.array([self['noises'][band] for band in bands])
+        noises = noises[:, np.newaxis, np.newaxis]
+
+        # image noise and the noise images, for all bands
+        nse = self._noise_rng.standard_normal((2,) + images.shape)
+        nse *= noises
+        images += nse[0]
+
+        mbobs = ngmix.MultiBandObsList()
+        for iband, band in enumerate(bands):
+            im = images[iband]
+            wt = np.zeros(im.shape) + 1.0/self['noises'][band]**2
+
+            obs = ngmix.Observation(
+                im,
+                weight=wt,
+                bmask=np.zeros(im.shape, dtype='i4'),
+                ormask=np.zeros(im.shape, dtype='i4'),
+                jacobian=self._jacobian,
+                psf=self._psf_obs.copy(),
+                noise=nse[1, iband],
+                ignore_zero_weight=False,
+            )
+
+            obslist = ngmix.ObsList()
+            obslist.append(obs)
+            mbobs.append(obslist)
+
+        return mbobs
+
+    def _draw_stamps(self, r50, g1d, g2d, dx, dy):
+        """
+        draw the psf convolved bulge and disk with unit flux into stamps
+        centered at the object position, returning the stamps and the slices
+        of the image they cover
+        """
+        scale = self['scale']
+        dims = self['dims']
+
+        bulge_obj = galsim.Convolve(
+            galsim.DeVaucouleurs(
+                half_light_radius=r50
+            ).shear(g1=0.5*g1d, g2=0.5*g2d),
+            self._psf,
+        )
+        disk_obj = galsim.Convolve(
+            galsim.Exponential(
+                half_light_radius=r50
+            ).shear(g1=g1d, g2=g2d),
+            self._psf,
+        )
+
+        # odd sized stamp centered on the pixel nearest the object
+        size = max(
+            bulge_obj.getGoodImageSize(scale), disk_obj.getGoodImageSize(scale),
+        )
+        size = min(size, max(dims))
+        half = size // 2
+        size = 2*half + 1
+
+        row = (dims[0] - 1)/2 + dy/scale
+        col = (dims[1] - 1)/2 + dx/scale
+        irow = int(np.floor(row + 0.5))
+        icol = int(np.floor(col + 0.5))
+        offset = (col - icol, row - irow)
+
+        stamps = [
+            obj.drawImage(nx=size, ny=size, scale=scale, offset=offset).array
+            for obj in (bulge_obj, disk_obj)
+        ]
+
+        # clip to the image
+        row_start, col_start = irow - half, icol - half
+        srow = max(0, -row_start)
+        scol = max(0, -col_start)
+        erow = min(size, dims[0] - row_start)
+        ecol = min(size, dims[1] - col_start)
+
+        stamps = [stamp[srow:erow, scol:ecol] for stamp in stamps]
+        rows = slice(row_start + srow, row_start + erow)
+        cols = slice(col_start + scol, col_start + ecol)
+
+        return stamps[0], stamps[1], rows, cols
+
     def _get_r50(self):
         return self.rng.uniform(
             low=self['r50_low'],
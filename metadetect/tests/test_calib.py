@@ -0,0 +1,256 @@
+import numpy as np
+import pytest
+
+from ..calib import (
+    meas_m_c,
+    bootstrap_m_c,
+    jackknife_m_c,
+    MCAccumulator,
+    ResponseAccumulator,
+)
+
+
+def _make_data(rng, n, m=0.01, c=2.0e-4, gtrue=0.02):
+    dt = [('g1', 'f8'), ('g2', 'f8'), ('R11', 'f8'), ('R22', 'f8')]
+
+    pres = np.zeros(n, dtype=dt)
+    mres = np.zeros(n, dtype=dt)
+
+    R = rng.normal(loc=0.4, scale=0.02, size=(n, 2))
+    pres['R11'] = R[:, 0] + rng.normal(scale=0.001, size=n)
+    mres['R11'] = R[:, 0] + rng.normal(scale=0.001, size=n)
+    pres['R22'] = R[:, 1] + rng.normal(scale=0.001, size=n)
+    mres['R22'] = R[:, 1] + rng.normal(scale=0.001, size=n)
+
+    # the shape noise is the same for the pairs, plus some measurement noise
+    noise = rng.normal(scale=0.1, size=(n, 2))
+    mnoise = rng.normal(scale=0.0001, size=(n, 4))
+    pres['g1'] = (1 + m) * gtrue * pres['R11'] + noise[:, 0] + mnoise[:, 0]
+    mres['g1'] = -(1 + m) * gtrue * mres['R11'] + noise[:, 0] + mnoise[:, 1]
+    pres['g2'] = c * pres['R22'] + noise[:, 1] + mnoise[:, 2]
+    mres['g2'] = c * mres['R22'] - noise[:, 1] + mnoise[:, 3]
+
+    return pres, mres
+
+
+def _meas_m_c_loop(pres, mres):
+    x = np.mean(pres['g1'] - mres['g1'])/2
+    y = np.mean(pres['R11'] + mres['R11'])/2
+    m = x/y/0.02 - 1
+
+    x = np.mean(pres['g2'] + mres['g2'])/2
+    y = np.mean(pres['R22'] + mres['R22'])/2
+    c = x/y
+
+    return m, c
+
+
+def test_calib_meas_m_c():
+    rng = np.random.RandomState(8)
+    pres, mres = _make_data(rng, 1000)
+
+    m, c = meas_m_c(pres, mres)
+    em, ec = _meas_m_c_loop(pres, mres)
+    assert np.allclose(m, em)
+    assert np.allclose(c, ec)
+
+    assert np.abs(m - 0.01) < 2.0e-3
+    assert np.abs(c - 2.0e-4) < 2.0e-5
+
+
+def test_calib_bootstrap():
+    rng = np.random.RandomState(31415)
+    pres, mres = _make_data(rng, 2000)
+
+    m, merr, c, cerr = bootstrap_m_c(
+        pres, mres, rng=np.random.RandomState(5), chunksize=300,
+    )
+    em, ec = _meas_m_c_loop(pres, mres)
+    assert m == pytest.approx(em)
+    assert c == pytest.approx(ec)
+
+    # compare to resampling with copies
+    brng = np.random.RandomState(7)
+    stats = []
+    for _ in range(500):
+        ind = brng.choice(pres.size, size=pres.size, replace=True)
+        stats.append(_meas_m_c_loop(pres[ind], mres[ind]))
+    emerr, ecerr = np.std(stats, axis=0)
+
+    assert np.abs(merr / emerr - 1) < 0.15
+    assert np.abs(cerr / ecerr - 1) < 0.15
+
+    # each resample has n draws
+    acc = MCAccumulator(n=pres.size, rng=np.random.RandomState(9), nresample=20)
+    ntot = np.zeros(20, dtype='i8')
+    for start in range(0, pres.size, 700):
+        nchunk = pres[start:start + 700].size
+        ntot += acc._get_bootstrap_counts(nchunk).sum(axis=1)
+        acc.nadded += nchunk
+    assert np.all(ntot == pres.size)
+
+
+def test_calib_jackknife():
+    rng = np.random.RandomState(2718)
+    pres, mres = _make_data(rng, 1000)
+
+    njack = 50
+    m, merr, c, cerr = jackknife_m_c(pres, mres, njack=njack, chunksize=77)
+    em, ec = _meas_m_c_loop(pres, mres)
+    assert m == pytest.approx(em)
+    assert c == pytest.approx(ec)
+
+    blocks = np.arange(pres.size) * njack // pres.size
+    stats = np.array([
+        _meas_m_c_loop(pres[blocks != i], mres[blocks != i])
+        for i in range(njack)
+    ])
+    errs = np.sqrt(
+        (njack - 1) / njack * ((stats - stats.mean(axis=0))**2).sum(axis=0)
+    )
+    assert merr == pytest.approx(errs[0])
+    assert cerr == pytest.approx(errs[1])
+
+    # the result does not depend on the chunking
+    assert jackknife_m_c(pres, mres, njack=njack, chunksize=1000) == (
+        pytest.approx((m, merr, c, cerr))
+    )
+
+
+def test_calib_errors():
+    rng = np.random.RandomState(11)
+    pres, mres = _make_data(rng, 100)
+
+    with pytest.raises(ValueError):
+        MCAccumulator(n=100, method='blah')
+
+    with pytest.raises(ValueError):
+        MCAccumulator(n=100)
+
+    with pytest.raises(ValueError):
+        MCAccumulator(n=10, method='jackknife', nresample=20)
+
+    acc = MCAccumulator(n=150, method='jackknife')
+    acc.add(pres, mres)
+    with pytest.raises(ValueError):
+        acc.get_m_c()
+
+    with pytest.raises(ValueError):
+        acc.add(pres, mres)
+
+    with pytest.raises(ValueError):
+        meas_m_c(pres, mres[:10])
+
+
+def _make_result(rng, n):
+    dt = [('wmom_g', 'f8', 2), ('wmom_s2n', 'f8'), ('wmom_flags', 'i4')]
+
+    result = {}
+    for shear_type, shift in [
+        ('noshear', (0, 0)),
+        ('1p', (0.004, 0)),
+        ('1m', (-0.004, 0)),
+        ('2p', (0, 0.004)),
+        ('2m', (0, -0.004)),
+    ]:
+        data = np.zeros(n, dtype=dt)
+        data['wmom_g'] = rng.normal(scale=0.2, size=(n, 2)) + shift
+        data['wmom_s2n'] = rng.uniform(low=5, high=50, size=n)
+        data['wmom_flags'] = rng.uniform(size=n) < 0.1
+        result[shear_type] = data
+
+    return result
+
+
+def _select_unflagged(data):
+    return data['wmom_flags'] == 0
+
+
+def test_calib_response_accumulator():
+    import pickle
+
+    rng = np.random.RandomState(99)
+    results = [_make_result(rng, n) for n in [100, 0, 250, 75]]
+
+    bin_edges = [10, 20, 60]
+    kw = dict(
+        model='wmom', select=_select_unflagged,
+        bin_field='wmom_s2n', bin_edges=bin_edges,
+    )
+
+    acc = ResponseAccumulator(**kw)
+    for result in results:
+        acc.add(result)
+
+    def _get_expected(ibin):
+        means = {}
+        for shear_type in results[0]:
+            data = np.concatenate([res[shear_type] for res in results])
+            w, = np.where(
+                (data['wmom_flags'] == 0)
+                & (data['wmom_s2n'] >= bin_edges[ibin])
+                & (data['wmom_s2n'] < bin_edges[ibin + 1])
+            )
+            means[shear_type] = data['wmom_g'][w].mean(axis=0)
+            if shear_type == 'noshear':
+                n = w.size
+                errs = data['wmom_g'][w].std(axis=0, ddof=1) / np.sqrt(n)
+
+        return {
+            'n': n,
+            'g1': means['noshear'][0],
+            'g2': means['noshear'][1],
+            'g1_err': errs[0],
+            'g2_err': errs[1],
+            'R11': (means['1p'][0] - means['1m'][0]) / 0.02,
+            'R22': (means['2p'][1] - means['2m'][1]) / 0.02,
+        }
+
+    stats = acc.get_stats()
+    assert stats.size == 2
+    for ibin in range(2):
+        expected = _get_expected(ibin)
+        for name, val in expected.items():
+            assert stats[name][ibin] == pytest.approx(val), name
+
+    # merging accumulators from separate workers gives the same result, and
+    # the accumulators can be pickled
+    acc1 = ResponseAccumulator(**kw)
+    acc2 = ResponseAccumulator(**kw)
+    acc1.add(results[0])
+    acc2.add(results[2])
+    acc2.add(results[3])
+
+    acc1 = pickle.loads(pickle.dumps(acc1))
+    acc1.merge(pickle.loads(pickle.dumps(acc2)))
+
+    mstats = acc1.get_stats()
+    for name in stats.dtype.names:
+        assert np.allclose(mstats[name], stats[name]), name
+
+    # combining the bins
+    cstats = acc.get_stats(combine_bins=True)
+    assert cstats['n'][0] == stats['n'].sum()
+    g1 = (stats['g1'] * stats['n']).sum() / stats['n'].sum()
+    assert cstats['g1'][0] == pytest.approx(g1)
+
+    with pytest.raises(ValueError):
+        acc.merge(ResponseAccumulator(model='wmom'))
+
+    with pytest.raises(ValueError):
+        ResponseAccumulator(model='wmom', bin_field='wmom_s2n')
+
+
+def test_calib_response_accumulator_missing_types():
+    rng = np.random.RandomState(17)
+    result = _make_result(rng, 50)
+    del result['2p']
+    result['2m'] = None
+
+    acc = ResponseAccumulator(model='wmom')
+    acc.add(result)
+
+    stats = acc.get_stats()
+    assert stats['n'][0] == 50
+    assert np.isfinite(stats['R11'][0])
+    assert np.isnan(stats['R22'][0])
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+from ..cellbundle import (
+    write_cell_bundle, read_cell_bundle, read_cell_bundle_header,
+    OBS_ARRAY_NAMES,
+)
+from .sim import make_mbobs_sim
+
+
+def _check_obs(obs, robs):
+    jac, rjac = obs.jacobian, robs.jacobian
+    assert jac.get_cen() == rjac.get_cen()
+    for name in ['dudrow', 'dudcol', 'dvdrow', 'dvdcol']:
+        assert getattr(jac, name) == getattr(rjac, name)
+    assert obs.meta == robs.meta
+
+    for name in OBS_ARRAY_NAMES:
+        if name in ('image', 'weight') or getattr(obs, 'has_' + name)():
+            assert np.array_equal(getattr(obs, name), getattr(robs, name))
+        else:
+            assert not getattr(robs, 'has_' + name)()
+
+
+def _get_memmap(arr):
+    # follow the views back to the np.memmap of the file
+    while arr is not None and not isinstance(arr, np.memmap):
+        arr = arr.base
+    return arr
+
+
+def _check_memmap(robs, fname):
+    arrays = [
+        getattr(robs, name) for name in ['image', 'weight', 'noise', 'mfrac']
+    ]
+    arrays.append(robs.psf.image)
+    for arr in arrays:
+        mm = _get_memmap(arr)
+        assert mm is not None
+        assert os.path.samefile(mm.filename, fname)
+        assert np.shares_memory(arr, mm)
+
+
+@pytest.mark.parametrize('mode', ['r', 'c'])
+def test_cell_bundle_roundtrip(tmp_path, mode):
+    mbobs = make_mbobs_sim(45, 3, band_image_sizes=[35, 37, 41])
+    mbobs.meta['cell_id'] = 10
+    mbobs[1].meta['band'] = 'r'
+
+    fname = os.path.join(tmp_path, 'cell.bin')
+    write_cell_bundle(fname, mbobs)
+
+    hdr = read_cell_bundle_header(fname)
+    assert len(hdr['bands']) == 3
+    assert hdr['meta'] == {'cell_id': 10}
+
+    rmbobs = read_cell_bundle(fname, mode=mode)
+    assert rmbobs.meta == mbobs.meta
+    assert len(rmbobs) == len(mbobs)
+    for obslist, robslist in zip(mbobs, rmbobs):
+        assert obslist.meta == robslist.meta
+        assert len(obslist) == len(robslist)
+        for obs, robs in zip(obslist, robslist):
+            _check_obs(obs, robs)
+            _check_obs(obs.psf, robs.psf)
+            assert not robs.psf.has_psf()
+            _check_memmap(robs, fname)
+
+
+def test_cell_bundle_copy_on_write(tmp_path):
+    mbobs = make_mbobs_sim(46, 2)
+
+    fname = os.path.join(tmp_path, 'cell.bin')
+    write_cell_bundle(fname, mbobs)
+    with open(fname, 'rb') as fobj:
+        data = fobj.read()
+
+    rmbobs = read_cell_bundle(fname)
+    robs = rmbobs[0][0]
+    _check_memmap(robs, fname)
+    with robs.writeable():
+        robs.image[:, :] = -1
+        robs.weight[:, :] = 0
+    assert np.all(robs.image == -1)
+
+    # the changes are only in memory
+    del rmbobs, robs
+    with open(fname, 'rb') as fobj:
+        assert fobj.read() == data
+
+    robs = read_cell_bundle(fname)[0][0]
+    assert np.array_equal(robs.image, mbobs[0][0].image)
+    assert np.array_equal(robs.weight, mbobs[0][0].weight)
+
+
+def test_cell_bundle_errors(tmp_path):
+    fname = os.path.join(tmp_path, 'notcell.bin')
+    with open(fname, 'wb') as fobj:
+        fobj.write(b'x' * 100)
+
+    with pytest.raises(ValueError):
+        read_cell_bundle(fname)
+
+    mbobs = make_mbobs_sim(45, 1)
+    mbobs.meta['blah'] = object()
+    with pytest.raises(TypeError):
+        write_cell_bundle(os.path.join(tmp_path, 'cell.bin'), mbobs)
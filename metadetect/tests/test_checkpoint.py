@@ -0,0 +1,107 @@
+import os
+import copy
+
+import numpy as np
+import pytest
+
+from .. import checkpoint
+from ..io import CELL_ID_COLUMN
+from .sim import Sim
+from .test_metadetect import TEST_METADETECT_CONFIG
+
+
+def _get_cells(ncell):
+    def _make_getter(cell_id):
+        def _get():
+            return Sim(np.random.RandomState(seed=cell_id + 10)).get_mbobs()
+        return _get
+
+    return [(cell_id, _make_getter(cell_id)) for cell_id in range(ncell)]
+
+
+def _interrupt(cells, nstop):
+    for i, cell in enumerate(cells):
+        if i == nstop:
+            raise KeyboardInterrupt('preempted')
+        yield cell
+
+
+def test_get_cell_seed():
+    assert checkpoint.get_cell_seed(10, 5) == checkpoint.get_cell_seed(10, 5)
+    assert checkpoint.get_cell_seed(10, 5) != checkpoint.get_cell_seed(10, 6)
+    assert checkpoint.get_cell_seed(10, 5) != checkpoint.get_cell_seed(11, 5)
+
+    # must be usable as a numpy seed
+    np.random.RandomState(seed=checkpoint.get_cell_seed(10, 'cell-5'))
+
+
+def test_run_cells_resume(tmp_path):
+    import fitsio
+
+    config = copy.deepcopy(TEST_METADETECT_CONFIG)
+    cells = _get_cells(5)
+
+    full = os.path.join(tmp_path, 'full.fits')
+    nproc, nskip = checkpoint.run_cells(
+        cells=cells, config=config, seed=31415, output=full,
+        manifest=os.path.join(tmp_path, 'full.db'),
+    )
+    assert (nproc, nskip) == (5, 0)
+
+    # stop part way through, with output written since the last checkpoint
+    part = os.path.join(tmp_path, 'part.fits')
+    manifest = os.path.join(tmp_path, 'part.db')
+    with pytest.raises(KeyboardInterrupt):
+        checkpoint.run_cells(
+            cells=_interrupt(cells, 3), config=config, seed=31415,
+            output=part, manifest=manifest, checkpoint_every=2,
+        )
+
+    nproc, nskip = checkpoint.run_cells(
+        cells=cells, config=config, seed=31415, output=part,
+        manifest=manifest, checkpoint_every=2,
+    )
+    assert (nproc, nskip) == (3, 2)
+
+    for shear_type in ['noshear', '1p', '1m', '2p', '2m']:
+        fdata = fitsio.read(full, ext=shear_type)
+        pdata = fitsio.read(part, ext=shear_type)
+        assert np.array_equal(
+            np.unique(pdata[CELL_ID_COLUMN]), np.arange(5),
+        )
+        for name in fdata.dtype.names:
+            assert np.array_equal(fdata[name], pdata[name], equal_nan=True)
+
+    # nothing left to do
+    nproc, nskip = checkpoint.run_cells(
+        cells=cells, config=config, seed=31415, output=part,
+        manifest=manifest,
+    )
+    assert (nproc, nskip) == (0, 5)
+
+    # a resumed run must use the same seed and config
+    with pytest.raises(ValueError):
+        checkpoint.run_cells(
+            cells=cells, config=config, seed=1, output=part,
+            manifest=manifest,
+        )
+
+
+def test_run_cells_missing_output(tmp_path):
+    config = copy.deepcopy(TEST_METADETECT_CONFIG)
+    cells = _get_cells(3)
+
+    output = os.path.join(tmp_path, 'cat.fits')
+    manifest = os.path.join(tmp_path, 'cat.db')
+    checkpoint.run_cells(
+        cells=cells[:2], config=config, seed=31415, output=output,
+        manifest=manifest,
+    )
+
+    # the manifest records rows that are no longer on disk
+    os.remove(output)
+    with pytest.raises(ValueError):
+        checkpoint.run_cells(
+            cells=cells, config=config, seed=31415, output=output,
+            manifest=manifest,
+        )
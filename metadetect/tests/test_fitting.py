@@ -1232,6 +1232,35 @@ def test_fitting_symmetrize_obs_weights():
     assert np.array_equal(sym_obs.weight, sym_wgt)
 
 
+def test_fitting_symmetrize_obs_weights_reference():
+    # the previous implementation symmetrized a copy of the weight map
+    def _symmetrize_weight(weight):
+        new_wgt = weight.copy()
+        for k in [1, 2, 3]:
+            msk = np.rot90(weight, k=k) <= 0
+            new_wgt[msk] = 0
+        return new_wgt
+
+    rng = np.random.RandomState(seed=31)
+    for _ in range(10):
+        wgt = rng.uniform(low=0.5, high=2, size=(15, 15))
+        wgt[rng.uniform(size=wgt.shape) < 0.1] = 0
+        wgt[rng.uniform(size=wgt.shape) < 0.02] = -1
+        obs = ngmix.Observation(
+            image=np.zeros((15, 15)),
+            weight=wgt,
+        )
+        sym_obs = symmetrize_obs_weights(obs)
+        expected = _symmetrize_weight(wgt)
+        assert np.array_equal(sym_obs.weight, expected)
+        assert sym_obs.ignore_zero_weight is True
+
+        # the remaining nonzero weights are unchanged
+        msk = expected > 0
+        assert np.array_equal(sym_obs.weight[msk], wgt[msk])
+        assert np.array_equal(obs.weight, wgt)
+
+
 def test_fitting_fit_mbobs_wavg_wmom_tratio():
     fitter = GaussMom(1.2)
     seed = 10
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+
+def test_imports_lazy():
+    # importing the package does not import the heavy dependencies
+    code = (
+        'import sys, metadetect; '
+        'heavy = ["ngmix", "galsim", "scipy", "numba", "esutil", "meds"]; '
+        'print(",".join(m for m in heavy if m in sys.modules))'
+    )
+    out = subprocess.run(
+        [sys.executable, '-c', code],
+        check=True, capture_output=True, text=True,
+    )
+    assert out.stdout.strip() == ''
+
+    code = (
+        'import metadetect; '
+        'assert "procflags" not in vars(metadetect); '
+        'assert "defaults" in dir(metadetect); '
+        'assert metadetect.defaults.BMASK_EDGE > 0; '
+        'assert "defaults" in vars(metadetect)'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
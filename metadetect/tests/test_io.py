@@ -0,0 +1,230 @@
+import os
+
+import numpy as np
+import pytest
+
+from ..io import CatalogWriter, get_config_hash, CELL_ID_COLUMN
+
+
+def _make_result(rng, nobj):
+    dt = [
+        ('wmom_flags', 'i4'),
+        ('wmom_g', 'f8', 2),
+        ('wmom_s2n', 'f8'),
+        ('shear_bands', 'U6'),
+    ]
+    res = {}
+    for shear_type in ['noshear', '1p', '1m', '2p', '2m']:
+        data = np.zeros(nobj, dtype=dt)
+        data['wmom_g'] = rng.normal(size=(nobj, 2))
+        data['wmom_s2n'] = rng.uniform(size=nobj)
+        data['shear_bands'] = '012'
+        res[shear_type] = data
+
+    # this can happen when nothing is detected
+    res['2m'] = None
+    return res
+
+
+def _get_cells(seed, ncell):
+    rng = np.random.RandomState(seed=seed)
+    return [
+        (cell_id, _make_result(rng, rng.randint(low=1, high=10)))
+        for cell_id in range(ncell)
+    ]
+
+
+def _check_output(cells, read_func):
+    for shear_type in ['noshear', '1p', '1m', '2p']:
+        expected = np.concatenate([res[shear_type] for _, res in cells])
+        expected_ids = np.concatenate([
+            np.zeros(res[shear_type].size, dtype='i8') + cell_id
+            for cell_id, res in cells
+        ])
+
+        data = read_func(shear_type)
+        assert data.size == expected.size
+        assert np.array_equal(data[CELL_ID_COLUMN], expected_ids)
+        for name in expected.dtype.names:
+            assert np.array_equal(data[name], expected[name])
+
+
+@pytest.mark.parametrize('buffer_rows', [1, 7, 10000])
+def test_catalog_writer_fits(tmp_path, buffer_rows):
+    import fitsio
+
+    config = {'model': 'wmom', 'weight': {'fwhm': 1.2}}
+    fname = os.path.join(tmp_path, 'cat.fits')
+    cells = _get_cells(seed=10, ncell=13)
+
+    with CatalogWriter(fname, config=config, buffer_rows=buffer_rows) as writer:
+        for cell_id, res in cells:
+            writer.write(cell_id, res)
+        writer.write(100, None)
+
+    assert writer.nrows['noshear'] == sum(res['noshear'].size for _, res in cells)
+    assert '2m' not in writer.nrows
+
+    def _read(shear_type):
+        return fitsio.read(fname, ext=shear_type)
+
+    _check_output(cells, _read)
+
+    hdr = fitsio.read_header(fname, ext='noshear')
+    assert hdr['CONFHASH'] == get_config_hash(config)
+
+
+def test_catalog_writer_fits_append(tmp_path):
+    import fitsio
+
+    fname = os.path.join(tmp_path, 'cat.fits')
+    cells = _get_cells(seed=11, ncell=6)
+
+    with CatalogWriter(fname, buffer_rows=5) as writer:
+        for cell_id, res in cells[:3]:
+            writer.write(cell_id, res)
+
+    # re-opening appends to the existing file
+    with CatalogWriter(fname, buffer_rows=5) as writer:
+        for cell_id, res in cells[3:]:
+            writer.write(cell_id, res)
+
+    def _read(shear_type):
+        return fitsio.read(fname, ext=shear_type)
+
+    _check_output(cells, _read)
+
+    # clobber removes it
+    with CatalogWriter(fname, clobber=True) as writer:
+        assert writer.nrows == {}
+
+
+def test_catalog_writer_parquet(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    dname = os.path.join(tmp_path, 'cat.parquet')
+    cells = _get_cells(seed=12, ncell=9)
+
+    with CatalogWriter(dname, config={'model': 'pgauss'}, buffer_rows=10) as writer:
+        for cell_id, res in cells:
+            writer.write(cell_id, res)
+
+    def _read(shear_type):
+        table = pq.read_table(os.path.join(dname, shear_type))
+        data = {}
+        for name in table.column_names:
+            data[name] = np.array(table.column(name).to_pylist())
+        return data
+
+    # the dict of columns is enough for the checks
+    class _Data(dict):
+        @property
+        def size(self):
+            return self[CELL_ID_COLUMN].size
+
+    _check_output(cells, lambda shear_type: _Data(_read(shear_type)))
+
+    table = pq.read_table(os.path.join(dname, 'noshear'))
+    assert (
+        table.schema.metadata[b'CONFHASH'].decode()
+        == get_config_hash({'model': 'pgauss'})
+    )
+
+
+def test_catalog_writer_parquet_tmp_files(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    dname = os.path.join(tmp_path, 'cat.parquet')
+    cells = _get_cells(seed=14, ncell=4)
+
+    with CatalogWriter(dname, buffer_rows=1) as writer:
+        for cell_id, res in cells[:2]:
+            writer.write(cell_id, res)
+        nrows = writer.nrows
+
+    # a partial file left by an interrupted write
+    tmpname = os.path.join(dname, 'noshear', 'part-000000001000.parquet.tmp')
+    with open(tmpname, 'w') as fobj:
+        fobj.write('partial')
+
+    with CatalogWriter(dname, buffer_rows=1) as writer:
+        assert writer.nrows == nrows
+        writer.truncate(nrows)
+        assert not os.path.exists(tmpname)
+
+        for cell_id, res in cells[2:]:
+            writer.write(cell_id, res)
+
+    table = pq.read_table(os.path.join(dname, 'noshear'))
+    assert table.num_rows == sum(res['noshear'].size for _, res in cells)
+
+
+@pytest.mark.parametrize('fname', ['cat.fits', 'cat.parquet'])
+def test_catalog_writer_config_mismatch(tmp_path, fname):
+    if fname.endswith('.parquet'):
+        pytest.importorskip('pyarrow.parquet')
+
+    path = os.path.join(tmp_path, fname)
+    cells = _get_cells(seed=15, ncell=2)
+
+    with CatalogWriter(path, config={'model': 'wmom'}) as writer:
+        for cell_id, res in cells:
+            writer.write(cell_id, res)
+
+    with pytest.raises(ValueError):
+        CatalogWriter(path, config={'model': 'pgauss'})
+
+    # the same config can be appended, and clobber starts over
+    with CatalogWriter(path, config={'model': 'wmom'}) as writer:
+        assert writer.nrows['noshear'] > 0
+    with CatalogWriter(path, config={'model': 'pgauss'}, clobber=True) as writer:
+        assert writer.nrows == {}
+
+
+def test_catalog_writer_truncate(tmp_path):
+    import fitsio
+
+    fname = os.path.join(tmp_path, 'cat.fits')
+    cells = _get_cells(seed=13, ncell=6)
+
+    with CatalogWriter(fname, buffer_rows=1) as writer:
+        for cell_id, res in cells[:3]:
+            writer.write(cell_id, res)
+        nrows = writer.nrows
+
+        for cell_id, res in cells[3:5]:
+            writer.write(cell_id, res)
+
+    # drop the rows written after the first three cells, then add the rest
+    with CatalogWriter(fname) as writer:
+        writer.truncate(nrows)
+        assert writer.nrows == nrows
+
+        for cell_id, res in cells[3:]:
+            writer.write(cell_id, res)
+
+    def _read(shear_type):
+        return fitsio.read(fname, ext=shear_type)
+
+    _check_output(cells, _read)
+
+    with CatalogWriter(fname) as writer:
+        with pytest.raises(ValueError):
+            writer.truncate({'noshear': writer.nrows['noshear'] + 1})
+
+    # rows expected for a shear type missing from the output
+    nrows = writer.nrows
+    os.remove(fname)
+    with CatalogWriter(fname) as writer:
+        with pytest.raises(ValueError):
+            writer.truncate(nrows)
+        writer.truncate({})
+
+
+def test_get_config_hash():
+    c1 = {'a': 1, 'b': {'c': [1, 2]}, 'd': np.array([1.0, 2.0])}
+    c2 = {'b': {'c': [1, 2]}, 'd': np.array([1.0, 2.0]), 'a': 1}
+    assert get_config_hash(c1) == get_config_hash(c2)
+
+    c2['a'] = 2
+    assert get_config_hash(c1) != get_config_hash(c2)
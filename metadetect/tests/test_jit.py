@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import metadetect
+from .. import masking
+
+
+def test_jit_warmup():
+    kernels = metadetect.warmup()
+    for kernel in kernels:
+        assert len(kernel.signatures) > 0, kernel
+
+    # the ap_mask for the LSST code is float32
+    sigs = [
+        str(sig) for sig in masking._build_square_apodization_mask.signatures
+    ]
+    assert any('float32' in sig for sig in sigs), sigs
+
+
+def test_jit_cache():
+    # a new process loads the kernels from the cache rather than compiling
+    metadetect.warmup()
+    code = (
+        'import metadetect; '
+        'kernels = metadetect.warmup(); '
+        'print(sum(len(k.stats.cache_misses) for k in kernels), '
+        'sum(len(k.stats.cache_hits) for k in kernels))'
+    )
+    out = subprocess.run(
+        [sys.executable, '-c', code],
+        check=True, capture_output=True, text=True,
+    )
+    nmiss, nhit = [int(v) for v in out.stdout.split()]
+    assert nmiss == 0
+    assert nhit > 0
@@ -0,0 +1,55 @@
+import tracemalloc
+
+import numpy as np
+
+from ..memory import (
+    MemoryTracker,
+    get_obs_nbytes,
+    get_mbobs_nbytes,
+    get_mbobs_list_nbytes,
+)
+from .sim import Sim
+
+
+def test_memory_nbytes():
+    mbobs = Sim(np.random.RandomState(7), config={'nband': 2}).get_mbobs()
+
+    nbytes = 0
+    for obslist in mbobs:
+        obs = obslist[0]
+        obs_nbytes = sum(
+            arr.nbytes for arr in [
+                obs.image, obs.weight, obs.bmask, obs.ormask, obs.noise,
+                obs.psf.image, obs.psf.weight,
+            ]
+        )
+        assert get_obs_nbytes(obs) == obs_nbytes
+        nbytes += obs_nbytes
+
+    assert get_mbobs_nbytes(mbobs) == nbytes
+    assert get_mbobs_list_nbytes([mbobs, mbobs]) == 2 * nbytes
+
+
+def test_memory_tracker():
+    tracker = MemoryTracker()
+    tracker.add('mbobs', 100)
+    tracker.add('metacal', 500)
+    tracker.add('stamps', 50)
+    tracker.release(50)
+    tracker.release(100)
+    tracker.add('stamps', 80)
+    tracker.release(80)
+    tracker.add('result', 10)
+
+    stats = tracker.get_stats()
+    assert stats == {
+        'mbobs': 100, 'metacal': 500, 'stamps': 80, 'result': 10,
+        'peak': 650,
+    }
+
+    tracemalloc.start()
+    try:
+        stats = tracker.get_stats()
+    finally:
+        tracemalloc.stop()
+    assert 'tracemalloc_peak' in stats
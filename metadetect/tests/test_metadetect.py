@@ -17,6 +17,7 @@ from .. import detect
 from .. import metadetect
 from .. import fitting
 from .. import procflags
+from ..tracing import Tracer, SlowestObjectsTracer
 from .sim import Sim
 
 
@@ -284,6 +285,175 @@ def test_metadetect_smoke(model):
     print("time per:", total_time/ntrial)
 
 
+@pytest.mark.parametrize("model", ["wmom", "am"])
+def test_metadetect_tracing(model):
+    """
+    test the tracer does not change the results and records the slowest fits
+    """
+    config = copy.deepcopy(TEST_METADETECT_CONFIG)
+    config["model"] = model
+
+    mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+    res = metadetect.do_metadetect(
+        config, mbobs, np.random.RandomState(seed=11),
+    )
+
+    tracer = SlowestObjectsTracer(nslow=3)
+    mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+    tres = metadetect.do_metadetect(
+        config, mbobs, np.random.RandomState(seed=11), tracer=tracer,
+    )
+
+    for shear in ["noshear", "1p", "1m", "2p", "2m"]:
+        assert np.array_equal(res[shear], tres[shear])
+        for stage in ["detect", "fit", "mfrac", "unshear"]:
+            assert (stage, shear) in tracer.stage_times
+
+    slowest = tracer.get_slowest()
+    assert slowest.size == 3
+    assert np.all(np.diff(slowest["duration"]) <= 0)
+    assert np.all(slowest["box_size"] > 0)
+    assert slowest["band_flags"].shape == (3, len(mbobs))
+
+
+def test_metadetect_tracing_error(monkeypatch):
+    """
+    test the tracer is told the cell is done when metadetect fails
+    """
+    class _CellTracer(Tracer):
+        def begin_cell(self):
+            self.done = False
+
+        def end_cell(self):
+            self.done = True
+
+    def _go(self):
+        raise RuntimeError('failed')
+
+    monkeypatch.setattr(metadetect.Metadetect, '_go', _go)
+
+    tracer = _CellTracer()
+    mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+    md = metadetect.Metadetect(
+        copy.deepcopy(TEST_METADETECT_CONFIG), mbobs,
+        np.random.RandomState(seed=11), tracer=tracer,
+    )
+    with pytest.raises(RuntimeError):
+        md.go()
+    assert tracer.done
+
+
+@pytest.mark.parametrize("model", ["wmom", "am"])
+def test_metadetect_memory_budget(model):
+    """
+    test the low memory strategy gives the same results
+    """
+    config = copy.deepcopy(TEST_METADETECT_CONFIG)
+    config["model"] = model
+
+    mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+    md = metadetect.Metadetect(config, mbobs, np.random.RandomState(seed=11))
+    md.go()
+    memory = md.memory
+    assert not memory["low_memory"]
+    for stage in ["mbobs", "metacal", "stamps", "result", "peak"]:
+        assert memory[stage] > 0, stage
+    assert memory["peak"] >= memory["mbobs"] + memory["metacal"]
+
+    config["memory_budget"] = 2 * memory["mbobs"]
+    mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+    lmd = metadetect.Metadetect(config, mbobs, np.random.RandomState(seed=11))
+    lmd.go()
+    assert lmd.memory["low_memory"]
+    # only one metacal type is held at a time
+    assert lmd.memory["metacal"] < memory["metacal"] / 2
+    assert lmd.memory["peak"] < memory["peak"]
+
+    for shear in ["noshear", "1p", "1m", "2p", "2m"]:
+        assert np.array_equal(md.result[shear], lmd.result[shear])
+
+    # the metacal images were released
+    assert len(lmd._mcalpsf_data_cache[None]["mcal_res"]) == 0
+
+
+@pytest.mark.parametrize("model", ["wmom", "am"])
+def test_metadetect_stream_metacal(model):
+    """
+    test making the metacal images one type at a time gives the same results,
+    with more than one band combination, also for fitters that draw from the
+    rng
+    """
+    config = copy.deepcopy(TEST_METADETECT_CONFIG)
+    config["model"] = model
+    shear_band_combs = [[0, 1], [1, 2]]
+
+    results = []
+    for stream_metacal in [False, True]:
+        config["stream_metacal"] = stream_metacal
+        mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+        md = metadetect.Metadetect(
+            config, mbobs, np.random.RandomState(seed=11),
+            shear_band_combs=shear_band_combs,
+        )
+        md.go()
+        assert md.memory["low_memory"] == stream_metacal
+        results.append(md.result)
+
+    for shear in ["noshear", "1p", "1m", "2p", "2m"]:
+        assert np.array_equal(results[0][shear], results[1][shear])
+
+
+@pytest.mark.parametrize("model", ["wmom", "pgauss"])
+def test_metadetect_precision_float32(model):
+    """
+    test the float32 precision mode gives the same detections and shears
+    """
+    results = {}
+    for precision in ["float64", "float32"]:
+        config = copy.deepcopy(TEST_METADETECT_CONFIG)
+        config["model"] = model
+        config["precision"] = precision
+
+        mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+        results[precision] = metadetect.do_metadetect(
+            config, mbobs, np.random.RandomState(seed=11),
+        )
+
+    def _get_R11(res):
+        g1p = np.mean(res["1p"][model + "_g"][:, 0])
+        g1m = np.mean(res["1m"][model + "_g"][:, 0])
+        return (g1p - g1m) / 0.02
+
+    res64 = results["float64"]
+    res32 = results["float32"]
+    for shear in ["noshear", "1p", "1m", "2p", "2m"]:
+        assert res32[shear].size == res64[shear].size
+        for col in ["sx_row", "sx_col"]:
+            assert np.allclose(res32[shear][col], res64[shear][col], atol=1e-3)
+        assert np.allclose(
+            res32[shear][model + "_g"], res64[shear][model + "_g"],
+            rtol=0, atol=1e-5,
+        )
+        assert np.allclose(res32[shear]["mfrac_img"], res64[shear]["mfrac_img"])
+
+    # the response and so the multiplicative shear bias are unchanged
+    assert np.abs(_get_R11(res32) / _get_R11(res64) - 1) < 1e-4
+
+    mbobs = Sim(np.random.RandomState(seed=116)).get_mbobs()
+    medsifier = detect.MEDSifier(
+        mbobs=mbobs,
+        sx_config=TEST_METADETECT_CONFIG["sx"],
+        meds_config=TEST_METADETECT_CONFIG["meds"],
+        dtype="f4",
+    )
+    assert medsifier.detim.dtype == np.float32
+
+    config = copy.deepcopy(TEST_METADETECT_CONFIG)
+    config["precision"] = "float16"
+    with pytest.raises(ValueError):
+        metadetect.Metadetect(config, mbobs, np.random.RandomState(seed=11))
+
+
 @pytest.mark.parametrize("model", ["wmom", "pgauss", "ksigma", "am", "gauss"])
 def test_metadetect_uberseg(model):
     """
@@ -0,0 +1,105 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from ..selection import (
+    parse_cut,
+    Cut,
+    CatalogSelector,
+    select_result,
+)
+
+
+def _make_data(rng, n):
+    dt = [
+        ('wmom_flags', 'i4'),
+        ('wmom_s2n', 'f8'),
+        ('wmom_T_ratio', 'f8'),
+        ('wmom_g', 'f8', 2),
+    ]
+    data = np.zeros(n, dtype=dt)
+    data['wmom_flags'] = rng.uniform(size=n) < 0.2
+    data['wmom_s2n'] = rng.uniform(low=0, high=100, size=n)
+    data['wmom_T_ratio'] = rng.uniform(low=0.5, high=2, size=n)
+    data['wmom_g'] = rng.normal(scale=0.3, size=(n, 2))
+    return data
+
+
+def test_selection_parse_cut():
+    clauses = parse_cut('wmom_s2n > 10 & wmom_flags == 0&wmom_g[1]<=0.5')
+    assert clauses == parse_cut(
+        'wmom_flags == 0 & wmom_g[1] <= 0.5 & wmom_s2n > 10 & wmom_s2n > 10'
+    )
+    assert set(clauses) == {
+        ('wmom_flags', None, '==', 0),
+        ('wmom_s2n', None, '>', 10),
+        ('wmom_g', 1, '<=', 0.5),
+    }
+
+    for bad in ['wmom_s2n >', 'wmom_s2n ~ 3', 'wmom_s2n > blah', '']:
+        with pytest.raises(ValueError):
+            parse_cut(bad)
+
+
+def test_selection_masks():
+    rng = np.random.RandomState(1001)
+    data = _make_data(rng, 1003)
+
+    selector = CatalogSelector(data)
+
+    cuts = {
+        'base': 'wmom_flags == 0 & wmom_s2n > 10 & wmom_T_ratio > 1.2',
+        's2n20': 'wmom_flags == 0 & wmom_s2n > 20 & wmom_T_ratio > 1.2',
+        'g1': 'wmom_g[0] >= -0.1 & wmom_g[0] < 0.1',
+        'flagged': 'wmom_flags != 0',
+    }
+    masks = selector.get_masks(cuts)
+
+    expected = {
+        'base': (
+            (data['wmom_flags'] == 0)
+            & (data['wmom_s2n'] > 10)
+            & (data['wmom_T_ratio'] > 1.2)
+        ),
+        's2n20': (
+            (data['wmom_flags'] == 0)
+            & (data['wmom_s2n'] > 20)
+            & (data['wmom_T_ratio'] > 1.2)
+        ),
+        'g1': (data['wmom_g'][:, 0] >= -0.1) & (data['wmom_g'][:, 0] < 0.1),
+        'flagged': data['wmom_flags'] != 0,
+    }
+
+    for name, emask in expected.items():
+        assert masks[name].dtype == bool
+        assert np.array_equal(masks[name], emask), name
+        assert selector.get_count(cuts[name]) == emask.sum()
+
+    # the clauses are shared between cuts and the cuts are cached
+    assert len(selector._clause_cache) == 7
+    packed = selector.get_packed(cuts['base'])
+    assert selector.get_packed(
+        'wmom_T_ratio > 1.2 & wmom_s2n > 10 & wmom_flags == 0'
+    ) is packed
+
+
+def test_selection_cut_and_result():
+    rng = np.random.RandomState(55)
+
+    result = {
+        'noshear': _make_data(rng, 50),
+        '1p': _make_data(rng, 0),
+        '1m': None,
+    }
+
+    cut = pickle.loads(pickle.dumps(Cut('wmom_flags == 0 & wmom_s2n > 30')))
+    data = result['noshear']
+    assert np.array_equal(
+        cut(data), (data['wmom_flags'] == 0) & (data['wmom_s2n'] > 30),
+    )
+
+    masks = select_result(result, {'cut': cut.cut})
+    assert np.array_equal(masks['noshear']['cut'], cut(data))
+    assert masks['1p']['cut'].size == 0
+    assert masks['1m'] is None
@@ -5,6 +5,7 @@ to test all the moving parts
 """
 import numpy as np
 import ngmix
+import pytest
 import galsim
 from .. import shearpos
 
@@ -132,6 +133,79 @@ def test_shear_pos_image(show=False):
         assert smaxval == maxval, 'checking sheared position against image'
 
 
+def test_shear_pos_transform():
+    """
+    test the precomputed transform against shearing in (u, v) directly
+    """
+
+    step = 0.10
+
+    dims = 100, 120
+    jacobian = ngmix.Jacobian(
+        row=3.5,
+        col=7.2,
+        dudrow=0.263,
+        dudcol=-0.01,
+        dvdrow=+0.01,
+        dvdcol=0.263,
+    )
+
+    rng = np.random.RandomState(seed=8812)
+    rows = rng.uniform(low=0, high=dims[0], size=50)
+    cols = rng.uniform(low=0, high=dims[1], size=50)
+
+    tr = shearpos.ShearPositionTransform(jac=jacobian, dims=dims, step=step)
+
+    v_cen, u_cen = jacobian.get_vu(row=(dims[0] - 1)/2, col=(dims[1] - 1)/2)
+    v, u = jacobian.get_vu(row=rows, col=cols)
+    pos = np.vstack((u - u_cen, v - v_cen))
+
+    for sstr in ['1p', '1m', '2p', '2m']:
+        a = shearpos.get_galsim_shear(sstr, step).getMatrix()
+
+        for unshear in [False, True]:
+            mat = np.linalg.inv(a) if unshear else a
+            out = np.dot(mat, pos)
+            erows, ecols = jacobian.get_rowcol(
+                v=out[1] + v_cen, u=out[0] + u_cen,
+            )
+
+            if unshear:
+                trows, tcols = tr.unshear_positions(rows, cols, sstr)
+            else:
+                trows, tcols = tr.shear_positions(rows, cols, sstr)
+
+            assert np.allclose(trows, erows)
+            assert np.allclose(tcols, ecols)
+
+    # noshear is passed through
+    trows, tcols = tr.unshear_positions(rows, cols, 'noshear')
+    assert trows is rows
+    assert tcols is cols
+
+    all_res = tr.unshear_positions_all(rows, cols)
+    for sstr in ['noshear', '1p', '1m', '2p', '2m']:
+        trows, tcols = tr.unshear_positions(rows, cols, sstr)
+        assert np.array_equal(all_res[sstr][0], trows)
+        assert np.array_equal(all_res[sstr][1], tcols)
+
+    with pytest.raises(ValueError):
+        tr.unshear_positions(rows, cols, 'blah')
+
+    # the cached version is reused
+    ctr = shearpos.get_shear_position_transform(
+        jac=jacobian, dims=dims, step=step,
+    )
+    assert ctr is shearpos.get_shear_position_transform(
+        jac=jacobian, dims=dims, step=step,
+    )
+    for sstr in ['1p', '1m', '2p', '2m']:
+        assert np.allclose(
+            ctr.get_matrix(sstr, unshear=True),
+            tr.get_matrix(sstr, unshear=True),
+        )
+
+
 def _show_pos(rows, cols, srows, scols, **kw):
     import biggles
 
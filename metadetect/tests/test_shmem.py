@@ -0,0 +1,81 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from ..shmem import SharedMBObs, SharedResult
+from .sim import make_mbobs_sim
+
+
+def _get_result(mbobs):
+    res = {}
+    for shear_type in ['noshear', '1p']:
+        data = np.zeros(len(mbobs), dtype=[('flux', 'f8', 2), ('flags', 'i4')])
+        for i, obslist in enumerate(mbobs):
+            data['flux'][i] = obslist[0].image.sum(), obslist[0].noise.sum()
+        res[shear_type] = data
+    res['2m'] = None
+    return res
+
+
+def _process(shared):
+    with shared:
+        res = _get_result(shared.get_mbobs())
+    return SharedResult(res)
+
+
+def test_shared_mbobs_pickle():
+    mbobs = make_mbobs_sim(45, 3)
+
+    with SharedMBObs(mbobs) as shared:
+        # the pixels are not pickled
+        assert len(pickle.dumps(shared)) < mbobs[0][0].image.nbytes
+
+        other = pickle.loads(pickle.dumps(shared))
+        rmbobs = other.get_mbobs()
+        for obslist, robslist in zip(mbobs, rmbobs):
+            obs, robs = obslist[0], robslist[0]
+            assert np.array_equal(obs.image, robs.image)
+            assert np.array_equal(obs.noise, robs.noise)
+            assert np.array_equal(obs.mfrac, robs.mfrac)
+            assert np.array_equal(obs.psf.image, robs.psf.image)
+            assert obs.meta == robs.meta
+
+        del rmbobs, obs, robs, obslist, robslist
+        other.close()
+
+    # the block was unlinked on exit
+    with pytest.raises(FileNotFoundError):
+        pickle.loads(pickle.dumps(shared)).get_mbobs()
+
+
+def test_shared_result_pickle():
+    res = _get_result(make_mbobs_sim(46, 2))
+
+    shared = pickle.loads(pickle.dumps(SharedResult(res)))
+    rres = shared.get_result()
+    shared.unlink()
+
+    assert rres['2m'] is None
+    for shear_type in ['noshear', '1p']:
+        assert np.array_equal(rres[shear_type], res[shear_type])
+
+    shared = pickle.loads(pickle.dumps(SharedResult(None)))
+    assert shared.get_result() is None
+    shared.unlink()
+
+
+def test_shared_process_pool():
+    mbobs = make_mbobs_sim(47, 4)
+    expected = _get_result(mbobs)
+
+    with SharedMBObs(mbobs) as shared:
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            shared_res = pool.submit(_process, shared).result()
+
+    with shared_res:
+        res = shared_res.get_result()
+
+    for shear_type in ['noshear', '1p']:
+        assert np.array_equal(res[shear_type], expected[shear_type])
@@ -0,0 +1,30 @@
+import numpy as np
+
+from .sim import Sim
+
+
+def test_sim_fast():
+    seed = 812
+    config = {'nband': 3, 'noises': [1.0e-8]*4}
+
+    fast_sim = Sim(np.random.RandomState(seed), config={'fast': True, **config})
+    fast_mbobs = fast_sim.get_mbobs()
+
+    # the fast sim draws the seed for its noise generator first
+    rng = np.random.RandomState(seed)
+    sim = Sim(rng, config=config)
+    rng.randint(0, 2**31)
+    mbobs = sim.get_mbobs()
+
+    for obslist, fast_obslist in zip(mbobs, fast_mbobs):
+        im = obslist[0].image
+        fast_im = fast_obslist[0].image
+        assert np.allclose(fast_im, im, rtol=0, atol=1.0e-3*im.max())
+        assert fast_obslist[0].noise.std() < 1.0e-7
+
+    mbobs_list = fast_sim.get_mbobs_list(3)
+    assert len(mbobs_list) == 3
+    assert all(len(mbobs) == 3 for mbobs in mbobs_list)
+    assert not np.array_equal(
+        mbobs_list[0][0][0].image, mbobs_list[1][0][0].image,
+    )
@@ -0,0 +1,84 @@
+import numpy as np
+import ngmix
+import pytest
+
+from ..tracing import Tracer, SlowestObjectsTracer
+
+
+def _make_mbobs(box_size, nband, flags):
+    mbobs = ngmix.MultiBandObsList()
+    for band in range(nband):
+        bmask = np.zeros((box_size, box_size), dtype='i4')
+        bmask[0, 0] = flags * (band + 1)
+        obs = ngmix.Observation(
+            np.zeros((box_size, box_size)),
+            bmask=bmask,
+            jacobian=ngmix.DiagonalJacobian(row=0, col=0, scale=0.2),
+        )
+        obslist = ngmix.ObsList()
+        obslist.append(obs)
+        mbobs.append(obslist)
+    return mbobs
+
+
+def test_tracing_slowest():
+    tracer = SlowestObjectsTracer(nslow=2)
+
+    durations = [0.1, 0.5, 0.2, 0.4]
+    for i, duration in enumerate(durations):
+        tracer.object_fit(
+            shear_type='1p', fitter='wmom', index=i,
+            mbobs=_make_mbobs(16 + 2*i, 2, i), duration=duration,
+        )
+    tracer.detect(shear_type='1p', det_bands=[0, 1], nobj=4, duration=1.0)
+
+    slowest = tracer.get_slowest()
+    assert np.array_equal(slowest['index'], [1, 3])
+    assert np.array_equal(slowest['duration'], [0.5, 0.4])
+    assert np.array_equal(slowest['box_size'], [18, 22])
+    assert np.array_equal(slowest['band_flags'], [[1, 2], [3, 6]])
+    assert np.all(slowest['shear_type'] == '1p')
+    assert np.all(slowest['fitter'] == 'wmom')
+
+    assert tracer.stage_times[('fit', '1p')] == pytest.approx(sum(durations))
+    assert tracer.stage_times[('detect', '1p')] == 1.0
+
+    tracer.begin_cell()
+    assert tracer.get_slowest().size == 0
+    assert tracer.stage_times == {}
+
+
+def test_tracing_sample():
+    assert all(Tracer().sample() for _ in range(100))
+
+    tracer = Tracer(sample_rate=0.25, seed=3)
+    frac = np.mean([tracer.sample() for _ in range(10_000)])
+    assert np.abs(frac - 0.25) < 0.02
+
+    assert not any(Tracer(sample_rate=0).sample() for _ in range(100))
+
+    with pytest.raises(ValueError):
+        Tracer(sample_rate=1.5)
+
+
+def test_tracing_slowest_sample():
+    tracer = SlowestObjectsTracer(nslow=100, sample_rate=0.25, seed=5)
+
+    durations = np.linspace(0.1, 1.0, 200)
+    for i, duration in enumerate(durations):
+        tracer.object_fit(
+            shear_type='noshear', fitter='wmom', index=i,
+            mbobs=_make_mbobs(16, 1, 0), duration=duration,
+        )
+
+    # only sampled objects are considered for the slowest, but the total
+    # fit time includes all objects
+    slowest = tracer.get_slowest()
+    assert 0 < slowest.size < durations.size
+    assert (
+        tracer.stage_times[('fit', 'noshear')]
+        == pytest.approx(durations.sum())
+    )
+
+    with pytest.raises(ValueError):
+        SlowestObjectsTracer(nslow=0)
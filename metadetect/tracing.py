@@ -0,0 +1,233 @@
+"""
+Hooks to trace where the time goes in a metadetect cell.
+
+A tracer is sent to do_metadetect or Metadetect.  Its methods are called
+with the duration of the detection, the fit of each object, the mfrac
+measurement and the position unshearing for each shear type.  The base
+Tracer does nothing, subclasses override the hooks they need.
+
+object_fit is called for every object.  Tracers that record details for
+each object can sample them with sample_rate by calling sample(), which
+uses a random number generator owned by the tracer so the metadetect
+results do not depend on the tracing.
+
+Examples
+--------
+tracer = SlowestObjectsTracer(nslow=5)
+res = do_metadetect(config, mbobs, rng, tracer=tracer)
+slowest = tracer.get_slowest()
+"""
+import heapq
+import itertools
+
+import numpy as np
+
+
+class Tracer(object):
+    """
+    Tracing hooks for metadetect, which by default do nothing
+
+    Parameters
+    ----------
+    sample_rate: float, optional
+        The fraction of objects sampled by sample(), default 1
+    seed: int, optional
+        Seed for sampling the objects
+    """
+    def __init__(self, sample_rate=1.0, seed=None):
+        if sample_rate < 0 or sample_rate > 1:
+            raise ValueError(
+                'sample_rate must be in [0, 1], got %s' % sample_rate
+            )
+
+        self.sample_rate = sample_rate
+        self._rng = np.random.RandomState(seed)
+
+    def sample(self):
+        """
+        returns True if the next object should be traced
+        """
+        if self.sample_rate >= 1:
+            return True
+        return self._rng.uniform() < self.sample_rate
+
+    def begin_cell(self):
+        """
+        called when metadetect starts processing a cell
+        """
+        pass
+
+    def end_cell(self):
+        """
+        called when metadetect is done processing a cell
+        """
+        pass
+
+    def detect(self, *, shear_type, det_bands, nobj, duration):
+        """
+        called after detection and extraction of the stamps
+
+        Parameters
+        ----------
+        shear_type: str
+            The metacal shear type, e.g. 'noshear'
+        det_bands: list of int
+            The bands used for detection
+        nobj: int
+            The number of detections
+        duration: float
+            Time in seconds
+        """
+        pass
+
+    def object_fit(self, *, shear_type, fitter, index, mbobs, duration):
+        """
+        called after fitting each object
+
+        Parameters
+        ----------
+        shear_type: str
+            The metacal shear type, e.g. 'noshear'
+        fitter: str
+            The name of the fitter
+        index: int
+            The index of the object in the detection catalog
+        mbobs: ngmix.MultiBandObsList
+            The stamps for the object
+        duration: float
+            Time in seconds
+        """
+        pass
+
+    def mfrac(self, *, shear_type, nobj, duration):
+        """
+        called after measuring the masked fraction for all objects
+
+        Parameters
+        ----------
+        shear_type: str
+            The metacal shear type, e.g. 'noshear'
+        nobj: int
+            The number of objects
+        duration: float
+            Time in seconds
+        """
+        pass
+
+    def unshear(self, *, shear_type, nobj, duration):
+        """
+        called after unshearing the positions of all objects
+
+        Parameters
+        ----------
+        shear_type: str
+            The metacal shear type, e.g. 'noshear'
+        nobj: int
+            The number of objects
+        duration: float
+            Time in seconds
+        """
+        pass
+
+
+class SlowestObjectsTracer(Tracer):
+    """
+    Tracer recording the slowest object fits and the total time in each stage
+    for a cell
+
+    Parameters
+    ----------
+    nslow: int, optional
+        The number of objects to keep, default 10
+    sample_rate: float, optional
+        The fraction of objects considered for the slowest fits, default 1.
+        The total fit time includes all objects.
+    seed: int, optional
+        Seed for sampling the objects
+    """
+    def __init__(self, nslow=10, sample_rate=1.0, seed=None):
+        if nslow < 1:
+            raise ValueError('nslow must be >= 1, got %s' % nslow)
+
+        super().__init__(sample_rate=sample_rate, seed=seed)
+        self.nslow = nslow
+        self.begin_cell()
+
+    def begin_cell(self):
+        # min heap of (duration, count, record) so the fastest is dropped
+        self._heap = []
+        self._count = itertools.count()
+        self.stage_times = {}
+
+    def detect(self, *, shear_type, det_bands, nobj, duration):
+        self._add_stage_time('detect', shear_type, duration)
+
+    def mfrac(self, *, shear_type, nobj, duration):
+        self._add_stage_time('mfrac', shear_type, duration)
+
+    def unshear(self, *, shear_type, nobj, duration):
+        self._add_stage_time('unshear', shear_type, duration)
+
+    def object_fit(self, *, shear_type, fitter, index, mbobs, duration):
+        self._add_stage_time('fit', shear_type, duration)
+
+        if not self.sample():
+            return
+
+        if len(self._heap) >= self.nslow and duration <= self._heap[0][0]:
+            return
+
+        # or of the bmask over the stamp, for each band
+        band_flags = [
+            np.bitwise_or.reduce(obslist[0].bmask, axis=None)
+            if len(obslist) > 0 else 0
+            for obslist in mbobs
+        ]
+        box_size = mbobs[0][0].image.shape[0] if len(mbobs[0]) > 0 else 0
+
+        item = (
+            duration,
+            next(self._count),
+            (shear_type, fitter, index, box_size, band_flags),
+        )
+        if len(self._heap) < self.nslow:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+
+    def get_slowest(self):
+        """
+        get the slowest object fits for the cell
+
+        Returns
+        -------
+        data: array
+            Sorted slowest first, with fields shear_type, fitter, index,
+            box_size, band_flags and duration
+        """
+        items = sorted(self._heap, reverse=True)
+
+        nband = max([len(item[2][4]) for item in items], default=1)
+        dt = [
+            ('shear_type', 'U7'),
+            ('fitter', 'U20'),
+            ('index', 'i4'),
+            ('box_size', 'i4'),
+            ('band_flags', 'i4', nband),
+            ('duration', 'f8'),
+        ]
+        data = np.zeros(len(items), dtype=dt)
+        for i, (duration, _, record) in enumerate(items):
+            shear_type, fitter, index, box_size, band_flags = record
+            data['shear_type'][i] = shear_type
+            data['fitter'][i] = fitter
+            data['index'][i] = index
+            data['box_size'][i] = box_size
+            data['band_flags'][i, :len(band_flags)] = band_flags
+            data['duration'][i] = duration
+
+        return data
+
+    def _add_stage_time(self, stage, shear_type, duration):
+        key = (stage, shear_type)
+        self.stage_times[key] = self.stage_times.get(key, 0.0) + duration
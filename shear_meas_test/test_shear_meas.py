@@ -4,6 +4,7 @@ import numpy as np
 import ngmix
 import galsim
 import metadetect
+from metadetect import calib
 from esutil.pbar import PBar
 import joblib
 
@@ -310,39 +311,20 @@ def _meas_shear_data(res, model):
     return np.array([(g1, g2, R11, R22)], dtype=dt)
 
 
-def _bootstrap_stat(d1, d2, func, seed, nboot=500):
-    dim = d1.shape[0]
-    rng = np.random.RandomState(seed=seed)
-    stats = []
-    for _ in range(nboot):
-        ind = rng.choice(dim, size=dim, replace=True)
-        stats.append(func(d1[ind], d2[ind]))
-    return stats
-
-
 def meas_m_c_cancel(pres, mres):
-    x = np.mean(pres['g1'] - mres['g1'])/2
-    y = np.mean(pres['R11'] + mres['R11'])/2
-    m = x/y/0.02 - 1
-
-    x = np.mean(pres['g2'] + mres['g2'])/2
-    y = np.mean(pres['R22'] + mres['R22'])/2
-    c = x/y
-
-    return m, c
+    return calib.meas_m_c(pres, mres, gtrue=0.02)
 
 
 def boostrap_m_c(pres, mres):
-    m, c = meas_m_c_cancel(pres, mres)
-    bdata = _bootstrap_stat(pres, mres, meas_m_c_cancel, 14324, nboot=500)
-    merr, cerr = np.std(bdata, axis=0)
-    return m, merr, c, cerr
+    rng = np.random.RandomState(seed=14324)
+    return calib.bootstrap_m_c(pres, mres, rng=rng, nboot=500, gtrue=0.02)
 
 
-def run_sim(seed, mdet_seed, model, **kwargs):
+def run_sim(seed, mdet_seed, model, precision="float64", **kwargs):
     mbobs_p = make_sim(seed=seed, g1=0.02, g2=0.0, **kwargs)
     cfg = copy.deepcopy(TEST_METADETECT_CONFIG)
     cfg["model"] = model
+    cfg["precision"] = precision
     _pres = metadetect.do_metadetect(
         copy.deepcopy(cfg),
         mbobs_p,
@@ -585,3 +567,58 @@ def test_shear_meas_timing(model, snr, ngrid):
     run_sim(
         seeds[0], mdet_seeds[0], model, snr=snr, ngrid=ngrid,
     )
+
+
+@pytest.mark.parametrize(
+    'model,snr,ngrid,ntrial', [
+        ("wmom", 1e6, 7, 64),
+        ("pgauss", 1e6, 7, 64),
+    ]
+)
+def test_shear_meas_precision(model, snr, ngrid, ntrial):
+    """
+    m and c are within tolerance with the float32 precision mode, and agree
+    with float64 for the same sims
+    """
+    rng = np.random.RandomState(seed=116)
+    seeds = rng.randint(low=1, high=2**29, size=ntrial)
+    mdet_seeds = rng.randint(low=1, high=2**29, size=ntrial)
+
+    stats = {}
+    with joblib.Parallel(n_jobs=-1, verbose=100, backend='loky') as par:
+        for precision in ["float64", "float32"]:
+            jobs = [
+                joblib.delayed(run_sim)(
+                    seeds[i], mdet_seeds[i], model, precision=precision,
+                    snr=snr, ngrid=ngrid,
+                )
+                for i in range(ntrial)
+            ]
+            outputs = [out for out in par(jobs) if out is not None]
+            pres = np.concatenate([out[0] for out in outputs])
+            mres = np.concatenate([out[1] for out in outputs])
+
+            stats[precision] = boostrap_m_c(pres, mres)
+            assert np.allclose(
+                stats[precision][::2], meas_m_c_cancel(pres, mres),
+            )
+
+            m, merr, c, cerr = stats[precision]
+            print(
+                (
+                    "%s m [1e-3, 3sigma]: %s +/- %s"
+                    "\n%s c [1e-5, 3sigma]: %s +/- %s"
+                ) % (
+                    precision, m/1e-3, 3*merr/1e-3,
+                    precision, c/1e-5, 3*cerr/1e-5,
+                ),
+                flush=True,
+            )
+
+    m, merr, c, cerr = stats["float32"]
+    assert np.abs(m) < max(1e-3, 3*merr)
+    assert np.abs(c) < 3*cerr
+
+    m64, merr64, c64, cerr64 = stats["float64"]
+    assert np.abs(m - m64) < max(1e-4, merr64)
+    assert np.abs(c - c64) < max(1e-5, cerr64)